@@ -1,6 +1,10 @@
 import streamlit as st, pandas as pd
 from services.supabase_client import get_client
-from services.utils import format_ts
+from services import page_cache
+from services.jogos_service import JOGOS_SEARCH_LIMIT, jogo_label, list_jogos_all
+from services.picker import Picker
+from services.utils import load_frame, show_frame
+from services import schemas
 
 st.title("Jogos")
 supa = get_client()
@@ -17,46 +21,21 @@ with st.sidebar:
         st.session_state.clear()
         st.rerun()
 
-# --- Busca/seleção de jogo existente ---
-res_all = supa.table("jogos").select("*").order("created_at", desc=True).execute()
-df_all = pd.DataFrame(res_all.data or [])
-
+# --- Busca/seleção de jogo existente (top-N no banco por nome/SKU) ---
+jogo_picker = Picker("jogos_sel", lambda j: j.get("id"), jogo_label, search=page_cache.jogos_busca, tags=("jogos",))
 col_b1, col_b2 = st.columns([2, 1])
 with col_b1:
-    termo = st.text_input("Buscar por nome", placeholder="ex.: Zelda", help="Filtra a lista abaixo pelo nome do jogo")
-
-# Aplica filtro local (mínima alteração; sem mudar chamadas ao backend)
-if not df_all.empty and termo:
-    df_filtrado = df_all[df_all["nome"].astype(str).str.contains(termo, case=False, na=False)].copy()
-else:
-    df_filtrado = df_all.copy()
-
+    termo = jogo_picker.search_input("Buscar por nome ou SKU", placeholder="ex.: Zelda", help=f"Mostra até {JOGOS_SEARCH_LIMIT} jogos cujo nome ou SKU contém o termo")
 
-# Selectbox para escolher um jogo e editar
-opcoes = []
-if not df_filtrado.empty:
-    # Mostra identificação amigável: Nome (SKU) [id curto]
-    id_short = df_filtrado.get("id").astype(str).str[:8] if "id" in df_filtrado.columns else pd.Series(["—"]*len(df_filtrado))
-    labels = df_filtrado.apply(lambda r: f"{r.get('nome','(sem nome)')}" + (f" (SKU {r['sku']})" if r.get('sku') else "") + (f" [{id_short.loc[r.name]}]" if 'id' in df_filtrado.columns else ""), axis=1)
-    opcoes = list(zip(labels.tolist(), df_filtrado.get("id", pd.Series([None]*len(df_filtrado))).tolist()))
+resultados = list(jogo_picker.rows.values())
 
+# Selectbox para escolher um jogo e editar — Nome (SKU) [id curto]
 with col_b2:
-    idx_sel = 0
-    if opcoes:
-        label_list = [lbl for (lbl, _id) in opcoes]
-        escolha = st.selectbox("Selecionar jogo", label_list, index=0 if label_list else None)
-        # reobtem o id selecionado
-        try:
-            sel_id = opcoes[label_list.index(escolha)][1]
-        except Exception:
-            sel_id = None
-    else:
-        escolha = None
-        sel_id = None
+    jsel = jogo_picker.selectbox("Selecionar jogo", placeholder=None) if resultados else None
 
 # Form de edição do jogo selecionado
-if sel_id:
-    jsel = df_all[df_all.get("id").astype(str) == str(sel_id)].iloc[0].to_dict()
+if jsel:
+    sel_id = jsel.get("id")
     st.subheader("Editar jogo selecionado")
     with st.form("editar_jogo"):
         nome = st.text_input("Nome (público)", value=str(jsel.get("nome", "")))
@@ -76,6 +55,7 @@ if sel_id:
                 "categoria": categoria or None,
                 "ativo": ativo
             }).eq("id", sel_id).execute()
+            page_cache.invalidate("jogos")
             st.success("Jogo atualizado!")
 
 st.divider()
@@ -101,18 +81,22 @@ with st.form("novo_jogo"):
             "categoria": categoria or None,
             "ativo": ativo
         }).execute()
+        page_cache.invalidate("jogos")
         st.success("Jogo salvo!")
 
-# --- Tabela (id curto) ---
+# --- Tabela (resultado da busca; exportação completa sob demanda) ---
 st.subheader("Jogos cadastrados")
+df_all = load_frame(resultados, schemas.JOGOS)
 if not df_all.empty:
     df_view = df_all.copy()
     if "id" in df_view.columns:
         df_view.insert(0, "id_curto", df_view["id"].astype(str).str[:8])
         # Opcionalmente esconde o id completo para uma visualização mais limpa
         df_view = df_view.drop(columns=["id"])  # mantém apenas id_curto
-    df_view = format_ts(df_view)
-    st.dataframe(df_view, use_container_width=True)
-    st.download_button("Exportar CSV", df_view.to_csv(index=False), "jogos.csv", "text/csv")
+    st.caption(f"{len(df_view)} jogo(s) — refine a busca para ver outros.")
+    show_frame(df_view)
+    if st.button("Preparar exportação do catálogo (CSV)"):
+        df_exp = load_frame(list_jogos_all(), schemas.JOGOS)
+        st.download_button("Exportar CSV", df_exp.to_csv(index=False), "jogos.csv", "text/csv")
 else:
-    st.info("Nenhum jogo cadastrado ainda.")
+    st.info("Nenhum jogo encontrado." if termo.strip() else "Nenhum jogo cadastrado ainda.")
@@ -1,6 +1,9 @@
 import streamlit as st, pandas as pd
 from services.supabase_client import get_client
-from services.utils import format_ts
+from services import page_cache
+from services.clientes_service import list_clientes_all
+from services.utils import load_frame, show_frame
+from services import schemas
 
 st.title("Clientes")
 supa = get_client()
@@ -23,12 +26,39 @@ with st.form("novo_cliente"):
     optin = st.checkbox("Opt-in WhatsApp", value=True)
     if st.form_submit_button("Salvar"):
         supa.table("clientes").upsert({"telefone": telefone, "nome": nome, "opt_in_whatsapp": optin}).execute()
+        page_cache.invalidate("clientes")
         st.success("Cliente salvo!")
 
-res = supa.table("clientes").select("*").order("created_at", desc=True).execute()
-df = pd.DataFrame(res.data or [])
-df = format_ts(df)
-st.dataframe(df, use_container_width=True)
+# ==== Diretório: busca no banco (prefixo do telefone ou trecho do nome) + paginação por cursor ====
+st.subheader("Diretório")
+termo = st.text_input("Buscar cliente", placeholder="ex.: 5585... ou Maria", help="Dígitos buscam pelo início do telefone; texto busca no nome")
+page_size = 25
 
-if not df.empty:
-    st.download_button("Exportar CSV", df.to_csv(index=False), "clientes.csv", "text/csv")
+if st.session_state.get("clientes_filtro") != termo.strip():
+    st.session_state["clientes_filtro"] = termo.strip()
+    st.session_state["clientes_cursors"] = [None]
+cursors = st.session_state["clientes_cursors"]
+cur_page = len(cursors) - 1
+
+pagina = page_cache.clientes_pagina(termo.strip(), cursors[-1], page_size)
+df = load_frame(pagina["rows"], schemas.CLIENTES)
+if df.empty:
+    st.info("Nenhum cliente encontrado.")
+else:
+    start = cur_page * page_size
+    st.caption(f"Mostrando {start+1}–{start+len(df)} • Página {cur_page+1}")
+    show_frame(df)
+
+    c_prev, c_page, c_next = st.columns([1,2,1])
+    with c_prev:
+        if st.button("◀️ Anterior", disabled=(cur_page<=0)):
+            cursors.pop()
+            st.rerun()
+    with c_next:
+        if st.button("Próxima ▶️", disabled=(pagina["next"] is None)):
+            cursors.append(pagina["next"])
+            st.rerun()
+
+if st.button("Preparar exportação do diretório (CSV)"):
+    df_exp = load_frame(list_clientes_all(), schemas.CLIENTES)
+    st.download_button("Exportar CSV", df_exp.to_csv(index=False), "clientes.csv", "text/csv")
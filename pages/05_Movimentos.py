@@ -1,7 +1,13 @@
+import codecs, csv, io
 import streamlit as st, pandas as pd
 from services.supabase_client import get_client
-from services.movimentos_service import add_item_by_movimento, list_movimentos
-from services.utils import format_ts
+from services.movimentos_service import add_item_by_movimento, add_items_bulk
+from services.utils import load_frame, show_frame
+from services import schemas
+from services import page_cache
+from services.clientes_service import cliente_label
+from services.jogos_service import jogo_label
+from services.picker import Picker
 
 st.title("Movimentos (Compra/Listinha)")
 
@@ -20,68 +26,100 @@ with st.sidebar:
         st.rerun()
 
 # ---- Dados auxiliares para os dropdowns ----
-try:
-    _jogos = supa.table("jogos").select("id,nome,sku,status,ativo").order("nome").execute().data or []
-except Exception:
-    _jogos = []
-try:
-    _clientes = supa.table("clientes").select("telefone,nome").order("created_at", desc=True).limit(1000).execute().data or []
-except Exception:
-    _clientes = []
 
 # ---- Formulário para registrar novo movimento ----
 st.subheader("Novo movimento")
+
+# Buscas fora do form: cada termo é uma consulta top-N indexada (clientes_service / jogos_service)
+cli_picker = Picker("mov_cli", lambda c: c.get("telefone"), cliente_label, search=page_cache.clientes_busca, tags=("clientes",))
+jogo_picker = Picker("mov_jogo", lambda j: j.get("id"), jogo_label, search=page_cache.jogos_busca, tags=("jogos",))
+colb1, colb2 = st.columns(2)
+with colb1:
+    cli_picker.search_input("Buscar cliente (nome/telefone)")
+with colb2:
+    jogo_picker.search_input("Buscar jogo (nome/SKU)")
+
 with st.form("add_mov"):
     tipo = st.selectbox("Tipo", ["COMPRA","LISTINHA"])
 
-    # Cliente (dropdown com busca)
-    colc1, colc2 = st.columns([2,3])
-    with colc1:
-        termo_cli = st.text_input("Buscar cliente (nome/telefone)")
-    if termo_cli:
-        cli_filtrados = [c for c in _clientes if termo_cli.lower() in str(c.get("nome","")) .lower() or termo_cli in str(c.get("telefone",""))]
-    else:
-        cli_filtrados = _clientes
-    cli_labels = [f"{c.get('nome','(sem nome)')} — {c.get('telefone')}" for c in cli_filtrados]
-    cli_opts = [c.get("telefone") for c in cli_filtrados]
-    telefone = st.selectbox("Telefone do cliente", options=["— selecione —"] + cli_opts, format_func=lambda v: ("— selecione —" if v=="— selecione —" else next((lbl for lbl, val in zip(cli_labels, cli_opts) if val==v), v)))
-
-    # Jogo (dropdown com busca)
-    colj1, colj2 = st.columns([2,3])
-    with colj1:
-        termo_jogo = st.text_input("Buscar jogo (nome/SKU)")
-    if termo_jogo:
-        jogos_filtrados = [j for j in _jogos if termo_jogo.lower() in str(j.get("nome","")) .lower() or termo_jogo.lower() in str(j.get("sku","")) .lower()]
-    else:
-        jogos_filtrados = _jogos
-    jogos_labels = [f"{j.get('nome','(sem nome)')}" + (f" (SKU {j['sku']})" if j.get('sku') else "") + f" [{str(j.get('id',''))[:8]}]" for j in jogos_filtrados]
-    jogos_opts = [j.get("id") for j in jogos_filtrados]
-    jogo_id = st.selectbox("Jogo", options=["— selecione —"] + jogos_opts, format_func=lambda v: ("— selecione —" if v=="— selecione —" else next((lbl for lbl, val in zip(jogos_labels, jogos_opts) if val==v), str(v))))
+    # Cliente e jogo (resultados das buscas acima)
+    cliente = cli_picker.selectbox("Telefone do cliente")
+    jogo = jogo_picker.selectbox("Jogo")
 
     preco = st.number_input("Preço aplicado (BRL)", min_value=0.0, step=1.0)
     status_item = st.selectbox("Status do item", ["DISPONIVEL","PRE-VENDA","RESERVADO"])
 
     if st.form_submit_button("Registrar movimento"):
-        if jogo_id == "— selecione —" or telefone == "— selecione —":
+        if cliente is None or jogo is None:
             st.error("Selecione um cliente e um jogo.")
         else:
             try:
-                r = add_item_by_movimento(tipo, telefone, jogo_id, preco, status_item)
+                r = add_item_by_movimento(tipo, cliente["telefone"], jogo["id"], preco, status_item)
+                page_cache.invalidate("movimentos", "containers", "itens")
                 cid = (r or {}).get("container_id", "—")
                 st.success(f"Movimento criado no container {cid}")
             except Exception as e:
                 st.error("Falha ao criar movimento.")
                 st.exception(e)
 
+# ---- Importação em lote (CSV) ----
+st.subheader("Importar movimentos (CSV)")
+st.caption("Colunas: tipo (COMPRA/LISTINHA), telefone, jogo (id ou SKU), preco, status_item (opcional, padrão DISPONIVEL). Separador , ou ; — UTF-8 ou Latin-1 (Excel).")
+arquivo = st.file_uploader("Arquivo CSV", type=["csv"], key="mov_csv")
+
+
+def _encoding_csv(f) -> str:
+    """UTF-8 se o arquivo todo decodifica; senão latin-1 (CSV exportado pelo Excel)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for bloco in iter(lambda: f.read(1 << 16), b""):
+            decoder.decode(bloco)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "latin-1"
+    finally:
+        f.seek(0)
+
+
+if arquivo is not None and st.button("Importar CSV"):
+    progresso = st.empty()
+    lidas = inseridos = 0
+    erros = []
+    # Lê o arquivo linha a linha (sem carregar tudo num DataFrame) e envia em lotes
+    texto = io.TextIOWrapper(arquivo, encoding=_encoding_csv(arquivo), newline="")
+    try:
+        cabecalho = texto.readline()
+        sep = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+        leitor = csv.DictReader(texto, fieldnames=next(csv.reader([cabecalho], delimiter=sep)), delimiter=sep)
+        for lote in add_items_bulk(leitor):
+            lidas += lote["linhas"]
+            inseridos += lote["inseridos"]
+            erros.extend(lote["erros"])
+            progresso.info(f"Processadas {lidas} linhas • {inseridos} inseridas • {len(erros)} com erro")
+    except Exception as e:
+        st.error("Falha na importação.")
+        st.exception(e)
+    finally:
+        texto.detach()
+    if inseridos:
+        page_cache.invalidate("movimentos", "containers", "itens")
+        st.success(f"{inseridos} movimento(s) importado(s).")
+    if erros:
+        st.warning(f"{len(erros)} linha(s) com erro (linha = número da linha de dados, sem o cabeçalho).")
+        df_erros = pd.DataFrame(erros)
+        st.dataframe(df_erros, use_container_width=True)
+        st.download_button("Baixar erros (CSV)", df_erros.to_csv(index=False), "movimentos_erros.csv", "text/csv")
+
 # ---- Lista de movimentos ----
 st.subheader("Últimos movimentos")
 try:
-    df = pd.DataFrame(list_movimentos(200))
+    movs = page_cache.ultimos_movimentos(200)
+    df = load_frame(movs, schemas.MOVIMENTOS)
     if df.empty:
         st.info("Nenhum movimento encontrado.")
     else:
-        df = format_ts(df)
-        st.dataframe(df, use_container_width=True)
+        show_frame(df)
         st.download_button("Exportar CSV", df.to_csv(index=False), "movimentos.csv", "text/csv")
 
         # Detalhe de uma transação específica
@@ -89,11 +127,8 @@ try:
         # Opções com label amigável
         def _label_mov(row):
             return f"{str(row.get('created_at',''))[:19]} • {row.get('tipo','?')} • {row.get('telefone_cliente','?')} • jogo {str(row.get('jogo_id',''))[:8]} • R$ {row.get('preco_aplicado_brl',0)}"
-        opts = df.to_dict("records")
-        labels = [_label_mov(r) for r in opts]
-        pick = st.selectbox("Selecionar movimento", ["— selecione —"] + labels, index=0, key="mov_pick")
-        if pick != "— selecione —":
-            sel = opts[labels.index(pick)]
+        sel = Picker("mov_pick", lambda r: r.get("id"), _label_mov).selectbox("Selecionar movimento", rows=movs)
+        if sel is not None:
             st.json(sel)
 except Exception as e:
     st.error("Falha ao carregar movimentos.")
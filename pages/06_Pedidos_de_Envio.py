@@ -1,8 +1,11 @@
-import streamlit as st, pandas as pd, asyncio, json
-from services.envios_service import listar_envios, atualizar_status_envio
+import streamlit as st, pandas as pd, asyncio
+from services.envios_service import atualizar_status_envio
 from services.supabase_client import get_client
 from services.whatsapp_service import send_message
-from services.utils import format_ts
+from services.utils import load_frame, show_frame
+from services import schemas
+from services import page_cache
+from services.picker import Picker
 
 st.title("Pedidos de Envio")
 
@@ -24,15 +27,35 @@ status = st.selectbox(
     ["Todos", "PENDENTE", "EM_PREPARACAO", "AGUARDANDO_PAGAMENTO", "ENVIADO", "CANCELADO"],
 )
 
-data = listar_envios(None if status == "Todos" else status)
-df = pd.DataFrame(data or [])
+# Paginação por cursor: cursors[i] é o `after` da página i
+page_size = 25
+if st.session_state.get("envios_filtro") != status:
+    st.session_state["envios_filtro"] = status
+    st.session_state["envios_cursors"] = [None]
+cursors = st.session_state["envios_cursors"]
+cur_page = len(cursors) - 1
+
+pagina = page_cache.envios(None if status == "Todos" else status, cursors[-1], page_size)
+data = pagina["rows"]
+df = load_frame(data, schemas.ENVIOS)
 
 if df.empty:
     st.info("Nenhum pedido encontrado para o filtro atual.")
 else:
-    # Tabela geral
-    df = format_ts(df)
-    st.dataframe(df, use_container_width=True)
+    # Tabela geral (só colunas de resumo)
+    start = cur_page * page_size
+    st.caption(f"Mostrando {start+1}–{start+len(df)} • Página {cur_page+1}")
+    show_frame(df)
+
+    c_prev, c_page, c_next = st.columns([1,2,1])
+    with c_prev:
+        if st.button("◀️ Anterior", disabled=(cur_page<=0)):
+            cursors.pop()
+            st.rerun()
+    with c_next:
+        if st.button("Próxima ▶️", disabled=(pagina["next"] is None)):
+            cursors.append(pagina["next"])
+            st.rerun()
 
     # ===== Seleção (itens clicáveis) =====
     st.subheader("Detalhes do envio")
@@ -40,12 +63,9 @@ else:
     def _label(row):
         return f"{str(row.get('created_at',''))[:19]} • {str(row.get('id',''))[:8]} • {row.get('status_envio','?')} • {row.get('telefone_cliente','?')}"
 
-    registros = df.to_dict("records")
-    labels = [_label(r) for r in registros]
-    escolha = st.selectbox("Selecione um envio", ["— selecione —"] + labels, index=0)
+    envio = Picker("envio_pick", lambda r: r.get("id"), _label).selectbox("Selecione um envio", rows=data)
 
-    if escolha != "— selecione —":
-        envio = registros[labels.index(escolha)]
+    if envio is not None:
         envio_id = envio.get("id")
 
         # Metadados chave
@@ -59,17 +79,14 @@ else:
         with col3:
             st.caption(f"Container: {envio.get('container_id','')}")
 
-        # Snapshot de itens
+        # Snapshot de itens (buscado só para o envio selecionado)
         st.markdown("**Itens do envio (snapshot)**")
-        snapshot = envio.get("itens_snapshot_json")
         try:
-            if isinstance(snapshot, str):
-                snapshot = json.loads(snapshot)
+            snapshot = page_cache.envio_snapshot(envio_id)
         except Exception:
-            pass
-        if isinstance(snapshot, list) and snapshot:
-            df_snap = pd.DataFrame(snapshot)
-            st.dataframe(df_snap, use_container_width=True)
+            snapshot = []
+        if snapshot:
+            show_frame(load_frame(snapshot, schemas.ITENS))
         else:
             st.caption("(sem itens no snapshot)")
 
@@ -98,6 +115,7 @@ else:
         if c1.button("Salvar status"):
             try:
                 r = atualizar_status_envio(envio_id, novo_status)
+                page_cache.invalidate("envios")
                 st.success(f"Status atualizado: {r['status_envio']}")
             except Exception as e:
                 st.error(str(e))
@@ -1,5 +1,5 @@
 import streamlit as st
-from services.reports_service import inventario_por_status, containers_por_status, passivo_ludocoins
+from services.page_cache import inventario_por_status, containers_por_status, passivo_ludocoins
 
 st.title("Relatórios")
 
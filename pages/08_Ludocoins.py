@@ -1,7 +1,12 @@
 import re
 import streamlit as st, pandas as pd
 from services.supabase_client import get_client
-from services.utils import format_ts
+from services.ludocoins_service import debit_ludocoins
+from services.utils import load_frame, show_frame
+from services import schemas
+from services import page_cache
+from services.clientes_service import cliente_label
+from services.picker import Picker
 
 st.title("LudoCoins")
 
@@ -19,61 +24,20 @@ with st.sidebar:
         st.session_state.clear()
         st.rerun()
 
-# ===== Seleção do cliente (com busca) =====
-try:
-    _clientes = (
-        supa.table("clientes")
-        .select("telefone,nome,ludocoins_saldo")
-        .order("created_at", desc=True)
-        .limit(2000)
-        .execute()
-        .data
-        or []
-    )
-except Exception:
-    _clientes = []
-
+# ===== Seleção do cliente (busca no banco: prefixo do telefone ou trecho do nome) =====
+cli_picker = Picker("lc_cli", lambda c: c.get("telefone"), cliente_label, search=page_cache.clientes_busca, tags=("clientes",))
 col_f1, col_f2 = st.columns([2, 3])
 with col_f1:
-    termo_cli = st.text_input("Buscar cliente (nome/telefone)")
-
-if termo_cli:
-    cli_filtrados = [
-        c
-        for c in _clientes
-        if termo_cli.lower() in str(c.get("nome", "")).lower()
-        or termo_cli in str(c.get("telefone", ""))
-    ]
-else:
-    cli_filtrados = _clientes
-
-cli_labels = [f"{c.get('nome','(sem nome)')} — {c.get('telefone')}" for c in cli_filtrados]
-cli_opts = [c.get("telefone") for c in cli_filtrados]
+    cli_picker.search_input("Buscar cliente (nome/telefone)")
 
-telefone = st.selectbox(
-    "Cliente",
-    options=["— selecione —"] + cli_opts,
-    format_func=lambda v: (
-        "— selecione —"
-        if v == "— selecione —"
-        else next((lbl for lbl, val in zip(cli_labels, cli_opts) if val == v), v)
-    ),
-)
+cliente = cli_picker.selectbox("Cliente")
 
-if telefone != "— selecione —":
-    tel = re.sub(r"\D+", "", telefone or "")
+if cliente is not None:
+    tel = re.sub(r"\D+", "", cliente.get("telefone") or "")
 
     # ===== Saldo atual =====
     try:
-        cli = (
-            supa.table("clientes")
-            .select("nome,ludocoins_saldo")
-            .eq("telefone", tel)
-            .maybe_single()
-            .execute()
-            .data
-            or {}
-        )
+        cli = page_cache.saldo_cliente(tel)
         saldo = float(cli.get("ludocoins_saldo", 0.0))
     except Exception:
         cli, saldo = {}, 0.0
@@ -94,44 +58,34 @@ if telefone != "— selecione —":
                 st.error("Saldo insuficiente para débito.")
             else:
                 try:
-                    # 1) registra a transação
-                    supa.table("ludocoin_transacoes").insert(
-                        {
-                            "telefone_cliente": tel,
-                            "tipo": "DEBITO_UTILIZACAO",
-                            "valor": float(valor),
-                            "observacao": obs or None,
-                        }
-                    ).execute()
-                    # 2) atualiza o saldo do cliente
-                    novo_saldo = saldo - float(valor)
-                    supa.table("clientes").update({"ludocoins_saldo": novo_saldo}).eq(
-                        "telefone", tel
-                    ).execute()
+                    # Débito atômico no banco: trava o cliente, valida saldo e grava o extrato
+                    r = debit_ludocoins(
+                        tel,
+                        float(valor),
+                        st.session_state.get("auth_user_email") or "streamlit",
+                        obs or None,
+                    )
+                    novo_saldo = float(r.get("saldo") or 0.0)
+                    # só o saldo/extrato deste cliente e os agregados de L$ mudaram
+                    page_cache.saldo_cliente.clear(tel)
+                    page_cache.transacoes_cliente.clear(tel)
+                    page_cache.passivo_ludocoins.clear()
+                    page_cache.dashboard_metrics.clear()
+                    page_cache.metrics_daily.clear()
                     st.success(f"Débito realizado. Novo saldo: {novo_saldo:.2f} L$.")
                     st.rerun()
                 except Exception as e:
-                    st.error(str(e))
+                    st.error(getattr(e, "message", None) or str(e))
 
     # ===== Últimas transações =====
     st.subheader("Últimas transações")
     try:
-        txs = (
-            supa.table("ludocoin_transacoes")
-            .select("created_at,tipo,valor,referencia_item_id,observacao")
-            .eq("telefone_cliente", tel)
-            .order("created_at", desc=True)
-            .limit(50)
-            .execute()
-            .data
-            or []
-        )
-        df = pd.DataFrame(txs)
+        txs = page_cache.transacoes_cliente(tel)
+        df = load_frame(txs, schemas.LUDOCOIN_TRANSACOES)
         if df.empty:
             st.caption("(sem transações)")
         else:
-            df = format_ts(df)
-            st.dataframe(df, use_container_width=True)
+            show_frame(df)
     except Exception as e:
         st.error("Falha ao carregar transações.")
         st.exception(e)
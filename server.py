@@ -1,37 +1,76 @@
 
 import os
 import re
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone, timedelta
 from fastapi import FastAPI, Request, Header
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
-from services.supabase_client import get_client
-from services.ludocoins_service import convert_item, get_saldo, list_ultimas_transacoes
-from services.envios_service import criar_pedido_envio
-from services.whatsapp_service import send_file
+from services.supabase_client import get_async_client, close_client, close_async_client
+from services.ludocoins_service import convert_items_async, get_saldo_async, list_ultimas_transacoes_async
+from services.envios_service import criar_pedido_envio_async
 from services.chat_state_service import (
-    get_state, set_state, clear_state, StateNames
+    get_state_async, set_state_async, clear_state_async, StateNames, ChatStateSnapshot
 )
 
 from services.containers_service import (
-    get_or_create_open_container,
-    list_container_items,
-    list_trocaveis,
-    list_enviaveis,
+    get_or_create_open_container_async,
+    list_container_items_async,
 )
 
-from services.whatsapp_service import send_message, send_file
+from services.whatsapp_service import send_message, send_file_async, open_http_client, close_http_client
+from services.webhook_queue import WebhookQueue
+from services.webhook_dedup import build_deduplicator
+from services.media_service import SpooledBody, MediaRef, parse_json_body
+from services.bot_router import Router, BotContext, Intents, classify, RE_ONLY_NUMBERS
 
 load_dotenv()
-app = FastAPI(title="Ludolovers Webhook")
+
+# "sync": processa dentro do request (padrão). "queue": responde 200 na hora e
+# processa num pool de workers (ordem preservada por telefone).
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync").lower()
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))
+
+# Descarte de reentregas pelo id da mensagem: "memory" (padrão), "supabase" (compartilhado) ou "off"
+WEBHOOK_DEDUP = os.getenv("WEBHOOK_DEDUP", "memory")
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "600"))
+WEBHOOK_DEDUP_MAX = int(os.getenv("WEBHOOK_DEDUP_MAX", "10000"))
+
+webhook_queue: WebhookQueue | None = None
+deduplicator = build_deduplicator(WEBHOOK_DEDUP, WEBHOOK_DEDUP_TTL, WEBHOOK_DEDUP_MAX)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global webhook_queue
+    await open_http_client()
+    if WEBHOOK_MODE == "queue":
+        webhook_queue = WebhookQueue(process_payload_once, workers=WEBHOOK_WORKERS, max_size=WEBHOOK_QUEUE_MAX)
+        webhook_queue.start()
+    yield
+    if webhook_queue is not None:
+        await webhook_queue.stop()
+        webhook_queue = None
+    await close_http_client()
+    # Fecha os pools de conexões do Supabase compartilhados pelo processo
+    await close_async_client()
+    close_client()
+
+
+app = FastAPI(title="Ludolovers Webhook", lifespan=lifespan)
 
 # ----------------- Helpers -----------------
 
-GREETINGS = {"OI", "OLA", "OLÁ", "HELLO", "HI", "EAI", "E AÍ", "BOM DIA", "BOA TARDE", "BOA NOITE"}
+YES = {"S", "SIM", "CONFIRMO"}
+NO = {"N", "NAO", "NÃO", "CANCELAR"}
+
+RE_NON_DIGITS = re.compile(r"\D+")
 
 def normalize_phone(raw: str) -> str:
-    return re.sub(r"\D+", "", raw or "")
+    return RE_NON_DIGITS.sub("", raw or "")
 
 def extract_phone_and_text(payload: dict):
     data = payload.get("data") or {}
@@ -42,26 +81,32 @@ def extract_phone_and_text(payload: dict):
 
     msg_obj = data.get("message") or {}
 
-    # caption primeiro (inclui topo), depois campos de texto, por último body (pode ser base64)
-    text = (
-        payload.get("caption")
-        or msg_obj.get("caption")
-        or data.get("caption")
-        or payload.get("text")
-        or payload.get("message")
-        or data.get("text")
-        or data.get("body")
-        or payload.get("body")
-        or ""
+    # caption primeiro (inclui topo), depois campos de texto, por último body (pode ser base64).
+    # Anexos grandes chegam como MediaRef e nunca são tratados como texto.
+    candidates = (
+        payload.get("caption"), msg_obj.get("caption"), data.get("caption"),
+        payload.get("text"), payload.get("message"), data.get("text"),
+        data.get("body"), payload.get("body"),
     )
-    text = (text or "").strip()
+    text = next((c for c in candidates if isinstance(c, str) and c), "")
+    text = text.strip()
 
     from_me = bool(payload.get("fromMe") or data.get("fromMe"))
     is_group = bool(payload.get("isGroupMsg") or payload.get("isGroup") or data.get("isGroupMsg") or data.get("isGroup"))
     return telefone, text, from_me, is_group, evt
 
+def extract_message_id(payload: dict) -> str | None:
+    data = payload.get("data") or {}
+    msg_obj = data.get("message") if isinstance(data.get("message"), dict) else {}
+    for raw in (payload.get("id"), data.get("id"), msg_obj.get("id"), payload.get("messageId")):
+        if isinstance(raw, dict):
+            raw = raw.get("_serialized") or raw.get("id")
+        if raw:
+            return str(raw)
+    return None
+
 def is_only_numbers_or_spaces(s: str) -> bool:
-    return bool(re.fullmatch(r"[0-9 ]+", (s or "").strip()))
+    return bool(RE_ONLY_NUMBERS.fullmatch((s or "").strip()))
 
 def render_menu() -> str:
     return (
@@ -77,10 +122,6 @@ def render_menu() -> str:
     )
 
 
-def is_back_to_menu(txt: str) -> bool:
-    t = (txt or "").strip().lower()
-    return t in ("0", "menu", "início", "inicio", "voltar")
-
 def render_container(itens: list[dict]) -> str:
     disponiveis, prevenda = [], []
     idx = 1
@@ -118,15 +159,15 @@ def render_elegiveis(elegiveis: list[dict]) -> str:
         lines.append(f"{i}. {it['nome']} → {it['credito']:.2f} L$")
     return "\n".join(lines)
 
-def safe_get_client():
+def safe_get_async_client():
     try:
-        return get_client()
+        return get_async_client()
     except Exception as e:
         print("Supabase client error:", e)
         return None
 
-def supa_select_one(table: str, **filters):
-    supa = safe_get_client()
+async def supa_select_one(table: str, **filters):
+    supa = safe_get_async_client()
     if not supa:
         return None
     try:
@@ -134,7 +175,7 @@ def supa_select_one(table: str, **filters):
         for k, v in filters.items():
             q = q.eq(k, v)
         # compat both maybe_single/single shapes
-        res = getattr(q, "maybe_single", lambda: q)().execute()
+        res = await getattr(q, "maybe_single", lambda: q)().execute()
         data = getattr(res, "data", None)
         if data is None and isinstance(res, dict):
             data = res.get("data")
@@ -143,399 +184,449 @@ def supa_select_one(table: str, **filters):
         print(f"supa_select_one error on {table}:", e)
         return None
 
+def is_actionable(telefone: str, from_me: bool, is_group: bool, evt: str) -> bool:
+    if evt and evt not in ("onmessage", "message", "chat:message"):
+        return False
+    if from_me or is_group:
+        return False
+    return bool(telefone)
+
 # ----------------- Endpoint -----------------
 
 @app.post("/webhook")
 async def webhook(request: Request, x_signature: str | None = Header(default="")):
+    # Corpo vai para um arquivo temporário acima de WEBHOOK_SPOOL_BYTES e o base64
+    # de anexos fica lá como MediaRef (ver services/media_service.py)
+    body = SpooledBody()
+    handed_off = False  # no modo queue o worker fecha o corpo depois de processar
     try:
-        payload = await request.json()
-    except Exception:
-        payload = {}
-    print("Incoming webhook payload (trim):", str(payload)[:500])
+        try:
+            await body.read_from(request)
+            payload = parse_json_body(body)
+            if not isinstance(payload, dict):
+                payload = {}
+        except Exception:
+            payload = {}
+        print("Incoming webhook payload (trim):", str(payload)[:500], f"({body.size} bytes)")
+
+        telefone, _text, from_me, is_group, evt = extract_phone_and_text(payload)
+        if not is_actionable(telefone, from_me, is_group, evt):
+            return {"ok": True}
 
+        # Reentrega do provedor (timeout/retry): descarta antes de qualquer acesso ao banco
+        message_id = extract_message_id(payload)
+        if deduplicator is not None and await deduplicator.is_duplicate(message_id):
+            print("webhook: mensagem duplicada ignorada:", telefone)
+            return {"ok": True, "duplicate": True}
+
+        if webhook_queue is not None and webhook_queue.running:
+            if webhook_queue.submit(telefone, payload, on_done=body.close):
+                handed_off = True
+                return {"ok": True, "queued": True}
+            # Fila do telefone cheia: processar aqui passaria na frente das mensagens
+            # ainda na fila. Recusa e deixa o provedor reentregar (o id é esquecido no dedup).
+            print("webhook_queue cheia; recusando para reentrega:", telefone)
+            if deduplicator is not None:
+                await deduplicator.forget(message_id)
+            return JSONResponse(status_code=503, content={"ok": False, "retry": True},
+                                headers={"Retry-After": "1"})
+
+        return await process_payload_once(payload)
+    finally:
+        if not handed_off:
+            body.close()
+
+
+@app.get("/webhook/stats")
+async def webhook_stats():
+    return {
+        "mode": WEBHOOK_MODE,
+        "queue": webhook_queue.stats() if webhook_queue is not None else None,
+        "dedup": deduplicator.stats() if deduplicator is not None else None,
+    }
+
+
+async def process_payload(payload: dict) -> dict:
     telefone, text, from_me, is_group, evt = extract_phone_and_text(payload)
 
-    if evt and evt not in ("onmessage", "message", "chat:message"):
-        return {"ok": True}
-    if from_me or is_group:
-        return {"ok": True}
-    if not telefone:
+    if not is_actionable(telefone, from_me, is_group, evt):
         return {"ok": True}
 
-    # Onboarding: se cliente não existe, pedir nome — tolerante a falhas
-    exists = supa_select_one("clientes", telefone=telefone)
-    state = None
+    state = await load_state(telefone)
+    token = _chat_state.set(state)
+    try:
+        result = await handle_message(payload, telefone, text, state)
+        # Persiste o que o handler mudou depois da última resposta enviada
+        await state.flush()
+        return result
+    finally:
+        _chat_state.reset(token)
+
+
+async def process_payload_once(payload: dict) -> dict:
+    """
+    process_payload (no request ou no worker da fila). Se falhar, o id da mensagem
+    sai do dedup: o is_duplicate já o registrou e a reentrega seria descartada.
+    """
+    try:
+        return await process_payload(payload)
+    except Exception:
+        if deduplicator is not None:
+            await deduplicator.forget(extract_message_id(payload))
+        raise
+
+
+# Snapshot do chat da mensagem em processamento (por task: request ou worker da fila)
+_chat_state: ContextVar[ChatStateSnapshot | None] = ContextVar("chat_state", default=None)
+
+
+async def _flush_state() -> None:
+    state = _chat_state.get()
+    if state is not None:
+        await state.flush()
+
+
+async def reply(telefone: str, text: str):
+    """
+    Envia a resposta depois de persistir o estado do chat: se o cliente responder
+    rápido (ex.: "S" a uma confirmação), a próxima mensagem já lê o estado novo.
+    Se o handler falhar depois, só o que já foi respondido fica persistido.
+    """
+    await _flush_state()
+    return await send_message(telefone, text)
+
+
+async def load_state(telefone: str) -> ChatStateSnapshot:
+    current = None
     try:
-        state = get_state(telefone)
+        current = await get_state_async(telefone)
     except Exception as e:
         print("get_state error:", e)
+    return ChatStateSnapshot(telefone, current, setter=set_state_async, clearer=clear_state_async)
 
-    if not exists and state is None:
-        try:
-            set_state(telefone, StateNames.ONBOARD_ASK_NAME, {})
-        except Exception as e:
-            print("set_state error (seguindo sem state persistence):", e)
-        await send_message(telefone, "Oi! Eu sou o *Ludinho* 🤖\nParece que é sua primeira vez aqui. Como você gostaria de ser chamado(a)?")
+
+async def handle_message(payload: dict, telefone: str, text: str, state: ChatStateSnapshot) -> dict:
+    # Onboarding: se cliente não existe, pedir nome — tolerante a falhas
+    exists = await supa_select_one("clientes", telefone=telefone)
+
+    if not exists and not state:
+        state.set(StateNames.ONBOARD_ASK_NAME, {})
+        await reply(telefone, "Oi! Eu sou o *Ludinho* 🤖\nParece que é sua primeira vez aqui. Como você gostaria de ser chamado(a)?")
         return {"ok": True}
 
-    if state and state.get("state") == StateNames.ONBOARD_ASK_NAME:
-        nome = (text or "").strip()
-        if len(nome) < 2:
-            await send_message(telefone, "Humm, esse nome ficou muito curtinho. Pode me dizer seu nome completo? 🙂")
-            return {"ok": True}
-        supa = safe_get_client()
-        if supa:
-            try:
-                supa.table("clientes").upsert({"telefone": telefone, "nome": nome}).execute()
-            except Exception as e:
-                print("upsert cliente error:", e)
-        try:
-            clear_state(telefone)
-        except Exception as e:
-            print("clear_state error:", e)
-        await send_message(telefone, f"Perfeito, *{nome}*! 🙌\n{render_menu()}")
+    intent, match = classify(text, has_state=bool(state))
+    ctx = BotContext(payload, telefone, text, state, intent, match)
+    handler = router.resolve(state.name, intent)
+    return await handler(ctx)
+
+# ----------------- Handlers -----------------
+
+router = Router()
+
+# ------- ONBOARDING -------
+@router.state(StateNames.ONBOARD_ASK_NAME)
+async def handle_onboard_name(ctx: BotContext) -> dict:
+    nome = ctx.text.strip()
+    if len(nome) < 2:
+        await reply(ctx.telefone, "Humm, esse nome ficou muito curtinho. Pode me dizer seu nome completo? 🙂")
         return {"ok": True}
-    # PATCH START: menu global (0/menu/inicio) + limpar estado
-    upper = (text or "").upper()
-    if upper in GREETINGS or is_back_to_menu(text):
+    supa = safe_get_async_client()
+    if supa:
         try:
-            clear_state(telefone)
+            await supa.table("clientes").upsert({"telefone": ctx.telefone, "nome": nome}).execute()
         except Exception as e:
-            print("clear_state error:", e)
-        await send_message(telefone, render_menu())
-        return {"ok": True}
-    # PATCH END
-
-    if (text or "").strip() in {"1", "2", "3", "4", "5"} and not state:
-        upper = {"1": "CONTAINER", "2": "LUDOCOINS", "3": "TROCAR", "4": "ENVIAR", "5": "AJUDA"}[(text or "").strip()]
-
-    # PATCH START: fluxo COMPROVANTE (stateful + atalho com 'COMPROVANTE <ID>')
-    m_comp = re.match(r"^\s*COMPROVANTE\s+([A-Za-z0-9\-\._]+)\s*$", text or "", flags=re.IGNORECASE)
-    if m_comp:
-        txid = m_comp.group(1)
-        supa = get_client()
-        cfg = supa.table("configuracoes").select("numero_recebimento_comprovantes").eq("id", 1).single().execute().data
-        destino = (cfg or {}).get("numero_recebimento_comprovantes")
-        if not destino:
-            await send_message(telefone, "Ainda não há um número configurado para receber comprovantes. Tente mais tarde.")
-            return {"ok": True}
+            print("upsert cliente error:", e)
+    ctx.state.clear()
+    await reply(ctx.telefone, f"Perfeito, *{nome}*! 🙌\n{render_menu()}")
+    return {"ok": True}
 
-        base64_data, filename = None, None
-        try:
-            msg = (payload.get("data") or {}).get("message") or {}
-            if isinstance(msg.get("file"), dict):
-                base64_data = msg["file"].get("data")
-                filename = msg["file"].get("filename") or "comprovante"
-            elif isinstance(msg.get("mediaData"), dict):
-                base64_data = msg["mediaData"].get("data")
-                filename = msg["mediaData"].get("filename") or "comprovante"
-            else:
-                base64_data = msg.get("base64")
-                filename = msg.get("filename") or "comprovante"
-        except Exception as e:
-            print("parse comprovante media error:", e)
+# ------- MENU global (saudações, 0/menu/inicio) + limpar estado -------
+@router.intent(Intents.MENU)
+async def handle_menu(ctx: BotContext) -> dict:
+    ctx.state.clear()
+    await reply(ctx.telefone, render_menu())
+    return {"ok": True}
 
-        if not base64_data:
-            try:
-                d0 = payload or {}
+# ------- COMPROVANTE -------
+def extract_comprovante_media(payload: dict):
+    base64_data, filename = None, None
+    try:
+        msg = (payload.get("data") or {}).get("message") or {}
+        if isinstance(msg.get("file"), dict):
+            base64_data = msg["file"].get("data")
+            filename = msg["file"].get("filename") or "comprovante"
+        elif isinstance(msg.get("mediaData"), dict):
+            base64_data = msg["mediaData"].get("data")
+            filename = msg["mediaData"].get("filename") or "comprovante"
+        else:
+            base64_data = msg.get("base64")
+            filename = msg.get("filename") or "comprovante"
+    except Exception as e:
+        print("parse comprovante media error:", e)
+
+    if not base64_data:
+        try:
+            for d0 in (payload.get("data") or {}, payload or {}):
                 if isinstance(d0.get("file"), dict):
                     base64_data = d0["file"].get("data")
                     filename = d0["file"].get("filename") or filename or "comprovante"
                 elif d0.get("base64"):
                     base64_data = d0.get("base64")
                     filename = d0.get("filename") or filename or "comprovante"
-                elif isinstance(d0.get("body"), str) and len(d0.get("body") or "") > 100:
+                elif d0 is payload and isinstance(d0.get("body"), (str, MediaRef)) and len(d0.get("body") or "") > 100:
                     # body contendo base64 (imagem/pdf)
                     base64_data = d0["body"]
                     filename = d0.get("filename") or filename or "comprovante"
-            except Exception as e:
-                print("parse comprovante media (top-level) error:", e)
-
-        if not base64_data:
-            await send_message(telefone, "Por favor, anexe um PDF ou imagem e envie novamente com: COMPROVANTE <ID_DA_TRANSACAO>.")
-            return {"ok": True}
-
-        caption = f"Comprovante de pagamento — ID {txid}\nDe: {telefone}"
-        try:
-            send_file(destino, base64_data, filename, caption)
-            await send_message(telefone, "Comprovante encaminhado. Obrigado! ✅")
+                if base64_data:
+                    break
         except Exception as e:
-            print("send_file comprovante error:", e)
-            await send_message(telefone, "Não consegui encaminhar o comprovante agora. Tente novamente mais tarde.")
-        return {"ok": True}
+            print("parse comprovante media (top-level) error:", e)
+
+    return base64_data, filename
 
-    if (text or "").strip() == "6" or (upper.startswith("COMPROVANTE") and not m_comp):
-        try:
-            set_state(telefone, StateNames.COMPROVANTE_WAIT, {})
-        except Exception as e:
-            print("set_state error (COMPROVANTE_WAIT):", e)
-        await send_message(telefone, "Para enviar seu comprovante, anexe um PDF ou imagem e escreva: COMPROVANTE <ID_DA_TRANSACAO>")
-        return {"ok": True}
 
-    d = payload.get("data") or {}
+async def forward_comprovante(ctx: BotContext, missing_file_msg: str) -> bool:
+    """Encaminha o anexo ao número configurado. Retorna True se enviou."""
+    d = ctx.payload.get("data") or {}
     print("debug: data keys =", list(d.keys()))
     print("debug: message keys =", list((d.get("message") or {}).keys()))
 
+    txid = ctx.match.group(1)
+    supa = get_async_client()
+    cfg = (await supa.table("configuracoes").select("numero_recebimento_comprovantes").eq("id", 1).single().execute()).data
+    destino = (cfg or {}).get("numero_recebimento_comprovantes")
+    if not destino:
+        await reply(ctx.telefone, "Ainda não há um número configurado para receber comprovantes. Tente mais tarde.")
+        return False
+
+    base64_data, filename = extract_comprovante_media(ctx.payload)
+    if not base64_data:
+        await reply(ctx.telefone, missing_file_msg)
+        return False
+
+    caption = f"Comprovante de pagamento — ID {txid}\nDe: {ctx.telefone}"
     try:
-        current_comp = get_state(telefone)
+        await _flush_state()
+        await send_file_async(destino, base64_data, filename, caption)
+        await reply(ctx.telefone, "Comprovante encaminhado. Obrigado! ✅")
+        return True
     except Exception as e:
-        current_comp = None
-    if current_comp and current_comp.get("state") == StateNames.COMPROVANTE_WAIT:
-        m_comp2 = re.match(r"^\s*COMPROVANTE\s+([A-Za-z0-9\-\._]+)\s*$", text or "", flags=re.IGNORECASE)
-        if not m_comp2:
-            await send_message(telefone, "Envie a mensagem no formato: COMPROVANTE <ID_DA_TRANSACAO>, com o arquivo anexado.")
-            return {"ok": True}
-        txid = m_comp2.group(1)
-        supa = get_client()
-        cfg = supa.table("configuracoes").select("numero_recebimento_comprovantes").eq("id", 1).single().execute().data
-        destino = (cfg or {}).get("numero_recebimento_comprovantes")
-        if not destino:
-            await send_message(telefone, "Ainda não há um número configurado para receber comprovantes. Tente mais tarde.")
-            return {"ok": True}
+        print("send_file comprovante error:", e)
+        await reply(ctx.telefone, "Não consegui encaminhar o comprovante agora. Tente novamente mais tarde.")
+        return False
 
-        base64_data, filename = None, None
-        try:
-            msg = (payload.get("data") or {}).get("message") or {}
-            if isinstance(msg.get("file"), dict):
-                base64_data = msg["file"].get("data")
-                filename = msg["file"].get("filename") or "comprovante"
-            elif isinstance(msg.get("mediaData"), dict):
-                base64_data = msg["mediaData"].get("data")
-                filename = msg["mediaData"].get("filename") or "comprovante"
-            else:
-                base64_data = msg.get("base64")
-                filename = msg.get("filename") or "comprovante"
-        except Exception as e:
-            print("parse comprovante media error:", e)
+@router.intent(Intents.COMPROVANTE_ENVIO)
+async def handle_comprovante_envio(ctx: BotContext) -> dict:
+    await forward_comprovante(ctx, "Por favor, anexe um PDF ou imagem e envie novamente com: COMPROVANTE <ID_DA_TRANSACAO>.")
+    return {"ok": True}
 
-        if not base64_data:
-            try:
-                d = payload.get("data") or {}
-                if isinstance(d.get("file"), dict):
-                    base64_data = d["file"].get("data")
-                    filename = d["file"].get("filename") or filename or "comprovante"
-                elif d.get("base64"):
-                    base64_data = d.get("base64")
-                    filename = d.get("filename") or filename or "comprovante"
-            except Exception as e:
-                print("parse comprovante media (fallback) error:", e)
-
-        if not base64_data:
-            await send_message(telefone, "Parece que não veio arquivo. Anexe um PDF/Imagem e envie novamente com: COMPROVANTE <ID_DA_TRANSACAO>.")
-            return {"ok": True}
+@router.intent(Intents.COMPROVANTE)
+async def handle_comprovante_pedido(ctx: BotContext) -> dict:
+    ctx.state.set(StateNames.COMPROVANTE_WAIT, {})
+    await reply(ctx.telefone, "Para enviar seu comprovante, anexe um PDF ou imagem e escreva: COMPROVANTE <ID_DA_TRANSACAO>")
+    return {"ok": True}
 
-        caption = f"Comprovante de pagamento — ID {txid}\nDe: {telefone}"
-        try:
-            send_file(destino, base64_data, filename, caption)
-            await send_message(telefone, "Comprovante encaminhado. Obrigado! ✅")
-            try:
-                clear_state(telefone)
-            except Exception as e:
-                print("clear_state error (COMPROVANTE_WAIT):", e)
-            await send_message(telefone, render_menu())
-        except Exception as e:
-            print("send_file comprovante error:", e)
-            await send_message(telefone, "Não consegui encaminhar o comprovante agora. Tente novamente mais tarde.")
-        return {"ok": True}
-    # PATCH END
+@router.state(StateNames.COMPROVANTE_WAIT, passthrough=(Intents.MENU, Intents.COMPROVANTE))
+async def handle_comprovante_wait(ctx: BotContext) -> dict:
+    await reply(ctx.telefone, "Envie a mensagem no formato: COMPROVANTE <ID_DA_TRANSACAO>, com o arquivo anexado.")
+    return {"ok": True}
+
+async def handle_comprovante_wait_envio(ctx: BotContext) -> dict:
+    enviado = await forward_comprovante(ctx, "Parece que não veio arquivo. Anexe um PDF/Imagem e envie novamente com: COMPROVANTE <ID_DA_TRANSACAO>.")
+    if enviado:
+        ctx.state.clear()
+        await reply(ctx.telefone, render_menu())
+    return {"ok": True}
+
+router.on(StateNames.COMPROVANTE_WAIT, Intents.COMPROVANTE_ENVIO, handle_comprovante_wait_envio)
 
 # ------- CONTAINER -------
-    if upper.startswith("CONTAINER"):
-        try:
-            container_id = get_or_create_open_container(telefone)
-            itens = list_container_items(container_id)
-            # PATCH START: ocultar itens RESGATADO na listagem do cliente
-            itens = [it for it in (itens or []) if (it.get("status_item") != "RESGATADO")]
-            # PATCH END
-            await send_message(telefone, render_container(itens))
-        except Exception as e:
-            print("CONTAINER flow error:", e)
-            await send_message(telefone, "Não consegui acessar seu container agora. Tente novamente mais tarde.")
+@router.intent(Intents.CONTAINER)
+async def handle_container(ctx: BotContext) -> dict:
+    try:
+        container_id = await get_or_create_open_container_async(ctx.telefone)
+        itens = await list_container_items_async(container_id)
+        # ocultar itens RESGATADO na listagem do cliente
+        itens = [it for it in (itens or []) if (it.get("status_item") != "RESGATADO")]
+        await reply(ctx.telefone, render_container(itens))
+    except Exception as e:
+        print("CONTAINER flow error:", e)
+        await reply(ctx.telefone, "Não consegui acessar seu container agora. Tente novamente mais tarde.")
+    return {"ok": True}
+
+# ------- LUDOCOINS -------
+@router.intent(Intents.LUDOCOINS)
+async def handle_ludocoins(ctx: BotContext) -> dict:
+    try:
+        saldo = float(await get_saldo_async(ctx.telefone) or 0.0)
+        ult = await list_ultimas_transacoes_async(ctx.telefone, limit=5) or []
+        lines = [f"Saldo: {saldo:.2f} L$"]
+        for t in ult:
+            tipo = t.get("tipo","?")
+            valor = float(t.get("valor") or 0)
+            created = t.get("created_at","")
+            lines.append(f"- {tipo}: {valor:.2f} ({created})")
+        await reply(ctx.telefone, "\n".join(lines))
+    except Exception as e:
+        print("LUDOCOINS flow error:", e)
+        await reply(ctx.telefone, "Não consegui consultar seu saldo agora. Tente novamente mais tarde.")
+    return {"ok": True}
+
+# ------- TROCAR (stateful) -------
+TROCA_PASSTHROUGH = (Intents.MENU, Intents.COMPROVANTE_ENVIO, Intents.COMPROVANTE, Intents.CONTAINER, Intents.LUDOCOINS)
+
+@router.state(StateNames.TROCA_LISTANDO, passthrough=TROCA_PASSTHROUGH)
+async def handle_troca_listando(ctx: BotContext) -> dict:
+    telefone, state = ctx.telefone, ctx.state
+    if not is_only_numbers_or_spaces(ctx.text):
+        await reply(telefone, "Por favor, responda só com os números dos itens que deseja trocar. Ex: *1 3*")
+        await reply(telefone, render_elegiveis(state.data.get("elegiveis", [])))
+        return {"ok": True}
+    idxs = [int(p) for p in ctx.text.split() if p.isdigit()]
+    eleg = state.data.get("elegiveis", [])
+    escolhidos = []
+    for i in idxs:
+        if 1 <= i <= len(eleg):
+            escolhidos.append(eleg[i-1])
+    if not escolhidos:
+        await reply(telefone, "Índice inválido. Tente novamente.")
+        await reply(telefone, render_elegiveis(eleg))
         return {"ok": True}
+    total = sum(float(x["credito"]) for x in escolhidos)
+    state.set(StateNames.TROCA_CONFIRM, {"escolhidos": escolhidos})
+    nomes = ", ".join(x["nome"] for x in escolhidos)
+    msg_confirm = (
+        f"Você selecionou: *{nomes}*.\n"
+        f"Total de crédito: *{total:.2f} L$*.\n"
+        "⚠️ *Atenção*: esta ação é *irreversível*.\n"
+        "Confirma a conversão? (Responda *S* ou *N*)"
+    )
+    await reply(telefone, msg_confirm)
+    return {"ok": True}
 
-    # ------- LUDOCOINS -------
-    if upper.startswith("LUDOCOINS"):
+@router.state(StateNames.TROCA_CONFIRM, passthrough=TROCA_PASSTHROUGH)
+async def handle_troca_confirm(ctx: BotContext) -> dict:
+    telefone, state = ctx.telefone, ctx.state
+    if ctx.upper in YES:
+        escolhidos = state.data.get("escolhidos", [])
+        ids = [it.get("id") for it in escolhidos if it.get("id")]
+        credito_total, convertidos, novo_saldo = 0.0, 0, None
         try:
-            saldo = float(get_saldo(telefone) or 0.0)
-            ult = list_ultimas_transacoes(telefone, limit=5) or []
-            lines = [f"Saldo: {saldo:.2f} L$"]
-            for t in ult:
-                tipo = t.get("tipo","?")
-                valor = float(t.get("valor") or 0)
-                created = t.get("created_at","")
-                lines.append(f"- {tipo}: {valor:.2f} ({created})")
-            await send_message(telefone, "\n".join(lines))
+            # Uma RPC para todos os itens; já devolve o saldo atualizado
+            res = await convert_items_async(ids, atendente_email="whatsapp-bot@ludolovers", telefone=telefone)
+            for r in res.get("itens") or []:
+                if r.get("ok"):
+                    convertidos += 1
+                    credito_total += float(r.get("valor") or 0)
+                else:
+                    print("convert_item error:", r.get("item_id"), r.get("erro"))
+            novo_saldo = res.get("saldo")
         except Exception as e:
-            print("LUDOCOINS flow error:", e)
-            await send_message(telefone, "Não consegui consultar seu saldo agora. Tente novamente mais tarde.")
+            print("convert_items error:", e)
+        state.clear()
+        if novo_saldo is None:
+            try:
+                novo_saldo = await get_saldo_async(telefone)
+            except Exception:
+                novo_saldo = 0.0
+        novo_saldo = float(novo_saldo or 0.0)
+        await reply(telefone, f"Prontinho! Converti {convertidos} item(ns). Crédito: *{credito_total:.2f} L$*.\nSeu saldo agora é *{novo_saldo:.2f} L$*.")
+        return {"ok": True}
+    elif ctx.upper in NO:
+        state.clear()
+        await reply(telefone, "Sem problemas — operação cancelada. Se quiser, digite *3* para listar novamente os itens elegíveis.")
+        return {"ok": True}
+    else:
+        await reply(telefone, "Responda apenas com *S* (sim) ou *N* (não).")
         return {"ok": True}
 
-    # ------- TROCAR (stateful) -------
+@router.intent(Intents.TROCAR)
+async def handle_trocar(ctx: BotContext) -> dict:
     try:
-        current = get_state(telefone)
-    except Exception as e:
-        print("get_state error (troca):", e)
-        current = None
-
-    if current and current.get("state") in (StateNames.TROCA_LISTANDO, StateNames.TROCA_CONFIRM):
-        if current["state"] == StateNames.TROCA_LISTANDO:
-            if not is_only_numbers_or_spaces(text):
-                await send_message(telefone, "Por favor, responda só com os números dos itens que deseja trocar. Ex: *1 3*")
-                await send_message(telefone, render_elegiveis(current["data"].get("elegiveis", [])))
-                return {"ok": True}
-            idxs = [int(p) for p in (text or "").split() if p.isdigit()]
-            eleg = current["data"].get("elegiveis", [])
-            escolhidos = []
-            for i in idxs:
-                if 1 <= i <= len(eleg):
-                    escolhidos.append(eleg[i-1])
-            if not escolhidos:
-                await send_message(telefone, "Índice inválido. Tente novamente.")
-                await send_message(telefone, render_elegiveis(eleg))
-                return {"ok": True}
-            total = sum(float(x["credito"]) for x in escolhidos)
-            try:
-                set_state(telefone, StateNames.TROCA_CONFIRM, {"escolhidos": escolhidos})
-            except Exception as e:
-                print("set_state error (TROCA_CONFIRM):", e)
-            nomes = ", ".join(x["nome"] for x in escolhidos)
-            msg_confirm = (
-                f"Você selecionou: *{nomes}*.\n"
-                f"Total de crédito: *{total:.2f} L$*.\n"
-                "⚠️ *Atenção*: esta ação é *irreversível*.\n"
-                "Confirma a conversão? (Responda *S* ou *N*)"
-            )
-            await send_message(telefone, msg_confirm)
+        container_id = await get_or_create_open_container_async(ctx.telefone)
+        itens = await list_container_items_async(container_id)
+        elegiveis = list_elegiveis(itens)
+        if not elegiveis:
+            await reply(ctx.telefone, "Não há itens elegíveis para troca no momento.")
             return {"ok": True}
+        ctx.state.set(StateNames.TROCA_LISTANDO, {"elegiveis": elegiveis})
+        await reply(ctx.telefone, render_elegiveis(elegiveis))
+    except Exception as e:
+        print("TROCAR flow error:", e)
+        await reply(ctx.telefone, "Não consegui listar itens elegíveis agora. Tente novamente mais tarde.")
+    return {"ok": True}
 
-        if current["state"] == StateNames.TROCA_CONFIRM:
-            if upper in {"S", "SIM", "CONFIRMO"}:
-                escolhidos = current["data"].get("escolhidos", [])
-                credito_total = 0.0
-                for it in escolhidos:
-                    try:
-                        convert_item(it.get("id"), atendente_email="whatsapp-bot@ludolovers")
-                        credito_total += float(it.get("credito") or 0)
-                    except Exception as e:
-                        print("convert_item error:", e)
-                try:
-                    clear_state(telefone)
-                except Exception as e:
-                    print("clear_state error:", e)
-                try:
-                    novo_saldo = float(get_saldo(telefone) or 0.0)
-                except Exception:
-                    novo_saldo = 0.0
-                await send_message(telefone, f"Prontinho! Converti {len(escolhidos)} item(ns). Crédito: *{credito_total:.2f} L$*.\nSeu saldo agora é *{novo_saldo:.2f} L$*.")
-                return {"ok": True}
-            elif upper in {"N", "NAO", "NÃO", "CANCELAR"}:
-                try:
-                    clear_state(telefone)
-                except Exception as e:
-                    print("clear_state error:", e)
-                await send_message(telefone, "Sem problemas — operação cancelada. Se quiser, digite *3* para listar novamente os itens elegíveis.")
-                return {"ok": True}
-            else:
-                await send_message(telefone, "Responda apenas com *S* (sim) ou *N* (não).")
-                return {"ok": True}
-
-    if upper.startswith("TROCAR"):
+# ------- ENVIAR (stateful) -------
+@router.state(StateNames.ENVIAR_CONFIRM, passthrough=TROCA_PASSTHROUGH + (Intents.TROCAR,))
+async def handle_enviar_confirm(ctx: BotContext) -> dict:
+    telefone, state = ctx.telefone, ctx.state
+    if ctx.upper in YES:
         try:
-            container_id = get_or_create_open_container(telefone)
-            itens = list_container_items(container_id)
-            elegiveis = list_elegiveis(itens)
-            if not elegiveis:
-                await send_message(telefone, "Não há itens elegíveis para troca no momento.")
-                return {"ok": True}
-            try:
-                set_state(telefone, StateNames.TROCA_LISTANDO, {"elegiveis": elegiveis})
-            except Exception as e:
-                print("set_state error (TROCA_LISTANDO):", e)
-            await send_message(telefone, render_elegiveis(elegiveis))
+            container_id = await get_or_create_open_container_async(telefone)
+            itens = await list_container_items_async(container_id)
+            snapshot = [{
+                "jogo": (it.get("jogos") or {}).get("nome", "Jogo"),
+                "origem": it.get("origem"),
+                "status_item": it.get("status_item"),
+                "preco_aplicado_brl": it.get("preco_aplicado_brl"),
+            } for it in (itens or [])]
+            supa = safe_get_async_client()
+            nome = f"Cliente {telefone}"
+            if supa:
+                cli = await supa.table("clientes").select("nome").eq("telefone", telefone).maybe_single().execute()
+                cli_data = getattr(cli, "data", None) if not isinstance(cli, dict) else cli.get("data")
+                if cli_data and cli_data.get("nome"):
+                    nome = cli_data["nome"]
+            envio = await criar_pedido_envio_async(container_id, telefone, nome, snapshot)
+            state.clear()
+            await reply(telefone, f"Pedido criado com sucesso! 📨\nID: *{envio['id']}* • Status: *{envio['status_envio']}*")
         except Exception as e:
-            print("TROCAR flow error:", e)
-            await send_message(telefone, "Não consegui listar itens elegíveis agora. Tente novamente mais tarde.")
+            print("ENVIAR confirm error:", e)
+            await reply(telefone, "Não consegui criar o pedido agora. Tente novamente mais tarde.")
+        return {"ok": True}
+    elif ctx.upper in NO:
+        state.clear()
+        await reply(telefone, "Beleza! Pedido cancelado. Se quiser tentar de novo, mande *4* (ENVIAR).")
+        return {"ok": True}
+    else:
+        await reply(telefone, "Responda apenas com *S* (sim) ou *N* (não).")
         return {"ok": True}
 
-    # ------- ENVIAR (stateful) -------
+@router.intent(Intents.ENVIAR)
+async def handle_enviar(ctx: BotContext) -> dict:
+    telefone = ctx.telefone
     try:
-        current = get_state(telefone)
+        container_id = await get_or_create_open_container_async(telefone)
+        itens = await list_container_items_async(container_id) or []
+        # filtrar apenas DISPONIVEL
+        itens = [it for it in itens if it.get("status_item") == "DISPONIVEL"]
+        if not itens:
+            await reply(telefone, "Não consigo criar envio: seu container está vazio ou só tem itens em PRÉ-VENDA.")
+            await reply(telefone, render_menu())
+            return {"ok": True}
+        resumo = "\n".join([
+            f"- {(it.get('jogos') or {}).get('nome','(sem nome)')} (origem {it.get('origem')}, {it.get('status_item')})" for it in itens
+        ]) or "—"
+        supa = get_async_client()
+        cliente = (await supa.table("clientes").select("endereco, nome").eq("telefone", telefone).single().execute()).data
+        endereco = (cliente or {}).get("endereco") or "(endereço não cadastrado)"
+        ctx.state.set(StateNames.ENVIAR_CONFIRM, {"snapshot": itens})
+        confirm_text = (
+            "Você está pedindo o *envio* do seu container com os itens:\n"
+            + resumo
+            + "\n\nEndereço de entrega:\n"
+            + endereco
+            + "\n\n⚠️ *Atenção*: esta ação é *irreversível*.\n"
+            + "Confirma o pedido? (Responda *S* ou *N*)"
+        )
+        await reply(telefone, confirm_text)
     except Exception as e:
-        print("get_state error (enviar):", e)
-        current = None
+        print("ENVIAR flow error:", e)
+        await reply(telefone, "Não consegui acessar seu container agora. Tente novamente mais tarde.")
+    return {"ok": True}
 
-    if current and current.get("state") == StateNames.ENVIAR_CONFIRM:
-        if upper in {"S", "SIM", "CONFIRMO"}:
-            try:
-                container_id = get_or_create_open_container(telefone)
-                itens = list_container_items(container_id)
-                snapshot = [{
-                    "jogo": (it.get("jogos") or {}).get("nome", "Jogo"),
-                    "origem": it.get("origem"),
-                    "status_item": it.get("status_item"),
-                    "preco_aplicado_brl": it.get("preco_aplicado_brl"),
-                } for it in (itens or [])]
-                supa = safe_get_client()
-                nome = f"Cliente {telefone}"
-                if supa:
-                    cli = supa.table("clientes").select("nome").eq("telefone", telefone).maybe_single().execute()
-                    cli_data = getattr(cli, "data", None) if not isinstance(cli, dict) else cli.get("data")
-                    if cli_data and cli_data.get("nome"):
-                        nome = cli_data["nome"]
-                envio = criar_pedido_envio(container_id, telefone, nome, snapshot)
-                try:
-                    clear_state(telefone)
-                except Exception as e:
-                    print("clear_state error:", e)
-                await send_message(telefone, f"Pedido criado com sucesso! 📨\nID: *{envio['id']}* • Status: *{envio['status_envio']}*")
-            except Exception as e:
-                print("ENVIAR confirm error:", e)
-                await send_message(telefone, "Não consegui criar o pedido agora. Tente novamente mais tarde.")
-            return {"ok": True}
-        elif upper in {"N", "NAO", "NÃO", "CANCELAR"}:
-            try:
-                clear_state(telefone)
-            except Exception as e:
-                print("clear_state error:", e)
-            await send_message(telefone, "Beleza! Pedido cancelado. Se quiser tentar de novo, mande *4* (ENVIAR).")
-            return {"ok": True}
-        else:
-            await send_message(telefone, "Responda apenas com *S* (sim) ou *N* (não).")
-            return {"ok": True}
-    if upper.startswith("ENVIAR"):
-        try:
-            container_id = get_or_create_open_container(telefone)
-            itens = list_container_items(container_id) or []
-            # PATCH START: filtrar apenas DISPONIVEL
-            itens = [it for it in itens if it.get("status_item") == "DISPONIVEL"]
-            if not itens:
-                await send_message(telefone, "Não consigo criar envio: seu container está vazio ou só tem itens em PRÉ-VENDA.")
-                await send_message(telefone, render_menu())
-                return {"ok": True}
-            # PATCH END
-            resumo = "\n".join([
-                f"- {(it.get('jogos') or {}).get('nome','(sem nome)')} (origem {it.get('origem')}, {it.get('status_item')})" for it in itens
-            ]) or "—"
-            supa = get_client()
-            cliente = supa.table("clientes").select("endereco, nome").eq("telefone", telefone).single().execute().data
-            endereco = (cliente or {}).get("endereco") or "(endereço não cadastrado)"
-            try:
-                set_state(telefone, StateNames.ENVIAR_CONFIRM, {"snapshot": itens})
-            except Exception as e:
-                print("set_state error (ENVIAR_CONFIRM):", e)
-            confirm_text = (
-                "Você está pedindo o *envio* do seu container com os itens:\n"
-                + resumo
-                + "\n\nEndereço de entrega:\n"
-                + endereco
-                + "\n\n⚠️ *Atenção*: esta ação é *irreversível*.\n"
-                + "Confirma o pedido? (Responda *S* ou *N*)"
-            )
-            await send_message(telefone, confirm_text)
-        except Exception as e:
-            print("ENVIAR flow error:", e)
-            await send_message(telefone, "Não consegui acessar seu container agora. Tente novamente mais tarde.")
-        return {"ok": True}
-# Fallback
-    await send_message(telefone, "Não entendi 🤔\n" + render_menu())
+# ------- Fallback -------
+@router.set_fallback
+async def handle_fallback(ctx: BotContext) -> dict:
+    await reply(ctx.telefone, "Não entendi 🤔\n" + render_menu())
     return {"ok": True}
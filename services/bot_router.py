@@ -0,0 +1,119 @@
+from __future__ import annotations
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+ANY = "*"
+
+
+class Intents:
+    MENU = "MENU"
+    COMPROVANTE_ENVIO = "COMPROVANTE_ENVIO"  # "COMPROVANTE <ID>" (com anexo)
+    COMPROVANTE = "COMPROVANTE"              # "6" ou "COMPROVANTE" sem ID
+    CONTAINER = "CONTAINER"
+    LUDOCOINS = "LUDOCOINS"
+    TROCAR = "TROCAR"
+    ENVIAR = "ENVIAR"
+    AJUDA = "AJUDA"
+    TEXTO = "TEXTO"                          # texto livre: nomes, índices, S/N...
+
+ALL_INTENTS = (
+    Intents.MENU, Intents.COMPROVANTE_ENVIO, Intents.COMPROVANTE, Intents.CONTAINER,
+    Intents.LUDOCOINS, Intents.TROCAR, Intents.ENVIAR, Intents.AJUDA, Intents.TEXTO,
+)
+
+GREETINGS = {"OI", "OLA", "OLÁ", "HELLO", "HI", "EAI", "E AÍ", "BOM DIA", "BOA TARDE", "BOA NOITE"}
+MENU_WORDS = {"0", "menu", "início", "inicio", "voltar"}
+# Atalhos numéricos do menu só valem fora de um fluxo (com estado, "1" é índice/resposta)
+MENU_NUMBERS = {"1": Intents.CONTAINER, "2": Intents.LUDOCOINS, "3": Intents.TROCAR, "4": Intents.ENVIAR, "5": Intents.AJUDA}
+PREFIX_INTENTS = (
+    ("CONTAINER", Intents.CONTAINER),
+    ("LUDOCOINS", Intents.LUDOCOINS),
+    ("TROCAR", Intents.TROCAR),
+    ("ENVIAR", Intents.ENVIAR),
+)
+
+RE_COMPROVANTE = re.compile(r"^\s*COMPROVANTE\s+([A-Za-z0-9\-\._]+)\s*$", flags=re.IGNORECASE)
+RE_ONLY_NUMBERS = re.compile(r"[0-9 ]+")
+
+
+def classify(text: str, has_state: bool) -> Tuple[str, Optional[re.Match]]:
+    """Classifica a mensagem numa intenção (uma passada, regexes pré-compiladas)."""
+    t = (text or "").strip()
+    upper = t.upper()
+    if upper in GREETINGS or t.lower() in MENU_WORDS:
+        return Intents.MENU, None
+    m = RE_COMPROVANTE.match(t)
+    if m:
+        return Intents.COMPROVANTE_ENVIO, m
+    if t == "6" or upper.startswith("COMPROVANTE"):
+        return Intents.COMPROVANTE, None
+    if not has_state and t in MENU_NUMBERS:
+        return MENU_NUMBERS[t], None
+    for prefix, intent in PREFIX_INTENTS:
+        if upper.startswith(prefix):
+            return intent, None
+    return Intents.TEXTO, None
+
+
+class BotContext:
+    """Tudo que um handler precisa sobre a mensagem corrente."""
+
+    def __init__(self, payload: Dict[str, Any], telefone: str, text: str, state, intent: str,
+                 match: Optional[re.Match] = None):
+        self.payload = payload
+        self.telefone = telefone
+        self.text = text or ""
+        self.upper = self.text.upper()
+        self.state = state
+        self.intent = intent
+        self.match = match
+
+
+Handler = Callable[[BotContext], Awaitable[Dict[str, Any]]]
+
+
+class Router:
+    """
+    Tabela (estado, intenção) → handler.
+
+    Resolução: (estado, intenção) → (ANY, intenção) → fallback.
+    Handlers de estado ocupam a linha inteira do estado, exceto as intenções em
+    `passthrough`, que continuam indo para o handler global (ex.: MENU).
+    """
+
+    def __init__(self):
+        self._table: Dict[Tuple[str, str], Handler] = {}
+        self.fallback: Optional[Handler] = None
+
+    def on(self, state: str, intent: str, handler: Handler) -> Handler:
+        self._table[(state, intent)] = handler
+        return handler
+
+    def intent(self, *intents: str):
+        def deco(handler: Handler) -> Handler:
+            for intent in intents:
+                self.on(ANY, intent, handler)
+            return handler
+        return deco
+
+    def state(self, *states: str, passthrough: Iterable[str] = ()):
+        skip = set(passthrough)
+
+        def deco(handler: Handler) -> Handler:
+            for state in states:
+                for intent in ALL_INTENTS:
+                    if intent not in skip:
+                        self.on(state, intent, handler)
+            return handler
+        return deco
+
+    def set_fallback(self, handler: Handler) -> Handler:
+        self.fallback = handler
+        return handler
+
+    def resolve(self, state: Optional[str], intent: str) -> Optional[Handler]:
+        return (
+            self._table.get((state, intent))
+            or self._table.get((ANY, intent))
+            or self.fallback
+        )
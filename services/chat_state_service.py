@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta, timezone
 
-from services.supabase_client import get_client
+from services.supabase_client import get_client, get_async_client
 
 STATE_TTL = timedelta(minutes=15)
 
@@ -14,6 +14,53 @@ class StateNames:
     ENVIAR_CONFIRM = "ENVIAR_CONFIRM"
     COMPROVANTE_WAIT = "COMPROVANTE_WAIT"
 
+class ChatStateSnapshot:
+    """
+    Estado do chat lido uma única vez por mensagem.
+    Os handlers leem e escrevem aqui (set/clear só marcam o snapshot) e a
+    persistência acontece em flush(): antes de cada resposta enviada ao
+    cliente e no fim do processamento (só grava se houve mudança).
+    """
+
+    def __init__(self, telefone: str, current: Optional[Dict[str, Any]] = None,
+                 setter=None, clearer=None):
+        self.telefone = telefone
+        self.current = current
+        self.dirty = False
+        self._setter = setter or set_state_async
+        self._clearer = clearer or clear_state_async
+
+    def __bool__(self) -> bool:
+        return self.current is not None
+
+    @property
+    def name(self) -> Optional[str]:
+        return (self.current or {}).get("state")
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return (self.current or {}).get("data") or {}
+
+    def set(self, state: str, data: Dict[str, Any] | None = None) -> None:
+        self.current = {"state": state, "data": data or {}}
+        self.dirty = True
+
+    def clear(self) -> None:
+        self.current = None
+        self.dirty = True
+
+    async def flush(self) -> None:
+        if not self.dirty:
+            return
+        try:
+            if self.current is None:
+                await self._clearer(self.telefone)
+            else:
+                await self._setter(self.telefone, self.current["state"], self.current["data"])
+            self.dirty = False
+        except Exception as e:
+            print("ChatStateSnapshot.flush error:", e)
+
 def _now_utc():
     return datetime.now(timezone.utc)
 
@@ -24,23 +71,37 @@ def _safe_client():
         print("chat_state_service: get_client error:", e)
         return None
 
+def _safe_async_client():
+    try:
+        return get_async_client()
+    except Exception as e:
+        print("chat_state_service: get_async_client error:", e)
+        return None
+
+def _row_data(res) -> Optional[Dict[str, Any]]:
+    data = getattr(res, "data", None)
+    if data is None and isinstance(res, dict):
+        data = res.get("data")
+    return data or None
+
+def _is_expired(data: Dict[str, Any]) -> bool:
+    updated = data.get("updated_at")
+    try:
+        updated_dt = datetime.fromisoformat(updated.replace("Z", "+00:00"))
+    except Exception:
+        updated_dt = _now_utc()
+    return _now_utc() - updated_dt > STATE_TTL
+
 def get_state(telefone: str) -> Optional[Dict[str, Any]]:
     supa = _safe_client()
     if not supa:
         return None
     try:
         res = supa.table("chat_states").select("*").eq("telefone", telefone).maybe_single().execute()
-        data = getattr(res, "data", None)
-        if data is None and isinstance(res, dict):
-            data = res.get("data")
+        data = _row_data(res)
         if not data:
             return None
-        updated = data.get("updated_at")
-        try:
-            updated_dt = datetime.fromisoformat(updated.replace("Z", "+00:00"))
-        except Exception:
-            updated_dt = _now_utc()
-        if _now_utc() - updated_dt > STATE_TTL:
+        if _is_expired(data):
             clear_state(telefone)
             return None
         return {"state": data.get("state"), "data": data.get("data") or {}}
@@ -69,3 +130,44 @@ def clear_state(telefone: str) -> None:
         supa.table("chat_states").delete().eq("telefone", telefone).execute()
     except Exception as e:
         print("clear_state error:", e)
+
+# ----------------- Versões assíncronas (webhook) -----------------
+
+async def get_state_async(telefone: str) -> Optional[Dict[str, Any]]:
+    supa = _safe_async_client()
+    if not supa:
+        return None
+    try:
+        res = await supa.table("chat_states").select("*").eq("telefone", telefone).maybe_single().execute()
+        data = _row_data(res)
+        if not data:
+            return None
+        if _is_expired(data):
+            await clear_state_async(telefone)
+            return None
+        return {"state": data.get("state"), "data": data.get("data") or {}}
+    except Exception as e:
+        print("get_state_async error:", e)
+        return None
+
+async def set_state_async(telefone: str, state: str, data: Dict[str, Any] | None = None) -> None:
+    supa = _safe_async_client()
+    if not supa:
+        return
+    try:
+        await supa.table("chat_states").upsert({
+            "telefone": telefone,
+            "state": state,
+            "data": data or {},
+        }).execute()
+    except Exception as e:
+        print("set_state_async error:", e)
+
+async def clear_state_async(telefone: str) -> None:
+    supa = _safe_async_client()
+    if not supa:
+        return
+    try:
+        await supa.table("chat_states").delete().eq("telefone", telefone).execute()
+    except Exception as e:
+        print("clear_state_async error:", e)
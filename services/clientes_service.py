@@ -0,0 +1,94 @@
+from __future__ import annotations
+import os
+import re
+from typing import Any, Dict, List
+
+from services.supabase_client import get_client
+
+# Máximo de clientes devolvidos pela busca dos seletores (typeahead)
+CLIENTES_SEARCH_LIMIT = int(os.getenv("CLIENTES_SEARCH_LIMIT", "30"))
+CLIENTE_COLUMNS = "telefone,nome,ludocoins_saldo,opt_in_whatsapp,created_at"
+
+
+def _trecho_ilike(termo: str) -> str:
+    """
+    Padrão ILIKE que casa `termo` literalmente: escapa \\, % e _ e troca os
+    reservados do PostgREST (, ( ) " e o curinga *) por _ (um caractere qualquer).
+    """
+    termo = termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "*" + re.sub(r'[,()"*]', "_", termo) + "*"
+
+
+def _filtro_termo(q, termo: str | None):
+    """
+    Termo só com dígitos (e pontuação de telefone) → prefixo do telefone;
+    caso contrário → trecho do nome (ILIKE, índice trigram).
+    """
+    termo = (termo or "").strip()
+    if not termo:
+        return q
+    if re.fullmatch(r"[\d\s()+\-.]+", termo):
+        return q.like("telefone", f"{re.sub(r'[^0-9]+', '', termo)}*")
+    return q.ilike("nome", _trecho_ilike(termo))
+
+
+def _keyset_filter(cursor: Dict[str, Any]) -> str:
+    """(created_at, telefone) < cursor, na ordem desc da listagem (filtro or do PostgREST)."""
+    c, t = f'"{cursor["created_at"]}"', f'"{cursor["telefone"]}"'
+    return f"created_at.lt.{c},and(created_at.eq.{c},telefone.lt.{t})"
+
+
+def list_clientes_page(
+    termo: str | None = None,
+    after: Dict[str, Any] | None = None,
+    limit: int = 25,
+    columns: str = CLIENTE_COLUMNS,
+) -> Dict[str, Any]:
+    """
+    Uma página do diretório (cadastros mais recentes primeiro), com busca por
+    prefixo de telefone ou trecho do nome. Cursor em (created_at, telefone):
+    passe o `next` da página anterior em `after`. Retorna {"rows", "next"}.
+    """
+    supa = get_client()
+    try:
+        q = _filtro_termo(supa.table("clientes").select(columns), termo)
+        if after:
+            q = q.or_(_keyset_filter(after))
+        res = (
+            q.order("created_at", desc=True)
+            .order("telefone", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+        rows = getattr(res, "data", None) or []
+    except Exception as e:
+        print("clientes_service.list_clientes_page error:", e)
+        return {"rows": [], "next": None}
+    rows, mais = rows[:limit], len(rows) > limit
+    nxt = {"created_at": rows[-1]["created_at"], "telefone": rows[-1]["telefone"]} if mais else None
+    return {"rows": rows, "next": nxt}
+
+
+def search_clientes(termo: str | None = None, limit: int | None = None,
+                    columns: str = "telefone,nome") -> List[Dict[str, Any]]:
+    """
+    Até `limit` clientes para os seletores: por prefixo de telefone ou trecho
+    do nome, em ordem alfabética. Sem termo, os cadastros mais recentes.
+    """
+    supa = get_client()
+    try:
+        q = _filtro_termo(supa.table("clientes").select(columns), termo)
+        q = q.order("nome") if (termo or "").strip() else q.order("created_at", desc=True)
+        return q.limit(limit or CLIENTES_SEARCH_LIMIT).execute().data or []
+    except Exception as e:
+        print("clientes_service.search_clientes error:", e)
+        return []
+
+
+def list_clientes_all() -> List[Dict[str, Any]]:
+    """Diretório completo (exportação CSV sob demanda)."""
+    return get_client().table("clientes").select("*").order("created_at", desc=True).execute().data or []
+
+
+def cliente_label(c: Dict[str, Any]) -> str:
+    return f"{c.get('nome') or '(sem nome)'} — {c.get('telefone')}"
@@ -2,7 +2,57 @@ from __future__ import annotations
 from typing import List, Dict, Any
 import shortuuid
 
-from services.supabase_client import get_client
+from services.supabase_client import get_client, get_async_client, is_missing_rpc
+
+CONTAINER_STATUS = ["ABERTO", "PENDENTE", "FECHADO", "ENVIADO", "AGUARDANDO_PAGAMENTO"]
+CONTAINER_PAGE_COLUMNS = "id,telefone_cliente,status,created_at,updated_at"
+
+
+def _keyset_filter(cursor: Dict[str, Any]) -> str:
+    """(updated_at, created_at, id) < cursor, na ordem desc da listagem (filtro or do PostgREST)."""
+    u, c, i = (f'"{cursor[k]}"' for k in ("updated_at", "created_at", "id"))
+    return (
+        f"updated_at.lt.{u},"
+        f"and(updated_at.eq.{u},created_at.lt.{c}),"
+        f"and(updated_at.eq.{u},created_at.eq.{c},id.lt.{i})"
+    )
+
+
+def list_containers_page(
+    telefone_prefix: str | None = None,
+    status: str | None = None,
+    after: Dict[str, Any] | None = None,
+    limit: int = 10,
+) -> Dict[str, Any]:
+    """
+    Uma página de containers (mais recentes primeiro), filtrada no banco por
+    prefixo de telefone e status. Paginação por cursor em (updated_at, created_at, id):
+    passe o `next` da página anterior em `after`. Retorna {"rows", "next"};
+    `next` é None na última página.
+    """
+    supa = get_client()
+    try:
+        q = supa.table("containers").select(CONTAINER_PAGE_COLUMNS)
+        if telefone_prefix:
+            q = q.like("telefone_cliente", f"{telefone_prefix}*")
+        if status:
+            q = q.eq("status", status)
+        if after:
+            q = q.or_(_keyset_filter(after))
+        res = (
+            q.order("updated_at", desc=True)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+        rows = getattr(res, "data", None) or []
+    except Exception as e:
+        print("containers_service.list_containers_page error:", e)
+        return {"rows": [], "next": None}
+    rows, mais = rows[:limit], len(rows) > limit
+    nxt = {k: rows[-1][k] for k in ("updated_at", "created_at", "id")} if mais else None
+    return {"rows": rows, "next": nxt}
 
 
 def _phone_container_id(telefone: str) -> str:
@@ -10,6 +60,20 @@ def _phone_container_id(telefone: str) -> str:
     return f"{telefone}-{shortuuid.ShortUUID().random(length=6).upper()}"
 
 
+# RPC get_or_create_open_container (sql/schema_full.sql). Se a função ainda não
+# existir no banco, volta para o caminho antigo e para de tentar a RPC.
+_open_container_rpc = True
+
+
+def _rpc_container_id(res) -> str | None:
+    data = getattr(res, "data", None)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if isinstance(data, dict):
+        data = data.get("get_or_create_open_container")
+    return data or None
+
+
 def _has_items(supa, container_id: str) -> bool:
     """
     Evita count/head (que podem gerar 204). Apenas tenta pegar 1 item.
@@ -36,10 +100,32 @@ def get_or_create_open_container(telefone: str) -> str:
       1) Se existir container ABERTO com itens (>0), retorna o MAIS RECENTE entre eles.
       2) Senão, se existir algum ABERTO (mesmo vazio), retorna o mais recente.
       3) Senão, cria um novo container ABERTO.
+    Resolvido no banco pela RPC get_or_create_open_container (uma ida só); se a RPC
+    falhar, cai no caminho antigo em Python.
     Tolerante a erros do PostgREST: nunca levanta exceção para o chamador.
     """
+    global _open_container_rpc
     supa = get_client()
 
+    if _open_container_rpc:
+        try:
+            r = supa.rpc("get_or_create_open_container", {
+                "p_telefone": telefone,
+                "p_new_id": _phone_container_id(telefone),
+            }).execute()
+            cid = _rpc_container_id(r)
+            if cid:
+                return cid
+        except Exception as e:
+            if is_missing_rpc(e):
+                _open_container_rpc = False
+            print("containers_service.get_or_create_open_container rpc error:", e)
+
+    return _get_or_create_open_container_legacy(supa, telefone)
+
+
+def _get_or_create_open_container_legacy(supa, telefone: str) -> str:
+    """Caminho anterior à RPC: lista os abertos e testa itens um a um."""
     try:
         # Busca todos os abertos do cliente, mais recente primeiro
         r = (
@@ -134,3 +220,130 @@ def list_trocaveis(container_id: str) -> List[Dict[str, Any]]:
     except Exception as e:
         print("containers_service.list_trocaveis error:", e)
         return []
+
+
+# ----------------- Versões assíncronas (webhook) -----------------
+
+async def _has_items_async(supa, container_id: str) -> bool:
+    try:
+        r = await (
+            supa.table("container_itens")
+            .select("id")
+            .eq("container_id", container_id)
+            .limit(1)
+            .execute()
+        )
+        data = getattr(r, "data", None) or []
+        return len(data) > 0
+    except Exception as e:
+        print("containers_service._has_items_async error:", e)
+        return False
+
+
+async def get_or_create_open_container_async(telefone: str) -> str:
+    """
+    Mesma estratégia de get_or_create_open_container, sem bloquear o event loop.
+    """
+    global _open_container_rpc
+    supa = get_async_client()
+
+    if _open_container_rpc:
+        try:
+            r = await supa.rpc("get_or_create_open_container", {
+                "p_telefone": telefone,
+                "p_new_id": _phone_container_id(telefone),
+            }).execute()
+            cid = _rpc_container_id(r)
+            if cid:
+                return cid
+        except Exception as e:
+            if is_missing_rpc(e):
+                _open_container_rpc = False
+            print("containers_service.get_or_create_open_container_async rpc error:", e)
+
+    return await _get_or_create_open_container_legacy_async(supa, telefone)
+
+
+async def _get_or_create_open_container_legacy_async(supa, telefone: str) -> str:
+    try:
+        r = await (
+            supa.table("containers")
+            .select("id, created_at, updated_at")
+            .eq("telefone_cliente", telefone)
+            .eq("status", "ABERTO")
+            .order("updated_at", desc=True)
+            .order("created_at", desc=True)
+            .execute()
+        )
+        rows = getattr(r, "data", None) or []
+    except Exception as e:
+        print("containers_service.get_or_create_open_container_async select error:", e)
+        rows = []
+
+    for row in rows:
+        cid = row["id"]
+        if await _has_items_async(supa, cid):
+            return cid
+
+    if rows:
+        return rows[0]["id"]
+
+    new_id = _phone_container_id(telefone)
+    try:
+        await supa.table("containers").insert({
+            "id": new_id,
+            "telefone_cliente": telefone,
+            "status": "ABERTO",
+        }).execute()
+    except Exception as e:
+        print("containers_service.get_or_create_open_container_async insert error:", e)
+    return new_id
+
+
+async def list_container_items_async(container_id: str) -> List[Dict[str, Any]]:
+    supa = get_async_client()
+    try:
+        res = await (
+            supa.from_("container_itens")
+            .select("*, jogos(*)")
+            .eq("container_id", container_id)
+            .neq("status_item", "RESGATADO")
+            .execute()
+        )
+        return getattr(res, "data", None) or []
+    except Exception as e:
+        print("containers_service.list_container_items_async error:", e)
+        return []
+
+
+async def list_enviaveis_async(container_id: str) -> List[Dict[str, Any]]:
+    supa = get_async_client()
+    try:
+        res = await (
+            supa.from_("container_itens")
+            .select("*, jogos(*)")
+            .eq("container_id", container_id)
+            .eq("status_item", "DISPONIVEL")
+            .execute()
+        )
+        return getattr(res, "data", None) or []
+    except Exception as e:
+        print("containers_service.list_enviaveis_async error:", e)
+        return []
+
+
+async def list_trocaveis_async(container_id: str) -> List[Dict[str, Any]]:
+    supa = get_async_client()
+    try:
+        res = await (
+            supa.from_("container_itens")
+            .select("*, jogos(*)")
+            .eq("container_id", container_id)
+            .eq("origem", "LISTINHA")
+            .in_("status_item", ["DISPONIVEL", "PRE-VENDA"])
+            .execute()
+        )
+        return getattr(res, "data", None) or []
+    except Exception as e:
+        print("containers_service.list_trocaveis_async error:", e)
+        return []
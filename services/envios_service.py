@@ -1,68 +1,158 @@
+import json
 from typing import Dict, Any, List
-from services.supabase_client import get_client
+from services.supabase_client import get_client, get_async_client, is_missing_rpc
 import shortuuid
 
+def _novo_container_id(telefone: str) -> str:
+    return f"{telefone}-{shortuuid.ShortUUID().random(length=6).upper()}"
+
+def _envio_row(res) -> Dict[str, Any]:
+    data = getattr(res, "data", None)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not data:
+        raise RuntimeError("criar_pedido_envio: RPC não retornou o envio")
+    return data
+
+def _rpc_params(container_id: str, telefone: str, nome: str, itens_snapshot: List[dict], new_id: str) -> Dict[str, Any]:
+    return {
+        "p_container_id": container_id,
+        "p_telefone": telefone,
+        "p_nome": nome,
+        "p_itens_snapshot": itens_snapshot,
+        "p_new_container_id": new_id,
+    }
+
 def criar_pedido_envio(container_id: str, telefone: str, nome: str, itens_snapshot: List[dict]) -> Dict[str, Any]:
+    """
+    Cria o pedido de envio numa única transação (RPC criar_pedido_envio): envio,
+    container atual → PENDENTE, novo container ABERTO e itens PRÉ-VENDA movidos.
+    Sem a RPC no banco, usa os passos antigos via PostgREST.
+    """
     supa = get_client()
+    new_id = _novo_container_id(telefone)
+    try:
+        res = supa.rpc("criar_pedido_envio", _rpc_params(container_id, telefone, nome, itens_snapshot, new_id)).execute()
+        return _envio_row(res)
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        print("envios_service.criar_pedido_envio: RPC ausente, usando passos separados")
+        return _criar_pedido_envio_legacy(supa, container_id, telefone, nome, itens_snapshot, new_id)
 
-    existing = (
+def _envio_aberto_query(supa, container_id: str):
+    return (
         supa.table("envios")
         .select("*")
         .eq("container_id", container_id)
         .in_("status_envio", ["PENDENTE", "EM_PREPARACAO"])
         .limit(1)
-        .execute()
-    ).data or []
+    )
 
-    if existing:
-        return existing[0]
-    
-    res = supa.table("envios").insert({
+def _envio_insert_query(supa, container_id: str, telefone: str, nome: str, itens_snapshot: List[dict]):
+    return supa.table("envios").insert({
         "container_id": container_id,
         "telefone_cliente": telefone,
         "nome_cliente": nome,
         "status_envio": "PENDENTE",
         "itens_snapshot_json": itens_snapshot
-    }).execute()
+    })
 
-    try:
-    # Fecha o container atual para não aparecer mais ao cliente
-        try:
-            supa.table("containers").update({"status": "PENDENTE"}).eq("id", container_id).execute()
-        except Exception as e:
-            print("envios_service: update container to PENDENTE error:", e)
+def _split_steps(supa, container_id: str, telefone: str, new_id: str):
+    """
+    Passos após criar o envio (fechar o container atual, abrir um novo e mover
+    os itens PRÉ-VENDA), como (query, mensagem de erro). Cada passo falha sozinho.
+    """
+    return [
+        (supa.table("containers").update({"status": "PENDENTE"}).eq("id", container_id),
+         "envios_service: update container to PENDENTE error:"),
+        (supa.table("containers").insert({"id": new_id, "telefone_cliente": telefone, "status": "ABERTO"}),
+         "envios_service: create new open container error:"),
+        (supa.table("container_itens").update({"container_id": new_id})
+         .eq("container_id", container_id).eq("status_item", "PRE-VENDA"),
+         "envios_service: move PRE-VENDA items error:"),
+    ]
 
-        # Cria um novo container ABERTO
-        new_id = f"{telefone}-{shortuuid.ShortUUID().random(length=6).upper()}"
-        try:
-            supa.table("containers").insert({
-                "id": new_id,
-                "telefone_cliente": telefone,
-                "status": "ABERTO",
-            }).execute()
-        except Exception as e:
-            print("envios_service: create new open container error:", e)
+def _criar_pedido_envio_legacy(supa, container_id: str, telefone: str, nome: str, itens_snapshot: List[dict], new_id: str) -> Dict[str, Any]:
+    """Passos antigos (sem transação), usados só quando a RPC não existe no banco."""
+    existing = _envio_aberto_query(supa, container_id).execute().data or []
+    if existing:
+        return existing[0]
 
-        # Move itens não enviados (PRÉ-VENDA) para o novo container
+    res = _envio_insert_query(supa, container_id, telefone, nome, itens_snapshot).execute()
+    for query, erro in _split_steps(supa, container_id, telefone, new_id):
         try:
-            supa.table("container_itens").update({"container_id": new_id}) \
-                .eq("container_id", container_id).eq("status_item", "PRE-VENDA").execute()
+            query.execute()
         except Exception as e:
-            print("envios_service: move PRE-VENDA items error:", e)
-    except Exception as e:
-        print("envios_service: split after envio error:", e)
+            print(erro, e)
 
     return res.data[0]
 
-def listar_envios(status: str = None):
+# Colunas da listagem: sem itens_snapshot_json (buscado por envio em get_envio_snapshot)
+ENVIO_SUMMARY_COLUMNS = "id,container_id,telefone_cliente,nome_cliente,status_envio,created_at"
+
+def listar_envios(status: str = None, after: Dict[str, Any] = None, limit: int = 25) -> Dict[str, Any]:
+    """
+    Uma página de envios (mais recentes primeiro) só com as colunas de resumo,
+    filtrada por status no banco. Cursor em (created_at, id): passe o `next`
+    da página anterior em `after`. Retorna {"rows", "next"}.
+    """
     supa = get_client()
-    q = supa.table("envios").select("*").order("created_at", desc=True)
+    q = supa.table("envios").select(ENVIO_SUMMARY_COLUMNS)
     if status:
         q = q.eq("status_envio", status)
+    if after:
+        c, i = f'"{after["created_at"]}"', f'"{after["id"]}"'
+        q = q.or_(f"created_at.lt.{c},and(created_at.eq.{c},id.lt.{i})")
+    rows = q.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
 
-    return q.execute().data or []
+    rows, mais = rows[:limit], len(rows) > limit
+    nxt = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]} if mais else None
+    return {"rows": rows, "next": nxt}
+
+def get_envio_snapshot(envio_id: str) -> List[Dict[str, Any]]:
+    """Itens (snapshot) de um envio; lido só quando o envio é selecionado."""
+    supa = get_client()
+    res = supa.table("envios").select("itens_snapshot_json").eq("id", envio_id).maybe_single().execute()
+    snapshot = (getattr(res, "data", None) or {}).get("itens_snapshot_json")
+    if isinstance(snapshot, str):
+        try:
+            snapshot = json.loads(snapshot)
+        except Exception as e:
+            print("envios_service.get_envio_snapshot error:", e)
+            return []
+    return snapshot if isinstance(snapshot, list) else []
 
 def atualizar_status_envio(envio_id: str, status: str):
     supa = get_client()
 
     return supa.table("envios").update({"status_envio": status}).eq("id", envio_id).execute().data[0]
+
+
+async def criar_pedido_envio_async(container_id: str, telefone: str, nome: str, itens_snapshot: List[dict]) -> Dict[str, Any]:
+    """Versão assíncrona de criar_pedido_envio para o webhook (mesma RPC)."""
+    supa = get_async_client()
+    new_id = _novo_container_id(telefone)
+    try:
+        res = await supa.rpc("criar_pedido_envio", _rpc_params(container_id, telefone, nome, itens_snapshot, new_id)).execute()
+        return _envio_row(res)
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        print("envios_service.criar_pedido_envio_async: RPC ausente, usando passos separados")
+        return await _criar_pedido_envio_legacy_async(supa, container_id, telefone, nome, itens_snapshot, new_id)
+
+async def _criar_pedido_envio_legacy_async(supa, container_id: str, telefone: str, nome: str, itens_snapshot: List[dict], new_id: str) -> Dict[str, Any]:
+    """Mesmos passos de _criar_pedido_envio_legacy, no cliente assíncrono."""
+    existing = (await _envio_aberto_query(supa, container_id).execute()).data or []
+    if existing:
+        return existing[0]
+
+    res = await _envio_insert_query(supa, container_id, telefone, nome, itens_snapshot).execute()
+    for query, erro in _split_steps(supa, container_id, telefone, new_id):
+        try:
+            await query.execute()
+        except Exception as e:
+            print(erro, e)
+
+    return res.data[0]
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import os
+from typing import Any, Dict, List
+
+from services.supabase_client import get_client, is_missing_rpc
+
+# Máximo de jogos devolvidos por busca (selectbox/tabela das páginas)
+JOGOS_SEARCH_LIMIT = int(os.getenv("JOGOS_SEARCH_LIMIT", "20"))
+
+# RPC search_jogos (sql/schema_full.sql): ILIKE em nome/sku pelos índices
+# trigram, ordenado por SKU exato e similaridade. Sem a função no banco, usa
+# o mesmo filtro via PostgREST (ordem alfabética) e para de tentar a RPC.
+_search_rpc = True
+
+
+def _or_ilike(termo: str) -> str:
+    t = termo.replace("\\", "\\\\").replace('"', '\\"')
+    return f'nome.ilike."*{t}*",sku.ilike."*{t}*"'
+
+
+def _search_legacy(supa, termo: str, limit: int, apenas_ativos: bool) -> List[Dict[str, Any]]:
+    q = supa.table("jogos").select("*")
+    if termo:
+        q = q.or_(_or_ilike(termo))
+    if apenas_ativos:
+        q = q.eq("ativo", True)
+    return q.order("nome").limit(limit).execute().data or []
+
+
+def search_jogos(termo: str | None = None, limit: int | None = None,
+                 apenas_ativos: bool = False) -> List[Dict[str, Any]]:
+    """
+    Até `limit` jogos cujo nome ou SKU contém `termo` (sem diferenciar
+    maiúsculas). Sem termo, devolve os primeiros em ordem alfabética.
+    """
+    global _search_rpc
+    termo = (termo or "").strip()
+    limit = limit or JOGOS_SEARCH_LIMIT
+    supa = get_client()
+    if _search_rpc:
+        try:
+            res = supa.rpc("search_jogos", {
+                "p_termo": termo, "p_limit": limit, "p_apenas_ativos": apenas_ativos,
+            }).execute()
+            return getattr(res, "data", None) or []
+        except Exception as e:
+            if is_missing_rpc(e):
+                _search_rpc = False
+            print("jogos_service.search_jogos rpc error:", e)
+    try:
+        return _search_legacy(supa, termo, limit, apenas_ativos)
+    except Exception as e:
+        print("jogos_service.search_jogos error:", e)
+        return []
+
+
+def list_jogos_all() -> List[Dict[str, Any]]:
+    """Catálogo completo (exportação CSV sob demanda)."""
+    return get_client().table("jogos").select("*").order("created_at", desc=True).execute().data or []
+
+
+def jogo_label(j: Dict[str, Any]) -> str:
+    """Nome (SKU) [id curto], usado nos selectboxes."""
+    return (
+        f"{j.get('nome') or '(sem nome)'}"
+        + (f" (SKU {j['sku']})" if j.get("sku") else "")
+        + f" [{str(j.get('id', ''))[:8]}]"
+    )
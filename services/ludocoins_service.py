@@ -1,5 +1,5 @@
-from typing import Dict, Any
-from services.supabase_client import get_client
+from typing import Dict, Any, List
+from services.supabase_client import get_client, get_async_client, is_missing_rpc
 
 def convert_item(item_id: str, atendente_email: str) -> Dict[str, Any]:
     supa = get_client()
@@ -7,6 +7,70 @@ def convert_item(item_id: str, atendente_email: str) -> Dict[str, Any]:
 
     return getattr(res, "data", {"ok": False})
 
+def _rpc_json(res, default: Dict[str, Any]) -> Dict[str, Any]:
+    data = getattr(res, "data", None)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    return data or default
+
+_BATCH_VAZIO = {"ok": False, "itens": [], "total": 0, "saldo": None}
+_ITEM_DE_OUTRO = "Item não pertence ao cliente"
+
+def _donos_query(supa, item_ids: List[str]):
+    """Telefone dono (via container) de cada item; mesma checagem da RPC quando há `telefone`."""
+    return supa.table("container_itens").select("id, containers(telefone_cliente)").in_("id", list(item_ids))
+
+def _donos(rows) -> Dict[str, Any]:
+    return {r.get("id"): (r.get("containers") or {}).get("telefone_cliente") for r in rows or []}
+
+def convert_items(item_ids: List[str], atendente_email: str, telefone: str = None) -> Dict[str, Any]:
+    """
+    Converte vários itens numa única RPC (convert_items_to_ludocoins).
+    Retorna {"ok", "itens": [{"item_id", "ok", "valor"|"erro"}], "total", "saldo"};
+    "saldo" só vem quando `telefone` é informado (e restringe aos itens dele).
+    Sem a RPC no banco, converte item a item como antes.
+    """
+    supa = get_client()
+    try:
+        res = supa.rpc("convert_items_to_ludocoins", {
+            "p_item_ids": list(item_ids), "p_atendente": atendente_email, "p_telefone": telefone,
+        }).execute()
+        return _rpc_json(res, dict(_BATCH_VAZIO))
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        print("ludocoins_service.convert_items: RPC ausente, convertendo item a item")
+        donos = _donos(_donos_query(supa, item_ids).execute().data) if telefone else {}
+        itens, total = [], 0.0
+        for item_id in item_ids:
+            if telefone and donos.get(item_id) != telefone:
+                itens.append({"item_id": item_id, "ok": False, "erro": _ITEM_DE_OUTRO})
+                continue
+            try:
+                r = convert_item(item_id, atendente_email) or {}
+                total += float(r.get("valor") or 0)
+                itens.append({"item_id": item_id, "ok": True, "valor": r.get("valor")})
+            except Exception as err:
+                itens.append({"item_id": item_id, "ok": False, "erro": str(err)})
+        saldo = get_saldo(telefone) if telefone else None
+        return {"ok": True, "itens": itens, "total": total, "saldo": saldo}
+
+def _debit_params(telefone: str, valor: float, atendente_email: str, observacao: str = None) -> Dict[str, Any]:
+    # p_valor é o módulo do débito (a RPC subtrai); negativo viraria crédito
+    if float(valor) <= 0:
+        raise ValueError("Informe um valor maior que zero.")
+    return {"p_telefone": telefone, "p_valor": float(valor), "p_atendente": atendente_email, "p_observacao": observacao or None}
+
+def debit_ludocoins(telefone: str, valor: float, atendente_email: str, observacao: str = None) -> Dict[str, Any]:
+    """
+    Debita L$ numa única RPC (debit_ludocoins): trava o cliente, valida o saldo,
+    grava DEBITO_UTILIZACAO e devolve {"ok", "saldo", "transacao_id"}.
+    Saldo insuficiente/cliente inexistente chegam como exceção do PostgREST.
+    """
+    supa = get_client()
+    res = supa.rpc("debit_ludocoins", _debit_params(telefone, valor, atendente_email, observacao)).execute()
+    return _rpc_json(res, {"ok": False, "saldo": None})
+
 def get_saldo(telefone: str) -> float:
     supa = get_client()
     cliente = supa.table("clientes").select("ludocoins_saldo").eq("telefone", telefone).single().execute().data
@@ -17,3 +81,53 @@ def list_ultimas_transacoes(telefone: str, limit: int = 5):
     supa = get_client()
 
     return supa.table("ludocoin_transacoes").select("*").eq("telefone_cliente", telefone).order("created_at", desc=True).limit(limit).execute().data or []
+
+
+async def convert_item_async(item_id: str, atendente_email: str) -> Dict[str, Any]:
+    supa = get_async_client()
+    res = await supa.rpc("convert_item_to_ludocoins", {"p_item_id": item_id, "p_atendente": atendente_email}).execute()
+
+    return getattr(res, "data", {"ok": False})
+
+async def convert_items_async(item_ids: List[str], atendente_email: str, telefone: str = None) -> Dict[str, Any]:
+    """Versão assíncrona de convert_items (uma RPC para a TROCA inteira)."""
+    supa = get_async_client()
+    try:
+        res = await supa.rpc("convert_items_to_ludocoins", {
+            "p_item_ids": list(item_ids), "p_atendente": atendente_email, "p_telefone": telefone,
+        }).execute()
+        return _rpc_json(res, dict(_BATCH_VAZIO))
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        print("ludocoins_service.convert_items_async: RPC ausente, convertendo item a item")
+        donos = _donos((await _donos_query(supa, item_ids).execute()).data) if telefone else {}
+        itens, total = [], 0.0
+        for item_id in item_ids:
+            if telefone and donos.get(item_id) != telefone:
+                itens.append({"item_id": item_id, "ok": False, "erro": _ITEM_DE_OUTRO})
+                continue
+            try:
+                r = await convert_item_async(item_id, atendente_email) or {}
+                total += float(r.get("valor") or 0)
+                itens.append({"item_id": item_id, "ok": True, "valor": r.get("valor")})
+            except Exception as err:
+                itens.append({"item_id": item_id, "ok": False, "erro": str(err)})
+        saldo = await get_saldo_async(telefone) if telefone else None
+        return {"ok": True, "itens": itens, "total": total, "saldo": saldo}
+
+async def debit_ludocoins_async(telefone: str, valor: float, atendente_email: str, observacao: str = None) -> Dict[str, Any]:
+    supa = get_async_client()
+    res = await supa.rpc("debit_ludocoins", _debit_params(telefone, valor, atendente_email, observacao)).execute()
+    return _rpc_json(res, {"ok": False, "saldo": None})
+
+async def get_saldo_async(telefone: str) -> float:
+    supa = get_async_client()
+    cliente = (await supa.table("clientes").select("ludocoins_saldo").eq("telefone", telefone).single().execute()).data
+
+    return float(cliente["ludocoins_saldo"])
+
+async def list_ultimas_transacoes_async(telefone: str, limit: int = 5):
+    supa = get_async_client()
+
+    return (await supa.table("ludocoin_transacoes").select("*").eq("telefone_cliente", telefone).order("created_at", desc=True).limit(limit).execute()).data or []
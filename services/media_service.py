@@ -0,0 +1,225 @@
+"""
+Leitura do corpo do webhook sem duplicar anexos em memória.
+
+O corpo é copiado para um SpooledTemporaryFile (vai para disco acima de
+WEBHOOK_SPOOL_BYTES). Na hora de parsear o JSON, strings maiores que
+WEBHOOK_MEDIA_INLINE_MAX (o base64 do comprovante) não entram no dict: viram
+um MediaRef que aponta para o trecho do arquivo e é lido em blocos só no
+momento do upload para o WPPConnect.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import secrets
+import tempfile
+from typing import Any, Iterator, List, Tuple
+
+WEBHOOK_SPOOL_BYTES = int(os.getenv("WEBHOOK_SPOOL_BYTES", str(1024 * 1024)))
+WEBHOOK_MEDIA_INLINE_MAX = int(os.getenv("WEBHOOK_MEDIA_INLINE_MAX", str(64 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+_RE_STRING_SPECIAL = re.compile(rb'["\\]')
+
+
+class SpooledBody:
+    """Corpo da requisição em memória até o limite, depois em arquivo temporário."""
+
+    def __init__(self, max_memory: int | None = None):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory or WEBHOOK_SPOOL_BYTES)
+        self.size = 0
+
+    async def read_from(self, request) -> "SpooledBody":
+        async for chunk in request.stream():
+            if chunk:
+                self.file.write(chunk)
+                self.size += len(chunk)
+        self.file.seek(0)
+        return self
+
+    def write(self, data: bytes) -> "SpooledBody":
+        self.file.write(data)
+        self.size += len(data)
+        return self
+
+    @property
+    def on_disk(self) -> bool:
+        return bool(getattr(self.file, "_rolled", False))
+
+    def read_range(self, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        pos = start
+        while pos < end:
+            self.file.seek(pos)
+            block = self.file.read(min(chunk_size, end - pos))
+            if not block:
+                break
+            pos += len(block)
+            yield block
+
+    def close(self) -> None:
+        try:
+            self.file.close()
+        except Exception:
+            pass
+
+
+class MediaRef:
+    """
+    Conteúdo de uma string JSON grande que ficou no SpooledBody.
+    Os bytes são o conteúdo *escapado* (válido dentro de uma string JSON), então
+    podem ser repassados como estão para o corpo JSON do upload.
+    """
+
+    def __init__(self, body: SpooledBody, start: int, end: int):
+        self.body = body
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"<MediaRef {len(self)} bytes>"
+
+    def head(self, n: int = 32) -> str:
+        raw = next(self.body.read_range(self.start, min(self.end, self.start + n * 2)), b"")
+        return _decode_json_fragment(raw)[:n]
+
+    def iter_json_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        return self.body.read_range(self.start, self.end, chunk_size)
+
+    def json_size(self) -> int:
+        return len(self)
+
+
+class InlineMedia:
+    """Mesma interface de MediaRef para base64 que já está em memória (str)."""
+
+    def __init__(self, data: str):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def head(self, n: int = 32) -> str:
+        return self.data[:n]
+
+    def iter_json_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        for i in range(0, len(self.data), chunk_size):
+            # json.dumps escapa o que for preciso; tiramos só as aspas externas
+            yield json.dumps(self.data[i:i + chunk_size])[1:-1].encode()
+
+    def json_size(self) -> int:
+        return sum(len(c) for c in self.iter_json_chunks())
+
+
+def as_media(data) -> "MediaRef | InlineMedia":
+    if isinstance(data, (MediaRef, InlineMedia)):
+        return data
+    return InlineMedia((data or "").strip())
+
+
+def _decode_json_fragment(raw: bytes) -> str:
+    # o recorte pode terminar no meio de um escape (\\, \/, \uXXXX): encurta até decodificar
+    for cut in range(min(6, len(raw)) + 1):
+        try:
+            return json.loads(b'"' + raw[:len(raw) - cut] + b'"')
+        except ValueError:
+            continue
+    return raw.decode("ascii", "ignore")
+
+
+def _scan(body: SpooledBody, inline_max: int, marker: bytes) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Percorre o JSON em blocos e devolve uma cópia compacta onde cada string maior
+    que `inline_max` foi trocada por `marker` + índice, mais os offsets dessas strings.
+    """
+    out = bytearray()
+    refs: List[Tuple[int, int]] = []
+    pending = bytearray()
+    in_str = big = escape = False
+    str_start = offset = 0
+    body.file.seek(0)
+    while True:
+        chunk = body.file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        i, n = 0, len(chunk)
+        while i < n:
+            if not in_str:
+                j = chunk.find(b'"', i)
+                if j < 0:
+                    out += chunk[i:]
+                    break
+                out += chunk[i:j + 1]
+                in_str, big, escape = True, False, False
+                str_start = offset + j + 1
+                pending.clear()
+                i = j + 1
+                continue
+            if escape:
+                # bloco anterior terminou numa barra: este byte faz parte do escape
+                if not big:
+                    pending.append(chunk[i])
+                escape = False
+                i += 1
+                continue
+            m = _RE_STRING_SPECIAL.search(chunk, i)
+            seg_end = m.start() if m else n
+            if not big:
+                pending += chunk[i:seg_end]
+                if len(pending) > inline_max:
+                    big = True
+                    pending.clear()
+            if m is None:
+                break
+            if chunk[seg_end] == 0x5C:  # barra invertida
+                if seg_end + 1 < n:
+                    if not big:
+                        pending += chunk[seg_end:seg_end + 2]
+                    i = seg_end + 2
+                else:
+                    if not big:
+                        pending.append(0x5C)
+                    escape = True
+                    i = n
+                continue
+            # aspas de fechamento
+            if big:
+                out += marker + b"%d" % len(refs)
+                refs.append((str_start, offset + seg_end))
+            else:
+                out += pending
+            out += b'"'
+            in_str = False
+            i = seg_end + 1
+        offset += n
+    return bytes(out), refs
+
+
+def _attach_refs(value: Any, refs: List[MediaRef], marker: str) -> Any:
+    if isinstance(value, str):
+        if value.startswith(marker):
+            idx = value[len(marker):]
+            if idx.isdigit() and int(idx) < len(refs):
+                return refs[int(idx)]
+        return value
+    if isinstance(value, dict):
+        for k, v in value.items():
+            value[k] = _attach_refs(v, refs, marker)
+    elif isinstance(value, list):
+        for idx, v in enumerate(value):
+            value[idx] = _attach_refs(v, refs, marker)
+    return value
+
+
+def parse_json_body(body: SpooledBody, inline_max: int | None = None) -> Any:
+    """json.loads do corpo, com strings grandes substituídas por MediaRef."""
+    # marcador com nonce aleatório por parse: um texto do cliente não consegue forjá-lo
+    marker = f"\x00MEDIA:{secrets.token_hex(8)}:"
+    compact, spans = _scan(body, inline_max or WEBHOOK_MEDIA_INLINE_MAX,
+                           marker.replace("\x00", "\\u0000").encode())
+    data = json.loads(compact) if compact.strip() else {}
+    if spans:
+        data = _attach_refs(data, [MediaRef(body, s, e) for s, e in spans], marker)
+    return data
@@ -1,8 +1,13 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import re
-from services.supabase_client import get_client
+import uuid
+from services.supabase_client import get_client, is_missing_rpc
 from services.containers_service import get_or_create_open_container
 
+TIPOS = ("COMPRA", "LISTINHA")
+STATUS_ITEM = ("DISPONIVEL", "PRE-VENDA", "RESERVADO")
+BULK_BATCH_SIZE = 500
+
 
 def list_movimentos(limit: int = 100) -> List[Dict[str, Any]]:
     supa = get_client()
@@ -73,3 +78,146 @@ def add_item_by_movimento(
         print("movimentos_service.add_item_by_movimento: update movimento_id error:", e)
 
     return mov
+
+
+# ----------------- Importação em lote -----------------
+
+def _is_uuid(v: str) -> bool:
+    try:
+        uuid.UUID(str(v))
+        return True
+    except ValueError:
+        return False
+
+
+def _parse_preco(raw) -> Optional[float]:
+    txt = str(raw if raw is not None else "").strip().replace("R$", "").strip()
+    if "," in txt:
+        # formato brasileiro: 1.234,56
+        txt = txt.replace(".", "").replace(",", ".")
+    try:
+        return round(float(txt), 2)
+    except ValueError:
+        return None
+
+
+def parse_movimento_row(raw: Dict[str, Any], linha: int) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Normaliza uma linha (CSV/dict) com colunas tipo, telefone, jogo (id ou SKU;
+    aceita também jogo_id/sku), preco e status_item (opcional, DISPONIVEL).
+    Retorna (linha normalizada, None) ou (None, mensagem de erro).
+    """
+    row = {str(k or "").strip().lower(): v for k, v in (raw or {}).items()}
+    tipo = str(row.get("tipo") or "").strip().upper()
+    if tipo not in TIPOS:
+        return None, f"tipo inválido: {row.get('tipo')!r}"
+    tel = re.sub(r"\D+", "", str(row.get("telefone") or ""))
+    if not tel:
+        return None, "telefone vazio"
+    jogo = str(row.get("jogo") or row.get("jogo_id") or row.get("sku") or "").strip()
+    if not jogo:
+        return None, "jogo vazio"
+    preco = _parse_preco(row.get("preco") or row.get("preco_aplicado_brl"))
+    if preco is None or preco < 0:
+        return None, f"preço inválido: {row.get('preco')!r}"
+    status_item = str(row.get("status_item") or row.get("status") or "DISPONIVEL").strip().upper()
+    if status_item not in STATUS_ITEM:
+        return None, f"status inválido: {status_item!r}"
+    return {"linha": linha, "tipo": tipo, "telefone": tel, "jogo": jogo, "preco": preco, "status_item": status_item}, None
+
+
+def _resolve_jogos(supa, refs: Iterable[str], cache: Dict[str, Optional[str]]) -> None:
+    """Preenche cache[ref] = jogo_id; SKUs desconhecidos são resolvidos numa consulta só."""
+    skus = []
+    for ref in set(refs):
+        if ref in cache:
+            continue
+        if _is_uuid(ref):
+            cache[ref] = ref
+        else:
+            skus.append(ref)
+    if not skus:
+        return
+    try:
+        rows = supa.table("jogos").select("id,sku").in_("sku", skus).execute().data or []
+    except Exception as e:
+        print("movimentos_service._resolve_jogos error:", e)
+        rows = []
+    found = {r.get("sku"): r.get("id") for r in rows}
+    for sku in skus:
+        cache[sku] = found.get(sku)
+
+
+def _insert_batch_legacy(batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Banco sem add_movimentos_bulk: item a item pelo caminho antigo
+    out = {"inseridos": 0, "itens": [], "erros": []}
+    for r in batch:
+        try:
+            mov = add_item_by_movimento(r["tipo"], r["telefone"], r["jogo_id"], r["preco"], r["status_item"])
+            out["inseridos"] += 1
+            out["itens"].append({"linha": r["linha"], "container_id": mov.get("container_id"),
+                                 "item_id": mov.get("container_item_id"), "movimento_id": mov.get("id")})
+        except Exception as e:
+            out["erros"].append({"linha": r["linha"], "erro": str(e)})
+    return out
+
+
+def add_items_bulk(rows: Iterable[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Registra muitos movimentos de uma vez. Lê `rows` sob demanda (ex.: csv.DictReader)
+    e, a cada `batch_size` linhas, produz um relatório do lote:
+      {"linhas", "inseridos", "itens": [...], "erros": [{"linha", "erro"}]}
+    O container ABERTO de cada telefone é resolvido uma vez só; cada lote vira uma
+    chamada à RPC add_movimentos_bulk (inserts set-based numa transação).
+    """
+    supa = get_client()
+    containers: Dict[str, str] = {}
+    jogos: Dict[str, Optional[str]] = {}
+    use_rpc = True
+
+    def flush(parsed: List[Dict[str, Any]], erros: List[Dict[str, Any]], total: int) -> Dict[str, Any]:
+        nonlocal use_rpc
+        _resolve_jogos(supa, (r["jogo"] for r in parsed), jogos)
+        batch = []
+        for r in parsed:
+            jogo_id = jogos.get(r["jogo"])
+            if not jogo_id:
+                erros.append({"linha": r["linha"], "erro": f"jogo não encontrado: {r['jogo']}"})
+                continue
+            if r["telefone"] not in containers:
+                containers[r["telefone"]] = get_or_create_open_container(r["telefone"])
+            batch.append({**{k: v for k, v in r.items() if k != "jogo"},
+                          "jogo_id": jogo_id, "container_id": containers[r["telefone"]]})
+
+        res = {"inseridos": 0, "itens": [], "erros": []}
+        if batch and use_rpc:
+            try:
+                res = supa.rpc("add_movimentos_bulk", {"p_rows": batch}).execute().data or res
+            except Exception as e:
+                if is_missing_rpc(e):
+                    use_rpc = False
+                else:
+                    print("movimentos_service.add_items_bulk batch error:", e)
+                    res = {"inseridos": 0, "itens": [], "erros": [{"linha": r["linha"], "erro": str(e)} for r in batch]}
+        if batch and not use_rpc:
+            res = _insert_batch_legacy(batch)
+
+        erros = sorted(erros + list(res.get("erros") or []), key=lambda e: e.get("linha") or 0)
+        return {"linhas": total, "inseridos": int(res.get("inseridos") or 0),
+                "itens": list(res.get("itens") or []), "erros": erros}
+
+    parsed: List[Dict[str, Any]] = []
+    erros: List[Dict[str, Any]] = []
+    total = 0
+    for linha, raw in enumerate(rows, start=1):
+        total += 1
+        row, erro = parse_movimento_row(raw, linha)
+        if erro:
+            erros.append({"linha": linha, "erro": erro})
+        else:
+            parsed.append(row)
+        if total >= batch_size:
+            yield flush(parsed, erros, total)
+            parsed, erros, total = [], [], 0
+    if total:
+        yield flush(parsed, erros, total)
@@ -0,0 +1,156 @@
+"""
+Consultas das páginas Streamlit em cache (st.cache_data), compartilhado entre
+sessões do mesmo processo. Cada consulta tem seu TTL e uma ou mais tags; as
+escritas feitas pelas páginas chamam invalidate(tag) para limpar só o que mudou
+(ou consulta.clear(arg) para uma chave específica, ex.: saldo de um telefone).
+
+Tags: jogos, clientes, containers, itens, movimentos, ludocoins, envios.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from services import clientes_service, jogos_service, reports_service
+from services.containers_service import list_containers_page
+from services.envios_service import get_envio_snapshot, listar_envios
+from services.supabase_client import get_client
+
+TTL_LISTA = 60        # listas editáveis (jogos, clientes, containers, envios)
+TTL_AGREGADO = 300    # métricas e tendências do dashboard/relatórios
+TTL_CLIENTE = 30      # saldo/extrato de um cliente
+
+_by_tag: Dict[str, List[Callable]] = defaultdict(list)
+_generation: Dict[str, int] = defaultdict(int)
+
+
+def cached(*tags: str, ttl: float):
+    """st.cache_data com TTL, registrado nas tags para invalidação."""
+    def deco(fn):
+        cf = st.cache_data(ttl=ttl, show_spinner=False)(fn)
+        for tag in tags:
+            _by_tag[tag].append(cf)
+        return cf
+    return deco
+
+
+def invalidate(*tags: str) -> None:
+    for tag in tags:
+        _generation[tag] += 1
+        for cf in _by_tag.get(tag, []):
+            cf.clear()
+
+
+def generation(*tags: str) -> Tuple[int, ...]:
+    """Contador de invalidações das tags (para caches derivados, ex.: services.picker)."""
+    return tuple(_generation[tag] for tag in tags)
+
+
+# ----------------- Jogos / Clientes -----------------
+
+@cached("jogos", ttl=TTL_LISTA)
+def jogos_busca(termo: str = "", limit: int | None = None) -> List[Dict[str, Any]]:
+    return jogos_service.search_jogos(termo, limit)
+
+
+@cached("clientes", ttl=TTL_LISTA)
+def clientes_pagina(termo: str, after: Dict[str, Any] | None, limit: int = 25) -> Dict[str, Any]:
+    return clientes_service.list_clientes_page(termo, after, limit)
+
+
+@cached("clientes", ttl=TTL_LISTA)
+def clientes_busca(termo: str = "", limit: int | None = None, columns: str = "telefone,nome") -> List[Dict[str, Any]]:
+    return clientes_service.search_clientes(termo, limit, columns)
+
+
+# ----------------- Containers / Movimentos -----------------
+
+@cached("containers", ttl=TTL_LISTA)
+def containers_pagina(telefone_prefix: str | None, status: str | None,
+                      after: Dict[str, Any] | None, limit: int = 10) -> Dict[str, Any]:
+    return list_containers_page(telefone_prefix, status, after, limit)
+
+
+@cached("containers", ttl=TTL_LISTA)
+def container_meta(container_id: str) -> Dict[str, Any]:
+    return get_client().table("containers").select("*").eq("id", container_id).maybe_single().execute().data or {}
+
+
+@cached("containers", ttl=TTL_AGREGADO)
+def containers_por_status() -> pd.DataFrame:
+    return reports_service.containers_por_status()
+
+
+@cached("itens", ttl=TTL_AGREGADO)
+def inventario_por_status() -> pd.DataFrame:
+    return reports_service.inventario_por_status()
+
+
+@cached("movimentos", ttl=TTL_LISTA)
+def ultimos_movimentos(limit: int, columns: str = "*") -> List[Dict[str, Any]]:
+    return get_client().table("movimentos").select(columns).order("created_at", desc=True).limit(limit).execute().data or []
+
+
+# ----------------- Dashboard -----------------
+
+@cached("jogos", "clientes", "containers", "ludocoins", ttl=TTL_AGREGADO)
+def dashboard_metrics() -> Dict[str, Any]:
+    return reports_service.dashboard_metrics()
+
+
+# ----------------- LudoCoins -----------------
+
+@cached("ludocoins", ttl=TTL_AGREGADO)
+def passivo_ludocoins() -> float:
+    return reports_service.passivo_ludocoins()
+
+
+@cached("ludocoins", ttl=TTL_CLIENTE)
+def saldo_cliente(telefone: str) -> Dict[str, Any]:
+    return get_client().table("clientes").select("nome,ludocoins_saldo").eq("telefone", telefone).maybe_single().execute().data or {}
+
+
+@cached("ludocoins", ttl=TTL_CLIENTE)
+def transacoes_cliente(telefone: str, limit: int = 50) -> List[Dict[str, Any]]:
+    return (
+        get_client().table("ludocoin_transacoes")
+        .select("created_at,tipo,valor,referencia_item_id,observacao")
+        .eq("telefone_cliente", telefone)
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute().data or []
+    )
+
+
+# ----------------- Envios -----------------
+
+@cached("envios", ttl=TTL_LISTA)
+def envios(status: str | None, after: Dict[str, Any] | None, limit: int = 25) -> Dict[str, Any]:
+    return listar_envios(status, after, limit)
+
+
+@cached("envios", ttl=TTL_LISTA)
+def envio_snapshot(envio_id: str) -> List[Dict[str, Any]]:
+    return get_envio_snapshot(envio_id)
+
+
+@cached("envios", ttl=TTL_LISTA)
+def ultimos_envios(limit: int) -> List[Dict[str, Any]]:
+    return (
+        get_client().table("envios").select("id, status_envio, telefone_cliente, created_at")
+        .order("created_at", desc=True).limit(limit).execute().data or []
+    )
+
+
+@cached("envios", ttl=TTL_AGREGADO)
+def envios_status() -> List[Dict[str, Any]]:
+    return get_client().table("envios").select("status_envio").execute().data or []
+
+
+# ----------------- Tendências (dashboard) -----------------
+
+@cached("movimentos", "containers", "ludocoins", ttl=TTL_AGREGADO)
+def metrics_daily(days: int = 30) -> pd.DataFrame:
+    return reports_service.metrics_daily(days)
@@ -0,0 +1,93 @@
+"""
+Seletor de entidades para as páginas Streamlit (cliente, jogo, container, item...).
+
+Monta uma única vez os dicts id → registro e id → rótulo; o selectbox recebe
+os ids como opções e o format_func é uma consulta ao dict, então renderizar e
+resolver a escolha custa O(1) por opção, sem varrer listas nem `labels.index`.
+
+Com `search`, a lista vem do banco sob demanda (termo digitado → busca top-N,
+ex.: page_cache.clientes_busca) e os dicts ficam em st.session_state por
+termo; só são refeitos quando o termo muda, quando uma das `tags` é
+invalidada no page_cache ou após `ttl` segundos.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+
+from services import page_cache
+
+NENHUM = "— selecione —"
+
+
+class Picker:
+    def __init__(
+        self,
+        key: str,
+        id_of: Callable[[Dict[str, Any]], Any],
+        label_of: Callable[[Dict[str, Any]], str],
+        search: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+        tags: Tuple[str, ...] = (),
+        ttl: float = page_cache.TTL_LISTA,
+    ):
+        self.key = key
+        self.id_of, self.label_of = id_of, label_of
+        self.search, self.tags, self.ttl = search, tags, ttl
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self.labels: Dict[Any, str] = {}
+
+    def _index(self, rows: Iterable[Dict[str, Any]]) -> None:
+        self.rows, self.labels = {}, {}
+        for r in rows:
+            rid = self.id_of(r)
+            self.rows[rid] = r
+            self.labels[rid] = self.label_of(r)
+
+    def load(self, termo: str = "") -> "Picker":
+        """Resultado da busca para `termo`, reaproveitado entre reruns da sessão."""
+        termo = (termo or "").strip()
+        state_key = f"_picker_{self.key}"
+        geracao = page_cache.generation(*self.tags)
+        entry = st.session_state.get(state_key)
+        if (
+            entry is None
+            or entry["termo"] != termo
+            or entry["geracao"] != geracao
+            or time.monotonic() - entry["ts"] > self.ttl
+        ):
+            try:
+                found = self.search(termo) if self.search else []
+            except Exception as e:
+                print("picker.load error:", e)
+                found = []
+            self._index(found)
+            entry = {"termo": termo, "geracao": geracao, "ts": time.monotonic(),
+                     "rows": self.rows, "labels": self.labels}
+            st.session_state[state_key] = entry
+        self.rows, self.labels = entry["rows"], entry["labels"]
+        return self
+
+    def search_input(self, label: str, **kwargs) -> str:
+        """Campo de busca (fora de st.form, para refazer a busca ao digitar) + load."""
+        termo = st.text_input(label, key=f"{self.key}_busca", **kwargs)
+        self.load(termo)
+        return termo
+
+    def selectbox(self, label: str, rows: Optional[Iterable[Dict[str, Any]]] = None,
+                  placeholder: Optional[str] = NENHUM, **kwargs) -> Optional[Dict[str, Any]]:
+        """
+        Selectbox sobre os ids; devolve o registro escolhido (ou None).
+        `rows` usa uma lista já carregada na página em vez da busca.
+        """
+        if rows is not None:
+            self._index(rows)
+        opts: List[Any] = list(self.labels)
+        if placeholder is not None:
+            opts = [placeholder] + opts
+        labels = self.labels
+        escolha = st.selectbox(label, opts, key=self.key,
+                               format_func=lambda v: labels.get(v, str(v)), **kwargs)
+        if placeholder is not None and escolha == placeholder:
+            return None
+        return self.rows.get(escolha)
@@ -1,26 +1,91 @@
 import pandas as pd
+from datetime import datetime, timedelta, timezone
 from services.supabase_client import get_client
 
-def inventario_por_status() -> pd.DataFrame:
-    supa = get_client()
+METRICS_DAILY_COLS = ["mov_compra","mov_listinha","containers_abertos","lc_creditos","lc_debitos","lc_ajustes"]
+
+def _inventario_legacy(supa) -> pd.DataFrame:
     itens = supa.table("container_itens").select("status_item, preco_aplicado_brl").execute().data or []
     df = pd.DataFrame(itens)
     if df.empty:
         return pd.DataFrame(columns=["status_item","quantidade","valor_total"])
 
-    g = df.groupby("status_item").agg(quantidade=("status_item","count"), valor_total=("preco_aplicado_brl","sum")).reset_index()
-
-    return g
+    return df.groupby("status_item").agg(quantidade=("status_item","count"), valor_total=("preco_aplicado_brl","sum")).reset_index()
 
-def containers_por_status() -> pd.DataFrame:
+def inventario_por_status() -> pd.DataFrame:
+    """
+    Quantidade e valor por status_item, agregados no banco (v_inventario_por_status).
+    Se a view não existir, agrega em pandas como antes.
+    """
     supa = get_client()
+    try:
+        rows = supa.table("v_inventario_por_status").select("status_item, quantidade, valor_total").order("status_item").execute().data or []
+    except Exception as e:
+        print("reports_service.inventario_por_status view error:", e)
+        return _inventario_legacy(supa)
+    if not rows:
+        return pd.DataFrame(columns=["status_item","quantidade","valor_total"])
+
+    df = pd.DataFrame(rows, columns=["status_item","quantidade","valor_total"])
+    df["quantidade"] = df["quantidade"].astype(int)
+    df["valor_total"] = df["valor_total"].astype(float)
+    return df
+
+def _containers_legacy(supa) -> pd.DataFrame:
     cts = supa.table("containers").select("status, created_at").execute().data or []
     df = pd.DataFrame(cts)
     if df.empty:
         return pd.DataFrame(columns=["status","quantidade"])
-    
+
     return df.groupby("status").size().reset_index(name="quantidade")
 
+def containers_por_status() -> pd.DataFrame:
+    """Quantidade de containers por status, agregada no banco (v_containers_por_status)."""
+    supa = get_client()
+    try:
+        rows = supa.table("v_containers_por_status").select("status, quantidade").order("status").execute().data or []
+    except Exception as e:
+        print("reports_service.containers_por_status view error:", e)
+        return _containers_legacy(supa)
+    if not rows:
+        return pd.DataFrame(columns=["status","quantidade"])
+
+    df = pd.DataFrame(rows, columns=["status","quantidade"])
+    df["quantidade"] = df["quantidade"].astype(int)
+    return df
+
+def _count(supa, table: str, **filters) -> int:
+    q = supa.table(table).select("*", count="exact").limit(1)
+    for k, v in filters.items():
+        q = q.eq(k, v)
+    return int(q.execute().count or 0)
+
+def dashboard_metrics() -> dict:
+    """
+    Contagens do topo do dashboard + passivo de L$ numa única RPC (dashboard_metrics).
+    Sem a RPC, usa contagens exatas do PostgREST (sem baixar as chaves).
+    """
+    supa = get_client()
+    try:
+        data = supa.rpc("dashboard_metrics", {}).execute().data
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if data:
+            return {
+                "jogos_ativos": int(data.get("jogos_ativos") or 0),
+                "clientes": int(data.get("clientes") or 0),
+                "containers_abertos": int(data.get("containers_abertos") or 0),
+                "passivo_ludocoins": float(data.get("passivo_ludocoins") or 0),
+            }
+    except Exception as e:
+        print("reports_service.dashboard_metrics rpc error:", e)
+    return {
+        "jogos_ativos": _count(supa, "jogos", ativo=True),
+        "clientes": _count(supa, "clientes"),
+        "containers_abertos": _count(supa, "containers", status="ABERTO"),
+        "passivo_ludocoins": passivo_ludocoins(),
+    }
+
 def passivo_ludocoins() -> float:
     supa = get_client()
     v = supa.table("v_passivo_ludocoins").select("*").execute().data or []
@@ -28,3 +93,62 @@ def passivo_ludocoins() -> float:
         return float(v[0]["total_ludocoins"] or 0)
 
     return 0.0
+
+def _dias(days: int) -> pd.DatetimeIndex:
+    hoje = datetime.now(timezone.utc).date()
+    return pd.date_range(start=hoje - timedelta(days=days-1), end=hoje, freq="D")
+
+def _por_dia(rows, valor=None) -> pd.DataFrame:
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["dia"] = pd.to_datetime(df["created_at"], utc=True).dt.tz_localize(None).dt.normalize()
+    if valor:
+        df[valor] = pd.to_numeric(df[valor], errors="coerce").fillna(0.0)
+    return df
+
+def _metrics_daily_legacy(supa, days: int) -> pd.DataFrame:
+    desde = _dias(days)[0].strftime("%Y-%m-%dT00:00:00Z")  # corte em UTC, como os baldes
+    out = pd.DataFrame(0.0, index=_dias(days), columns=METRICS_DAILY_COLS)
+
+    dfm = _por_dia(supa.table("movimentos").select("tipo,created_at").gte("created_at", desde).execute().data or [])
+    if not dfm.empty:
+        mov = dfm.groupby(["dia","tipo"]).size().unstack(fill_value=0)
+        for tipo, col in (("COMPRA","mov_compra"), ("LISTINHA","mov_listinha")):
+            if tipo in mov:
+                out[col] = mov[tipo].reindex(out.index, fill_value=0)
+
+    dfc = _por_dia(supa.table("containers").select("created_at").gte("created_at", desde).execute().data or [])
+    if not dfc.empty:
+        out["containers_abertos"] = dfc.groupby("dia").size().reindex(out.index, fill_value=0)
+
+    dfl = _por_dia(supa.table("ludocoin_transacoes").select("tipo,valor,created_at").gte("created_at", desde).execute().data or [], "valor")
+    if not dfl.empty:
+        lc = dfl.groupby(["dia","tipo"])["valor"].sum().unstack(fill_value=0.0)
+        for tipo, col in (("CREDITO_CONVERSAO","lc_creditos"), ("DEBITO_UTILIZACAO","lc_debitos"), ("AJUSTE","lc_ajustes")):
+            if tipo in lc:
+                out[col] = lc[tipo].reindex(out.index, fill_value=0.0)
+    return out
+
+def metrics_daily(days: int) -> pd.DataFrame:
+    """
+    Métricas por dia (UTC) dos últimos `days` dias, incluindo hoje, lidas do
+    rollup metrics_daily (mantido por triggers): uma linha por dia, dias sem
+    atividade zerados. Sem a tabela, agrega as tabelas brutas do período.
+    """
+    supa = get_client()
+    idx = _dias(days)
+    try:
+        rows = (
+            supa.table("metrics_daily").select("dia," + ",".join(METRICS_DAILY_COLS))
+            .gte("dia", idx[0].strftime("%Y-%m-%d")).order("dia")
+            .execute().data or []
+        )
+    except Exception as e:
+        print("reports_service.metrics_daily error:", e)
+        return _metrics_daily_legacy(supa, days)
+
+    df = pd.DataFrame(rows, columns=["dia"] + METRICS_DAILY_COLS)
+    df["dia"] = pd.to_datetime(df["dia"])
+    df = df.set_index("dia").apply(pd.to_numeric, errors="coerce").astype(float)
+    return df.reindex(idx).fillna(0.0)
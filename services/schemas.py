@@ -0,0 +1,70 @@
+"""
+Schemas de colunas das tabelas/consultas exibidas nas páginas, para
+services.utils.load_frame. Tipos: string, int, float, bool, category, ts, json.
+"""
+
+JOGOS = {
+    "id": "string",
+    "nome": "string",
+    "nome_evento": "string",
+    "preco_brl": "float",
+    "status": "category",
+    "sku": "string",
+    "categoria": "string",
+    "ativo": "bool",
+    "created_at": "ts",
+}
+
+CLIENTES = {
+    "telefone": "string",
+    "nome": "string",
+    "endereco": "string",
+    "ludocoins_saldo": "float",
+    "opt_in_whatsapp": "bool",
+    "created_at": "ts",
+}
+
+CONTAINERS = {
+    "id": "string",
+    "telefone_cliente": "string",
+    "status": "category",
+    "created_at": "ts",
+    "updated_at": "ts",
+}
+
+# itens de container (página Containers) e snapshot de itens de um envio
+ITENS = {
+    "id_curto": "string",
+    "jogo": "string",
+    "origem": "category",
+    "status_item": "category",
+    "preco_aplicado_brl": "float",
+}
+
+MOVIMENTOS = {
+    "id": "string",
+    "tipo": "category",
+    "telefone_cliente": "string",
+    "jogo_id": "string",
+    "preco_aplicado_brl": "float",
+    "container_id": "string",
+    "container_item_id": "string",
+    "created_at": "ts",
+}
+
+LUDOCOIN_TRANSACOES = {
+    "created_at": "ts",
+    "tipo": "category",
+    "valor": "float",
+    "referencia_item_id": "string",
+    "observacao": "string",
+}
+
+ENVIOS = {
+    "id": "string",
+    "container_id": "string",
+    "telefone_cliente": "string",
+    "nome_cliente": "string",
+    "status_envio": "category",
+    "created_at": "ts",
+}
@@ -1,13 +1,148 @@
+import importlib.util
 import os
-from supabase import create_client, Client
+import threading
+import httpx
+from gotrue import AsyncMemoryStorage
+from supabase import create_client, Client, ClientOptions, AClient
+from postgrest.utils import SyncClient, AsyncClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_client() -> Client:
+# Pool HTTP compartilhado pelo processo (webhook e Streamlit). Ajustável via .env.
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+# HTTP/2 exige o pacote h2 (httpx[http2]); sem ele, fica em HTTP/1.1 em vez de falhar
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_client: Client | None = None
+_async_client: AClient | None = None
+_lock = threading.Lock()
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=SUPABASE_POOL_SIZE,
+        max_keepalive_connections=SUPABASE_POOL_KEEPALIVE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+    )
+
+
+def _install_pool(client: Client) -> None:
+    """
+    O PostgREST do supabase-py cria sua sessão httpx com os limites padrão.
+    Troca por uma sessão com os limites/timeout configurados (mesma base_url e headers).
+    """
+    pg = client.postgrest
+    old = pg.session
+    pg.session = SyncClient(
+        base_url=old.base_url,
+        headers=old.headers,
+        timeout=_timeout(),
+        limits=_limits(),
+        follow_redirects=True,
+        http2=SUPABASE_HTTP2,
+    )
+    old.close()
+
+
+def _install_async_pool(client: AClient) -> None:
+    # Equivalente assíncrono de _install_pool (a sessão antiga ainda não abriu conexões)
+    pg = client.postgrest
+    old = pg.session
+    pg.session = AsyncClient(
+        base_url=old.base_url,
+        headers=old.headers,
+        timeout=_timeout(),
+        limits=_limits(),
+        follow_redirects=True,
+        http2=SUPABASE_HTTP2,
+    )
+
+
+def _credentials() -> tuple[str, str]:
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
     if not url or not key:
         raise RuntimeError("SUPABASE_URL/SUPABASE_KEY não configurados")
+    return url, key
+
+
+def _create() -> Client:
+    url, key = _credentials()
+    client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=_timeout()))
+    _install_pool(client)
+    return client
+
+
+def get_client() -> Client:
+    """
+    Cliente Supabase único por processo, com pool keep-alive.
+    O httpx.Client por baixo é thread-safe, então pode ser compartilhado entre
+    requisições do webhook e reruns do Streamlit.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            _client = _create()
+    return _client
+
+
+def close_client() -> None:
+    """Fecha as conexões do pool (chamado no shutdown do FastAPI)."""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is None:
+        return
+    try:
+        client.postgrest.session.close()
+    except Exception as e:
+        print("supabase_client.close_client error:", e)
+
+
+def is_missing_rpc(e: Exception) -> bool:
+    """True quando a RPC ainda não existe no banco (schema antigo sem a função)."""
+    return getattr(e, "code", None) == "PGRST202" or "Could not find the function" in str(e)
+
+
+def get_async_client() -> AClient:
+    """
+    Cliente Supabase assíncrono (PostgREST sobre httpx.AsyncClient) para o webhook.
+    Criado sob demanda dentro do event loop do uvicorn e fechado no lifespan.
+    """
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+    with _lock:
+        if _async_client is None:
+            url, key = _credentials()
+            client = AClient(
+                supabase_url=url,
+                supabase_key=key,
+                options=ClientOptions(storage=AsyncMemoryStorage(), postgrest_client_timeout=_timeout()),
+            )
+            _install_async_pool(client)
+            _async_client = client
+    return _async_client
+
 
-    return create_client(url, key)
+async def close_async_client() -> None:
+    global _async_client
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is None:
+        return
+    try:
+        await client.postgrest.session.aclose()
+    except Exception as e:
+        print("supabase_client.close_async_client error:", e)
@@ -1,16 +1,69 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Mapping
+
 import pandas as pd
+import streamlit as st
 
 TZ = "America/Fortaleza"
-FMT = "%d/%m/%Y %H:%M:%S"
-
-def format_ts(df):
-    if df is None or df.empty:
-        return df
-    ts_cols = [c for c in df.columns if c.endswith("_at") or c in ("created_at", "updated_at")]
-    for c in ts_cols:
-        df[c] = (
-            pd.to_datetime(df[c], utc=True, errors="coerce")
-              .dt.tz_convert(TZ)
-              .dt.strftime(FMT)
-        )
-    return df
+# formato das datas na exibição (sintaxe moment.js do st.column_config)
+DISPLAY_FMT = "DD/MM/YYYY HH:mm:ss"
+
+# tipo do schema (services/schemas.py) → dtype pandas; strings em Arrow
+_DTYPES = {
+    "string": pd.StringDtype("pyarrow"),
+    "int": "Int64",
+    "float": "Float64",
+    "bool": "boolean",
+    "category": "category",
+}
+
+
+def _series(values: List[Any], kind: str) -> pd.Series:
+    if kind == "ts":
+        return pd.Series(pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")).dt.tz_convert(TZ)
+    if kind == "json":
+        return pd.Series(values, dtype=object)
+    if kind in ("int", "float"):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype(_DTYPES[kind])
+    return pd.Series(values, dtype=_DTYPES[kind])
+
+
+def load_frame(rows: Iterable[Mapping[str, Any]] | None, schema: Mapping[str, str]) -> pd.DataFrame:
+    """
+    Monta um DataFrame tipado a partir das linhas do PostgREST (lista de dicts).
+    `schema` (services/schemas.py) define colunas e tipos: string (Arrow),
+    int, float, bool, category, ts (datetime com fuso TZ) ou json (objeto).
+    Colunas do schema ausentes nas linhas são omitidas; colunas extras nas
+    linhas entram como vieram. Datas continuam datetime — a formatação é só
+    na exibição (column_config).
+    """
+    rows = list(rows or [])
+    if not rows:
+        return pd.DataFrame(columns=list(schema))
+    keys: Dict[str, None] = dict.fromkeys(schema)
+    for r in rows:
+        keys.update(dict.fromkeys(r))
+    cols: Dict[str, pd.Series] = {}
+    for k in keys:
+        values = [r.get(k) for r in rows]
+        if k not in schema:
+            cols[k] = pd.Series(values, dtype=object)
+        elif any(k in r for r in rows):
+            cols[k] = _series(values, schema[k])
+    return pd.DataFrame(cols)
+
+
+def column_config(df: pd.DataFrame | None) -> Dict[str, Any]:
+    """column_config do st.dataframe: datas no formato dd/mm/aaaa hh:mm:ss (fuso TZ)."""
+    if df is None:
+        return {}
+    return {
+        c: st.column_config.DatetimeColumn(format=DISPLAY_FMT)
+        for c in df.columns
+        if isinstance(df[c].dtype, pd.DatetimeTZDtype)
+    }
+
+
+def show_frame(df: pd.DataFrame, **kwargs) -> None:
+    """st.dataframe com as datas formatadas na exibição."""
+    st.dataframe(df, use_container_width=True, column_config=column_config(df), **kwargs)
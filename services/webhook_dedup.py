@@ -0,0 +1,141 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from services.supabase_client import get_async_client
+
+
+class MemoryDedupStore:
+    """
+    Conjunto limitado de ids já vistos, com expiração por TTL e descarte do
+    mais antigo quando enche. Vale apenas para o processo atual.
+    """
+
+    def __init__(self, ttl_seconds: float = 600, max_size: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        while self._seen:
+            _key, expires = next(iter(self._seen.items()))
+            if expires > now and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def contains(self, key: str) -> bool:
+        expires = self._seen.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def add(self, key: str) -> None:
+        now = time.monotonic()
+        self._seen[key] = now + self.ttl
+        self._seen.move_to_end(key)
+        self._evict(now)
+
+    async def add_if_absent(self, key: str) -> bool:
+        if self.contains(key):
+            return False
+        self.add(key)
+        return True
+
+    def discard(self, key: str) -> None:
+        self._seen.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SupabaseDedupStore:
+    """
+    Backend compartilhado entre workers/processos: tabela webhook_mensagens com
+    message_id como PK. Inserir um id repetido viola a PK e indica duplicata.
+    Registros mais velhos que o TTL são apagados de tempos em tempos.
+    """
+
+    def __init__(self, ttl_seconds: float = 600, cleanup_every: int = 500):
+        self.ttl = ttl_seconds
+        self.cleanup_every = cleanup_every
+        self._inserts = 0
+
+    async def add_if_absent(self, key: str) -> bool:
+        supa = get_async_client()
+        try:
+            await supa.table("webhook_mensagens").insert({"message_id": key}).execute()
+        except Exception as e:
+            if getattr(e, "code", None) == "23505" or "duplicate key" in str(e):
+                return False
+            # Falha no backend não pode derrubar o atendimento: trata como nova
+            print("SupabaseDedupStore.add_if_absent error:", e)
+            return True
+        self._inserts += 1
+        if self._inserts % self.cleanup_every == 0:
+            await self._cleanup(supa)
+        return True
+
+    async def discard(self, key: str) -> None:
+        supa = get_async_client()
+        try:
+            await supa.table("webhook_mensagens").delete().eq("message_id", key).execute()
+        except Exception as e:
+            print("SupabaseDedupStore.discard error:", e)
+
+    async def _cleanup(self, supa) -> None:
+        cutoff = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - self.ttl))
+        try:
+            await supa.table("webhook_mensagens").delete().lt("created_at", cutoff).execute()
+        except Exception as e:
+            print("SupabaseDedupStore cleanup error:", e)
+
+
+class WebhookDeduplicator:
+    """
+    Filtra reentregas do provedor pelo id da mensagem. O cache em memória fica
+    na frente do backend compartilhado (se houver), então reentregas no mesmo
+    processo são descartadas sem nenhuma chamada ao Supabase.
+    """
+
+    def __init__(self, memory: MemoryDedupStore, shared: Optional[SupabaseDedupStore] = None):
+        self.memory = memory
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    async def is_duplicate(self, message_id: Optional[str]) -> bool:
+        if not message_id:
+            return False
+        if self.memory.contains(message_id):
+            self.hits += 1
+            return True
+        if self.shared is not None and not await self.shared.add_if_absent(message_id):
+            self.memory.add(message_id)
+            self.hits += 1
+            return True
+        self.memory.add(message_id)
+        self.misses += 1
+        return False
+
+    async def forget(self, message_id: Optional[str]) -> None:
+        """Esquece o id (mensagem recusada) para que a reentrega do provedor seja processada."""
+        if not message_id:
+            return
+        self.memory.discard(message_id)
+        if self.shared is not None:
+            await self.shared.discard(message_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "supabase" if self.shared is not None else "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_ids": len(self.memory),
+        }
+
+
+def build_deduplicator(backend: str, ttl_seconds: float, max_size: int) -> Optional[WebhookDeduplicator]:
+    backend = (backend or "").lower()
+    if backend in ("off", "none", ""):
+        return None
+    shared = SupabaseDedupStore(ttl_seconds) if backend == "supabase" else None
+    return WebhookDeduplicator(MemoryDedupStore(ttl_seconds, max_size), shared)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import asyncio
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class WebhookQueue:
+    """
+    Pool de workers assíncronos para processar webhooks fora do request.
+
+    Cada worker tem sua própria fila limitada e as mensagens são distribuídas
+    por hash do telefone: o mesmo cliente cai sempre no mesmo worker, então
+    suas mensagens continuam sendo processadas na ordem de chegada.
+    """
+
+    def __init__(self, handler: Handler, workers: int = 8, max_size: int = 1000):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_size = max(self.workers, int(max_size))
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self._last_latency_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _shard(self, key: str) -> int:
+        # crc32 é estável entre processos (hash() de str não é)
+        return zlib.crc32((key or "").encode()) % self.workers
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        per_worker = max(1, self.max_size // self.workers)
+        self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._run(q), name=f"webhook-worker-{i}") for i, q in enumerate(self._queues)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Espera as filas esvaziarem (até `timeout`) e encerra os workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            print(f"webhook_queue: encerrando com {self.depth()} mensagem(ns) pendente(s)")
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queues = [], []
+
+    def submit(self, key: str, payload: Dict[str, Any],
+               on_done: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Enfileira sem bloquear. Retorna False se a fila do worker estiver cheia.
+        `on_done` é chamado pelo worker depois do handler (ex.: liberar o corpo spooled).
+        """
+        q = self._queues[self._shard(key)]
+        try:
+            q.put_nowait((time.monotonic(), payload, on_done))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self, q: asyncio.Queue) -> None:
+        while True:
+            t0, payload, on_done = await q.get()
+            self.in_flight += 1
+            try:
+                await self.handler(payload)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print("webhook_queue: erro processando mensagem:", e)
+            finally:
+                if on_done is not None:
+                    try:
+                        on_done()
+                    except Exception as e:
+                        print("webhook_queue: erro no on_done:", e)
+                self.in_flight -= 1
+                self._last_latency_ms = round((time.monotonic() - t0) * 1000, 1)
+                q.task_done()
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_size": self.max_size,
+            "depth": self.depth(),
+            "depth_por_worker": [q.qsize() for q in self._queues],
+            "in_flight": self.in_flight,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "last_latency_ms": self._last_latency_ms,
+        }
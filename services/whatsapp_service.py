@@ -1,6 +1,13 @@
 import os, hmac, hashlib, httpx
-import requests
+import asyncio
+import importlib.util
+import json
+import random
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+
+from services.media_service import as_media
 load_dotenv()
 
 WA_BASE_URL = os.getenv("WA_BASE_URL", "http://localhost:21465")
@@ -8,9 +15,59 @@ WA_BEARER   = os.getenv("WA_BEARER", "")
 WA_SESSION  = os.getenv("WA_SESSION", "ludolovers")
 WA_WEBHOOK_SECRET = os.getenv("WA_WEBHOOK_SECRET", "")
 
+# Cliente HTTP compartilhado (aberto/fechado pelo lifespan do FastAPI)
+WA_TIMEOUT = float(os.getenv("WA_TIMEOUT", "15"))
+WA_MAX_CONNECTIONS = int(os.getenv("WA_MAX_CONNECTIONS", "20"))
+WA_MAX_KEEPALIVE = int(os.getenv("WA_MAX_KEEPALIVE", "10"))
+WA_KEEPALIVE_EXPIRY = float(os.getenv("WA_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 só é negociado via TLS (ALPN) e exige o pacote h2; sem ele, fica em HTTP/1.1
+WA_HTTP2 = os.getenv("WA_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+# Upload de arquivos: timeout próprio (PDFs são lentos) e retentativas em 5xx/timeout
+WA_FILE_TIMEOUT = float(os.getenv("WA_FILE_TIMEOUT", "30"))
+WA_FILE_RETRIES = int(os.getenv("WA_FILE_RETRIES", "3"))
+WA_FILE_BACKOFF = float(os.getenv("WA_FILE_BACKOFF", "0.5"))
+
+_http: httpx.AsyncClient | None = None
+
 def _headers():
     return {"Authorization": f"Bearer {WA_BEARER}"}
 
+def _new_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=WA_TIMEOUT,
+        http2=WA_HTTP2,
+        limits=httpx.Limits(
+            max_connections=WA_MAX_CONNECTIONS,
+            max_keepalive_connections=WA_MAX_KEEPALIVE,
+            keepalive_expiry=WA_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+async def open_http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = _new_http_client()
+    return _http
+
+async def close_http_client() -> None:
+    global _http
+    client, _http = _http, None
+    if client is not None:
+        await client.aclose()
+
+@asynccontextmanager
+async def _http_client():
+    """
+    Usa o cliente compartilhado quando o lifespan o abriu (webhook).
+    Fora dele (ex.: asyncio.run nas páginas Streamlit) abre um cliente efêmero,
+    já que cada asyncio.run tem seu próprio event loop.
+    """
+    if _http is not None:
+        yield _http
+        return
+    async with _new_http_client() as client:
+        yield client
+
 def verify_signature(raw_body: bytes, signature: str) -> bool:
     # Se não houver segredo, não valida (útil quando WPPConnect não assina webhooks)
     if not WA_WEBHOOK_SECRET:
@@ -24,20 +81,36 @@ async def send_message(to: str, text: str) -> dict:
 
     url = f"{WA_BASE_URL}/api/{WA_SESSION}/send-message"
     data = {"phone": to, "message": text}
-    async with httpx.AsyncClient(timeout=15.0) as client:
+    async with _http_client() as client:
         r = await client.post(url, headers=_headers(), json=data)
         r.raise_for_status()
         return r.json()
 
-def send_file(to: str, base64_data: str, filename: str, caption: str = ""):
+def _file_body(to: str, media, filename: str, caption: str, mime: str):
     """
-    Envia arquivo base64 (PDF/Imagem). O WPPConnect aceita base64 em alguns endpoints:
-    /send-file-base64  (algumas builds)
-    /send-file         (com URL)
-    Aqui usamos o mais comum: /send-file-base64
+    Corpo JSON do /send-file-base64 em blocos: o base64 vai do MediaRef (ou da
+    str) direto para o socket, sem montar o prefixo data: numa cópia da string.
+    Retorna (tamanho, gerador) para enviar com Content-Length.
     """
-    # -- 1) garantir prefixo data:mime;base64,
-    b64 = (base64_data or "").strip()
+    prefix = b"" if media.head(5) == "data:" else f"data:{mime};base64,".encode()
+    head = (
+        b'{"phone":' + json.dumps(to).encode()
+        + b',"filename":' + json.dumps(filename).encode()
+        + b',"caption":' + json.dumps(caption or "").encode()
+        + b',"base64":"' + prefix
+    )
+    tail = b'"}'
+
+    def body():
+        yield head
+        yield from media.iter_json_chunks()
+        yield tail
+
+    return len(head) + media.json_size() + len(tail), body()
+
+def _file_meta(media, filename: str):
+    """Nome final e mime do arquivo: pelo nome primeiro, senão pela assinatura do base64."""
+    sig = media.head(8)
     fn = (filename or "comprovante").strip()
     mime = None
     # tentar inferir pelo nome primeiro
@@ -50,16 +123,16 @@ def send_file(to: str, base64_data: str, filename: str, caption: str = ""):
         mime = "image/jpeg"
     # se não der pelo nome, tentar pela “assinatura” do base64
     if not mime:
-        if b64.startswith("JVBERi0"):       # %PDF
+        if sig.startswith("JVBERi0"):       # %PDF
             mime = "application/pdf"
             if "." not in fn_l: fn = ".pdf"
-        elif b64.startswith("iVBOR"):       # PNG
+        elif sig.startswith("iVBOR"):       # PNG
             mime = "image/png"
             if "." not in fn_l: fn = ".png"
-        elif b64.startswith("/9j/"):        # JPEG
+        elif sig.startswith("/9j/"):        # JPEG
             mime = "image/jpeg"
             if "." not in fn_l: fn = ".jpg"
-        elif b64.startswith("R0lGOD"):      # GIF
+        elif sig.startswith("R0lGOD"):      # GIF
             mime = "image/gif"
             if "." not in fn_l: fn = ".gif"
     # fallback
@@ -67,18 +140,53 @@ def send_file(to: str, base64_data: str, filename: str, caption: str = ""):
         mime = "application/octet-stream"
         if "." not in fn_l:
             fn = ".bin"
+    return fn, mime
 
-    if not b64.startswith("data:"):
-        b64 = f"data:{mime};base64,{b64}"
+async def _aiter(chunks):
+    for chunk in chunks:
+        yield chunk
+
+def _retry_delay(attempt: int) -> float:
+    # backoff exponencial com jitter para não sincronizar retentativas
+    return WA_FILE_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+async def send_file_async(to: str, base64_data, filename: str, caption: str = "") -> dict:
+    """
+    Envia arquivo base64 (PDF/Imagem) pelo cliente HTTP compartilhado. O WPPConnect aceita base64 em alguns endpoints:
+    /send-file-base64  (algumas builds)
+    /send-file         (com URL)
+    Aqui usamos o mais comum: /send-file-base64
 
+    `base64_data` pode ser str ou MediaRef (anexo que ficou no arquivo temporário
+    do webhook); o corpo é enviado em streaming. Timeouts e respostas 5xx são
+    repetidos até WA_FILE_RETRIES vezes, com backoff e jitter.
+    """
+    media = as_media(base64_data)
+    fn, mime = _file_meta(media, filename)
     url = f"{WA_BASE_URL}/api/ludolovers/send-file-base64"
-    payload = {
-        "phone": to,
-        "base64": b64,
-        "filename": fn,
-        "caption": caption or ""
-    }
-
-    r = requests.post(url, headers=_headers(), json=payload, timeout=30)
-    r.raise_for_status()
-    return r.json()
+
+    started = time.monotonic()
+    attempts = max(1, WA_FILE_RETRIES)
+    async with _http_client() as client:
+        for attempt in range(attempts):
+            # o gerador do corpo é de uso único: remonta a cada tentativa
+            size, body = _file_body(to, media, fn, caption, mime)
+            headers = {**_headers(), "Content-Type": "application/json", "Content-Length": str(size)}
+            try:
+                r = await client.post(url, headers=headers, content=_aiter(body), timeout=WA_FILE_TIMEOUT)
+            except httpx.TimeoutException as e:
+                if attempt + 1 >= attempts:
+                    raise
+                print(f"send_file timeout (tentativa {attempt + 1}/{attempts}):", e)
+            else:
+                if r.status_code < 500 or attempt + 1 >= attempts:
+                    r.raise_for_status()
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    print(f"send_file: {size} bytes em {elapsed_ms:.0f} ms ({attempt + 1} tentativa(s))")
+                    return r.json()
+                print(f"send_file HTTP {r.status_code} (tentativa {attempt + 1}/{attempts})")
+            await asyncio.sleep(_retry_delay(attempt))
+
+def send_file(to: str, base64_data, filename: str, caption: str = "") -> dict:
+    """Versão síncrona para as páginas Streamlit (não chamar de dentro do event loop)."""
+    return asyncio.run(send_file_async(to, base64_data, filename, caption))
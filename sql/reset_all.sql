@@ -8,6 +8,8 @@ BEGIN;
 
 -- 1) Views (antes, para evitar dependências)
 DROP VIEW IF EXISTS public.v_passivo_ludocoins;
+DROP VIEW IF EXISTS public.v_inventario_por_status;
+DROP VIEW IF EXISTS public.v_containers_por_status;
 
 -- 2) Tabelas do projeto (CASCADE remove FKs, triggers e constraints dependentes)
 DROP TABLE IF EXISTS public.auditoria              CASCADE;
@@ -19,6 +21,8 @@ DROP TABLE IF EXISTS public.movimentos             CASCADE;
 DROP TABLE IF EXISTS public.containers             CASCADE;
 DROP TABLE IF EXISTS public.jogos                  CASCADE;
 DROP TABLE IF EXISTS public.chat_states            CASCADE;
+DROP TABLE IF EXISTS public.webhook_mensagens      CASCADE;
+DROP TABLE IF EXISTS public.metrics_daily          CASCADE;
 DROP TABLE IF EXISTS public.clientes               CASCADE;
 DROP TABLE IF EXISTS public.configuracoes          CASCADE;
 
@@ -26,6 +30,17 @@ DROP TABLE IF EXISTS public.configuracoes          CASCADE;
 DROP FUNCTION IF EXISTS public.trg_chat_states_updated_at()          CASCADE;
 DROP FUNCTION IF EXISTS public.trg_container_item_elegibilidade()    CASCADE;
 DROP FUNCTION IF EXISTS public.convert_item_to_ludocoins(uuid, text) CASCADE;
+DROP FUNCTION IF EXISTS public.get_or_create_open_container(text, text) CASCADE;
+DROP FUNCTION IF EXISTS public.convert_items_to_ludocoins(uuid[], text, text) CASCADE;
+DROP FUNCTION IF EXISTS public.criar_pedido_envio(text, text, text, jsonb, text) CASCADE;
+DROP FUNCTION IF EXISTS public.add_movimentos_bulk(jsonb) CASCADE;
+DROP FUNCTION IF EXISTS public.debit_ludocoins(text, numeric, text, text) CASCADE;
+DROP FUNCTION IF EXISTS public.dashboard_metrics() CASCADE;
+DROP FUNCTION IF EXISTS public.search_jogos(text,int,boolean)      CASCADE;
+DROP FUNCTION IF EXISTS public.trg_metrics_daily_movimentos()       CASCADE;
+DROP FUNCTION IF EXISTS public.trg_metrics_daily_containers()       CASCADE;
+DROP FUNCTION IF EXISTS public.trg_metrics_daily_ludocoins()        CASCADE;
+DROP FUNCTION IF EXISTS public.rebuild_metrics_daily(date)          CASCADE;
 
 COMMIT;
 
@@ -6,6 +6,7 @@
 
 create extension if not exists "uuid-ossp";
 create extension if not exists pgcrypto;
+create extension if not exists pg_trgm;
 
 -- =========================
 -- CLIENTES
@@ -19,6 +20,12 @@ create table if not exists public.clientes (
   created_at timestamptz not null default now()
 );
 
+-- diretório paginado e busca dos seletores (clientes_service): cursor em
+-- (created_at, telefone) desc, prefixo de telefone e trecho do nome (trigram)
+create index if not exists ix_clientes_keyset on public.clientes(created_at desc, telefone desc);
+create index if not exists ix_clientes_telefone_prefix on public.clientes(telefone text_pattern_ops);
+create index if not exists ix_clientes_nome_trgm on public.clientes using gin (nome gin_trgm_ops);
+
 -- =========================
 -- JOGOS
 -- =========================
@@ -34,6 +41,10 @@ create table if not exists public.jogos (
   created_at timestamptz not null default now()
 );
 
+-- busca por nome/SKU (jogos_service.search_jogos): ILIKE '%termo%' usa os índices trigram
+create index if not exists ix_jogos_nome_trgm on public.jogos using gin (nome gin_trgm_ops);
+create index if not exists ix_jogos_sku_trgm on public.jogos using gin (sku gin_trgm_ops);
+
 -- =========================
 -- CONTAINERS
 -- =========================
@@ -50,6 +61,17 @@ create unique index if not exists ux_one_open_container_per_phone
 on public.containers(telefone_cliente)
 where status = 'ABERTO';
 
+-- listagem paginada (containers_service.list_containers_page): cursor em
+-- (updated_at, created_at, id) desc, com ou sem status; prefixo de telefone via like 'x%'
+create index if not exists ix_containers_keyset
+on public.containers(updated_at desc, created_at desc, id desc);
+
+create index if not exists ix_containers_status_keyset
+on public.containers(status, updated_at desc, created_at desc, id desc);
+
+create index if not exists ix_containers_telefone_prefix
+on public.containers(telefone_cliente text_pattern_ops, updated_at desc, created_at desc, id desc);
+
 -- =========================
 -- MOVIMENTOS
 -- =========================
@@ -121,6 +143,10 @@ create table if not exists public.envios (
   created_at timestamptz not null default now()
 );
 
+-- listagem paginada (envios_service.listar_envios): cursor em (created_at, id) desc, com ou sem status
+create index if not exists ix_envios_keyset on public.envios(created_at desc, id desc);
+create index if not exists ix_envios_status_keyset on public.envios(status_envio, created_at desc, id desc);
+
 -- =========================
 -- LOGS/AUDITORIA
 -- =========================
@@ -163,12 +189,38 @@ create trigger if not exists tgu_chat_states_updated_at
 before insert or update on public.chat_states
 for each row execute function public.trg_chat_states_updated_at();
 
+-- =========================
+-- WEBHOOK: ids de mensagens já processadas (dedup compartilhado, WEBHOOK_DEDUP=supabase)
+-- =========================
+create table if not exists public.webhook_mensagens (
+  message_id text primary key,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists ix_webhook_mensagens_created_at
+on public.webhook_mensagens(created_at);
+
 -- =========================
 -- VIEW: Passivo de LudoCoins
 -- =========================
 create or replace view public.v_passivo_ludocoins as
 select coalesce(sum(ludocoins_saldo),0) as total_ludocoins from public.clientes;
 
+-- =========================
+-- VIEWS: Relatórios agregados no banco (reports_service lê só as linhas agrupadas)
+-- =========================
+create or replace view public.v_inventario_por_status as
+select status_item,
+       count(*) as quantidade,
+       coalesce(sum(preco_aplicado_brl), 0) as valor_total
+from public.container_itens
+group by status_item;
+
+create or replace view public.v_containers_por_status as
+select status, count(*) as quantidade
+from public.containers
+group by status;
+
 -- =========================
 -- RPC: Conversão de item → LudoCoins
 -- =========================
@@ -213,6 +265,424 @@ begin
 end;
 $$;
 
+-- =========================
+-- RPC: Conversão em lote (TROCA com vários itens numa ida ao banco)
+-- Cada item roda num bloco com EXCEPTION (savepoint): um item inválido não
+-- desfaz os outros. Com p_telefone, só converte itens desse cliente e devolve o saldo.
+-- =========================
+create or replace function public.convert_items_to_ludocoins(
+  p_item_ids  uuid[],
+  p_atendente text,
+  p_telefone  text default null
+) returns json language plpgsql as $$
+declare
+  v_id    uuid;
+  v_dono  text;
+  v_res   json;
+  v_itens jsonb := '[]'::jsonb;
+  v_total numeric(12,2) := 0;
+  v_saldo numeric(12,2);
+begin
+  -- ordem fixa de ids evita deadlock entre conversões concorrentes
+  for v_id in select distinct x from unnest(p_item_ids) as x order by x loop
+    begin
+      if p_telefone is not null then
+        select c.telefone_cliente into v_dono
+        from public.container_itens ci
+        join public.containers c on c.id = ci.container_id
+        where ci.id = v_id;
+        if v_dono is distinct from p_telefone then
+          raise exception 'Item não pertence ao cliente';
+        end if;
+      end if;
+
+      v_res := public.convert_item_to_ludocoins(v_id, p_atendente);
+      v_total := v_total + (v_res->>'valor')::numeric;
+      v_itens := v_itens || jsonb_build_array(
+        jsonb_build_object('item_id', v_id, 'ok', true, 'valor', (v_res->>'valor')::numeric));
+    exception when others then
+      v_itens := v_itens || jsonb_build_array(
+        jsonb_build_object('item_id', v_id, 'ok', false, 'erro', sqlerrm));
+    end;
+  end loop;
+
+  if p_telefone is not null then
+    select ludocoins_saldo into v_saldo from public.clientes where telefone = p_telefone;
+  end if;
+
+  return json_build_object('ok', true, 'itens', v_itens, 'total', v_total, 'saldo', v_saldo);
+end;
+$$;
+
+-- =========================
+-- RPC: Container ABERTO do cliente (resolve ou cria numa única ida ao banco)
+-- Mesma prioridade do containers_service: aberto com itens → aberto mais recente → novo.
+-- O índice parcial ux_one_open_container_per_phone resolve corridas entre requests.
+-- =========================
+create or replace function public.get_or_create_open_container(p_telefone text, p_new_id text)
+returns text language plpgsql as $$
+declare
+  v_id text;
+begin
+  select c.id into v_id
+  from public.containers c
+  where c.telefone_cliente = p_telefone
+    and c.status = 'ABERTO'
+  order by exists (select 1 from public.container_itens ci where ci.container_id = c.id) desc,
+           c.updated_at desc,
+           c.created_at desc
+  limit 1;
+  if v_id is not null then
+    return v_id;
+  end if;
+
+  insert into public.containers (id, telefone_cliente, status)
+  values (p_new_id, p_telefone, 'ABERTO')
+  on conflict (telefone_cliente) where status = 'ABERTO' do nothing
+  returning id into v_id;
+
+  if v_id is null then
+    -- outro request criou o container entre o select e o insert
+    select c.id into v_id
+    from public.containers c
+    where c.telefone_cliente = p_telefone and c.status = 'ABERTO'
+    limit 1;
+  end if;
+  return v_id;
+end;
+$$;
+
+-- =========================
+-- RPC: Pedido de envio (uma transação: envio + container PENDENTE + novo ABERTO + PRÉ-VENDA movida)
+-- Idempotente: se já houver envio PENDENTE/EM_PREPARACAO do container, devolve ele.
+-- =========================
+create or replace function public.criar_pedido_envio(
+  p_container_id     text,
+  p_telefone         text,
+  p_nome             text,
+  p_itens_snapshot   jsonb,
+  p_new_container_id text
+) returns json language plpgsql as $$
+declare
+  v_envio public.envios;
+  v_new_id text;
+begin
+  -- serializa pedidos concorrentes do mesmo container
+  perform 1 from public.containers where id = p_container_id for update;
+  if not found then
+    raise exception 'Container não encontrado';
+  end if;
+
+  select * into v_envio
+  from public.envios
+  where container_id = p_container_id
+    and status_envio in ('PENDENTE','EM_PREPARACAO')
+  order by created_at desc
+  limit 1;
+  if found then
+    return row_to_json(v_envio);
+  end if;
+
+  insert into public.envios (container_id, telefone_cliente, nome_cliente, status_envio, itens_snapshot_json)
+  values (p_container_id, p_telefone, p_nome, 'PENDENTE', p_itens_snapshot)
+  returning * into v_envio;
+
+  update public.containers set status = 'PENDENTE', updated_at = now() where id = p_container_id;
+
+  insert into public.containers (id, telefone_cliente, status)
+  values (p_new_container_id, p_telefone, 'ABERTO')
+  on conflict (telefone_cliente) where status = 'ABERTO' do nothing
+  returning id into v_new_id;
+  if v_new_id is null then
+    select id into v_new_id from public.containers
+    where telefone_cliente = p_telefone and status = 'ABERTO'
+    limit 1;
+  end if;
+
+  update public.container_itens
+     set container_id = v_new_id
+   where container_id = p_container_id
+     and status_item = 'PRE-VENDA';
+
+  return row_to_json(v_envio);
+end;
+$$;
+
+-- =========================
+-- RPC: Movimentos em lote (importação CSV)
+-- p_rows: [{linha, tipo, telefone, jogo_id, preco, status_item, container_id}]
+-- Linhas inválidas voltam em "erros"; as válidas entram com 2 INSERTs set-based.
+-- =========================
+create or replace function public.add_movimentos_bulk(p_rows jsonb)
+returns jsonb language plpgsql as $$
+declare
+  v_ok    jsonb;
+  v_erros jsonb;
+begin
+  with src as (
+    select r.*
+    from jsonb_to_recordset(p_rows) as r(
+      linha int, tipo text, telefone text, jogo_id uuid,
+      preco numeric, status_item text, container_id text
+    )
+  ),
+  checado as (
+    select s.*,
+           case
+             when s.tipo not in ('COMPRA','LISTINHA') then 'tipo inválido'
+             when s.status_item not in ('RESERVADO','DISPONIVEL','PRE-VENDA') then 'status inválido'
+             when s.preco is null or s.preco < 0 then 'preço inválido'
+             when j.id is null then 'jogo não encontrado'
+             when c.id is null then 'container não encontrado para o telefone'
+           end as erro
+    from src s
+    left join public.jogos j on j.id = s.jogo_id
+    left join public.containers c on c.id = s.container_id and c.telefone_cliente = s.telefone
+  )
+  select
+    coalesce(jsonb_agg(jsonb_build_object(
+      'linha', linha, 'tipo', tipo, 'telefone', telefone, 'jogo_id', jogo_id, 'preco', preco,
+      'status_item', status_item, 'container_id', container_id,
+      'item_id', gen_random_uuid(), 'movimento_id', gen_random_uuid()
+    )) filter (where erro is null), '[]'::jsonb),
+    coalesce(jsonb_agg(jsonb_build_object('linha', linha, 'erro', erro)) filter (where erro is not null), '[]'::jsonb)
+  into v_ok, v_erros
+  from checado;
+
+  -- movimentos primeiro: container_itens.movimento_id referencia movimentos(id)
+  insert into public.movimentos (id, tipo, telefone_cliente, jogo_id, preco_aplicado_brl, container_id, container_item_id)
+  select r.movimento_id, r.tipo, r.telefone, r.jogo_id, r.preco, r.container_id, r.item_id
+  from jsonb_to_recordset(v_ok) as r(
+    movimento_id uuid, tipo text, telefone text, jogo_id uuid, preco numeric, container_id text, item_id uuid
+  );
+
+  insert into public.container_itens (id, container_id, jogo_id, origem, status_item, preco_aplicado_brl, movimento_id)
+  select r.item_id, r.container_id, r.jogo_id, r.tipo, r.status_item, r.preco, r.movimento_id
+  from jsonb_to_recordset(v_ok) as r(
+    item_id uuid, container_id text, jogo_id uuid, tipo text, status_item text, preco numeric, movimento_id uuid
+  );
+
+  return jsonb_build_object(
+    'inseridos', jsonb_array_length(v_ok),
+    'itens', (select coalesce(jsonb_agg(jsonb_build_object(
+                'linha', e->'linha', 'container_id', e->'container_id',
+                'item_id', e->'item_id', 'movimento_id', e->'movimento_id')), '[]'::jsonb)
+              from jsonb_array_elements(v_ok) e),
+    'erros', v_erros
+  );
+end;
+$$;
+
+-- =========================
+-- RPC: Débito de LudoCoins (atômico: trava o cliente, valida saldo, grava extrato)
+-- =========================
+create or replace function public.debit_ludocoins(
+  p_telefone   text,
+  p_valor      numeric,
+  p_atendente  text,
+  p_observacao text default null
+) returns json language plpgsql as $$
+declare
+  v_saldo numeric(12,2);
+  v_tx_id uuid;
+begin
+  if p_valor is null or p_valor <= 0 then
+    raise exception 'Informe um valor maior que zero.';
+  end if;
+
+  -- o UPDATE condicional trava a linha: débitos concorrentes esperam e revalidam o saldo
+  update public.clientes
+     set ludocoins_saldo = ludocoins_saldo - p_valor
+   where telefone = p_telefone
+     and ludocoins_saldo >= p_valor
+  returning ludocoins_saldo into v_saldo;
+
+  if not found then
+    if not exists (select 1 from public.clientes where telefone = p_telefone) then
+      raise exception 'Cliente não encontrado';
+    end if;
+    raise exception 'Saldo insuficiente para débito.';
+  end if;
+
+  insert into public.ludocoin_transacoes (telefone_cliente, tipo, valor, observacao)
+  values (p_telefone, 'DEBITO_UTILIZACAO', p_valor, p_observacao)
+  returning id into v_tx_id;
+
+  insert into public.auditoria (usuario, acao, detalhes)
+  values (p_atendente, 'DEBITO_LUDOCOINS', json_build_object('telefone', p_telefone, 'valor', p_valor, 'transacao_id', v_tx_id));
+
+  return json_build_object('ok', true, 'saldo', v_saldo, 'transacao_id', v_tx_id);
+end;
+$$;
+
+-- =========================
+-- RPC: Métricas do topo do dashboard (uma ida ao banco, contagens por índice)
+-- =========================
+create index if not exists ix_jogos_ativos on public.jogos(id) where ativo;
+
+create or replace function public.dashboard_metrics()
+returns json language sql stable as $$
+  select json_build_object(
+    'jogos_ativos',       (select count(*) from public.jogos where ativo),
+    'clientes',           (select count(*) from public.clientes),
+    -- usa o índice parcial ux_one_open_container_per_phone
+    'containers_abertos', (select count(*) from public.containers where status = 'ABERTO'),
+    'passivo_ludocoins',  (select coalesce(sum(ludocoins_saldo), 0) from public.clientes)
+  );
+$$;
+
+-- =========================
+-- RPC: busca de jogos (top-N por nome/SKU)
+-- SKU exato primeiro, depois maior similaridade trigram, depois nome.
+-- =========================
+create or replace function public.search_jogos(
+  p_termo text,
+  p_limit int default 20,
+  p_apenas_ativos boolean default false
+) returns setof public.jogos
+language sql stable as $$
+  with t as (
+    select coalesce(btrim(p_termo), '') as termo,
+           '%' || replace(replace(replace(coalesce(btrim(p_termo), ''), '\', '\\'), '%', '\%'), '_', '\_') || '%' as padrao
+  )
+  select j.*
+  from public.jogos j, t
+  where (not p_apenas_ativos or j.ativo)
+    and (t.termo = '' or j.nome ilike t.padrao or j.sku ilike t.padrao)
+  order by (t.termo <> '' and lower(j.sku) = lower(t.termo)) desc nulls last,
+           case when t.termo = '' then 0
+                else greatest(similarity(j.nome, t.termo), similarity(coalesce(j.sku, ''), t.termo)) end desc,
+           j.nome
+  limit least(greatest(coalesce(p_limit, 20), 1), 100);
+$$;
+
+-- =========================
+-- MÉTRICAS DIÁRIAS (rollup incremental para as tendências do dashboard)
+-- Dia em UTC. Triggers por statement (transition tables) somam os INSERTs,
+-- inclusive os lotes da importação CSV; rebuild_metrics_daily recalcula a
+-- partir das tabelas brutas (backfill inicial e conciliação periódica).
+-- =========================
+create table if not exists public.metrics_daily (
+  dia date primary key,
+  mov_compra int not null default 0,
+  mov_listinha int not null default 0,
+  containers_abertos int not null default 0,
+  lc_creditos numeric(14,2) not null default 0,
+  lc_debitos numeric(14,2) not null default 0,
+  lc_ajustes numeric(14,2) not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function public.trg_metrics_daily_movimentos()
+returns trigger language plpgsql as $$
+begin
+  insert into public.metrics_daily as m (dia, mov_compra, mov_listinha)
+  select (n.created_at at time zone 'UTC')::date,
+         count(*) filter (where n.tipo = 'COMPRA'),
+         count(*) filter (where n.tipo = 'LISTINHA')
+  from novos n
+  group by 1
+  on conflict (dia) do update
+     set mov_compra = m.mov_compra + excluded.mov_compra,
+         mov_listinha = m.mov_listinha + excluded.mov_listinha,
+         updated_at = now();
+  return null;
+end;
+$$;
+
+create or replace trigger tgi_metrics_daily_movimentos
+after insert on public.movimentos
+referencing new table as novos
+for each statement execute function public.trg_metrics_daily_movimentos();
+
+create or replace function public.trg_metrics_daily_containers()
+returns trigger language plpgsql as $$
+begin
+  insert into public.metrics_daily as m (dia, containers_abertos)
+  select (n.created_at at time zone 'UTC')::date, count(*)
+  from novos n
+  group by 1
+  on conflict (dia) do update
+     set containers_abertos = m.containers_abertos + excluded.containers_abertos,
+         updated_at = now();
+  return null;
+end;
+$$;
+
+create or replace trigger tgi_metrics_daily_containers
+after insert on public.containers
+referencing new table as novos
+for each statement execute function public.trg_metrics_daily_containers();
+
+create or replace function public.trg_metrics_daily_ludocoins()
+returns trigger language plpgsql as $$
+begin
+  insert into public.metrics_daily as m (dia, lc_creditos, lc_debitos, lc_ajustes)
+  select (n.created_at at time zone 'UTC')::date,
+         coalesce(sum(n.valor) filter (where n.tipo = 'CREDITO_CONVERSAO'), 0),
+         coalesce(sum(n.valor) filter (where n.tipo = 'DEBITO_UTILIZACAO'), 0),
+         coalesce(sum(n.valor) filter (where n.tipo = 'AJUSTE'), 0)
+  from novos n
+  group by 1
+  on conflict (dia) do update
+     set lc_creditos = m.lc_creditos + excluded.lc_creditos,
+         lc_debitos = m.lc_debitos + excluded.lc_debitos,
+         lc_ajustes = m.lc_ajustes + excluded.lc_ajustes,
+         updated_at = now();
+  return null;
+end;
+$$;
+
+create or replace trigger tgi_metrics_daily_ludocoins
+after insert on public.ludocoin_transacoes
+referencing new table as novos
+for each statement execute function public.trg_metrics_daily_ludocoins();
+
+-- Recalcula os dias (UTC) a partir de p_desde (null = histórico todo). Idempotente.
+-- O corte é 00:00 UTC de p_desde, como os baldes dos triggers, em qualquer time zone de sessão.
+create or replace function public.rebuild_metrics_daily(p_desde date default null)
+returns int language plpgsql as $$
+declare
+  v_dias int;
+begin
+  delete from public.metrics_daily where p_desde is null or dia >= p_desde;
+
+  insert into public.metrics_daily (dia, mov_compra, mov_listinha, containers_abertos, lc_creditos, lc_debitos, lc_ajustes)
+  select dia,
+         sum(mov_compra), sum(mov_listinha), sum(containers_abertos),
+         sum(lc_creditos), sum(lc_debitos), sum(lc_ajustes)
+  from (
+    select (created_at at time zone 'UTC')::date as dia,
+           count(*) filter (where tipo = 'COMPRA') as mov_compra,
+           count(*) filter (where tipo = 'LISTINHA') as mov_listinha,
+           0 as containers_abertos, 0 as lc_creditos, 0 as lc_debitos, 0 as lc_ajustes
+    from public.movimentos
+    where p_desde is null or created_at >= (p_desde::timestamp at time zone 'UTC')
+    group by 1
+    union all
+    select (created_at at time zone 'UTC')::date, 0, 0, count(*), 0, 0, 0
+    from public.containers
+    where p_desde is null or created_at >= (p_desde::timestamp at time zone 'UTC')
+    group by 1
+    union all
+    select (created_at at time zone 'UTC')::date, 0, 0, 0,
+           coalesce(sum(valor) filter (where tipo = 'CREDITO_CONVERSAO'), 0),
+           coalesce(sum(valor) filter (where tipo = 'DEBITO_UTILIZACAO'), 0),
+           coalesce(sum(valor) filter (where tipo = 'AJUSTE'), 0)
+    from public.ludocoin_transacoes
+    where p_desde is null or created_at >= (p_desde::timestamp at time zone 'UTC')
+    group by 1
+  ) t
+  group by dia;
+
+  get diagnostics v_dias = row_count;
+  return v_dias;
+end;
+$$;
+
+-- Backfill inicial (histórico existente antes das triggers)
+select public.rebuild_metrics_daily();
+
 -- =========================
 -- CONFIGURAÇÕES
 -- =========================
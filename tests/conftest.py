@@ -1,5 +1,6 @@
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -32,23 +33,101 @@ def message_spy(monkeypatch):
 def state_store(monkeypatch):
     store = {}
 
-    def fake_get_state(phone: str):
+    async def fake_get_state(phone: str):
         return store.get(phone)
 
-    def fake_set_state(phone: str, state: str, data=None):
+    async def fake_set_state(phone: str, state: str, data=None):
         store[phone] = {"state": state, "data": data or {}}
 
-    def fake_clear_state(phone: str):
+    async def fake_clear_state(phone: str):
         store.pop(phone, None)
 
-    monkeypatch.setattr(server, "get_state", fake_get_state)
-    monkeypatch.setattr(server, "set_state", fake_set_state)
-    monkeypatch.setattr(server, "clear_state", fake_clear_state)
+    monkeypatch.setattr(server, "get_state_async", fake_get_state)
+    monkeypatch.setattr(server, "set_state_async", fake_set_state)
+    monkeypatch.setattr(server, "clear_state_async", fake_clear_state)
     return store
 
 
+def returning(value):
+    """Fake assíncrono que devolve sempre o mesmo valor (substitui os *_async do server)."""
+    async def _fake(*args, **kwargs):
+        return value
+    return _fake
+
+
+class FakeQuery:
+    """
+    Cadeia do PostgREST (table/rpc → filtros → execute): cada chamada é
+    registrada em supa.calls como (alvo, método, args) e o execute responde
+    com supa.responses[alvo] — dado, exceção (levantada), função(query) ou um
+    SimpleNamespace pronto (ex.: data + count de select(count="exact")).
+    """
+    def __init__(self, supa, name, params=None):
+        self.supa, self.name, self.params = supa, name, params
+        self.methods = []
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.methods.append(method)
+            self.supa.calls.append((self.name, method, args))
+            return self
+        return call
+
+    def _result(self):
+        self.supa.calls.append((self.name, "execute", ()))
+        data = self.supa.responses.get(self.name)
+        if callable(data):
+            data = data(self)
+        if isinstance(data, Exception):
+            raise data
+        if isinstance(data, SimpleNamespace):
+            return data
+        return SimpleNamespace(data=data)
+
+    def execute(self):
+        if self.supa.is_async:
+            async def _execute():
+                return self._result()
+            return _execute()
+        return self._result()
+
+
+class FakeSupabase:
+    def __init__(self, responses=None, is_async=False):
+        self.responses = dict(responses or {})
+        self.is_async = is_async
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, "rpc", (params,)))
+        return FakeQuery(self, name, params)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def executed(self, name):
+        """Quantas vezes `name` (tabela ou RPC) chegou ao banco."""
+        return self.calls.count((name, "execute", ()))
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """
+    Instala um FakeSupabase como get_client (ou get_async_client, com
+    is_async=True) dos módulos informados; respostas por tabela/RPC em kwargs.
+    """
+    def install(*modules, is_async=False, **responses):
+        supa = FakeSupabase(responses, is_async=is_async)
+        attr = "get_async_client" if is_async else "get_client"
+        for module in modules:
+            monkeypatch.setattr(module, attr, lambda: supa)
+        return supa
+    return install
+
 
 @pytest.fixture
 def existing_client(monkeypatch):
-    monkeypatch.setattr(server, "supa_select_one", lambda *args, **kwargs: {"id": "cli-1"})
+    monkeypatch.setattr(server, "supa_select_one", returning({"id": "cli-1"}))
     return {"id": "cli-1"}
@@ -0,0 +1,31 @@
+import server
+from services.bot_router import Intents, classify
+from services.chat_state_service import StateNames
+
+
+def test_classify_menu_numbers_only_without_state():
+    assert classify("1", has_state=False)[0] == Intents.CONTAINER
+    assert classify("1", has_state=True)[0] == Intents.TEXTO
+    assert classify("6", has_state=True)[0] == Intents.COMPROVANTE
+    assert classify("Bom dia", has_state=True)[0] == Intents.MENU
+
+
+def test_classify_comprovante_with_id():
+    intent, match = classify("comprovante ABC-123", has_state=False)
+    assert intent == Intents.COMPROVANTE_ENVIO
+    assert match.group(1) == "ABC-123"
+
+
+def test_route_table_precedence():
+    r = server.router
+    # estado de troca captura respostas livres, mas não o menu nem CONTAINER
+    assert r.resolve(StateNames.TROCA_LISTANDO, Intents.TEXTO) is server.handle_troca_listando
+    assert r.resolve(StateNames.TROCA_LISTANDO, Intents.MENU) is server.handle_menu
+    assert r.resolve(StateNames.TROCA_CONFIRM, Intents.CONTAINER) is server.handle_container
+    # ENVIAR_CONFIRM deixa TROCAR passar, mas segura um novo ENVIAR
+    assert r.resolve(StateNames.ENVIAR_CONFIRM, Intents.TROCAR) is server.handle_trocar
+    assert r.resolve(StateNames.ENVIAR_CONFIRM, Intents.ENVIAR) is server.handle_enviar_confirm
+    # onboarding captura tudo, inclusive saudações
+    assert r.resolve(StateNames.ONBOARD_ASK_NAME, Intents.MENU) is server.handle_onboard_name
+    assert r.resolve(StateNames.COMPROVANTE_WAIT, Intents.CONTAINER) is server.handle_comprovante_wait
+    assert r.resolve(None, Intents.AJUDA) is server.handle_fallback
@@ -0,0 +1,27 @@
+from services import clientes_service
+
+
+def test_directory_filters_by_phone_prefix_or_name_and_pages_by_cursor(fake_supabase):
+    rows = [{"telefone": f"55850{i}", "nome": "Ana", "created_at": f"2024-01-0{i}"} for i in (3, 2, 1)]
+    supa = fake_supabase(clientes_service, clientes=rows)
+
+    page = clientes_service.list_clientes_page("(85) 550", limit=2)
+    assert ("clientes", "like", ("telefone", "85550*")) in supa.calls
+    assert [r["telefone"] for r in page["rows"]] == ["558503", "558502"]
+    assert page["next"] == {"created_at": "2024-01-02", "telefone": "558502"}
+
+    supa.calls.clear()
+    clientes_service.list_clientes_page("ana", after=page["next"], limit=2)
+    assert ("clientes", "ilike", ("nome", "*ana*")) in supa.calls
+    assert ("clientes", "or_", (
+        'created_at.lt."2024-01-02",and(created_at.eq."2024-01-02",telefone.lt."558502")',
+    )) in supa.calls
+
+
+def test_name_search_escapes_like_wildcards_and_postgrest_reserved(fake_supabase):
+    supa = fake_supabase(clientes_service, clientes=[])
+
+    clientes_service.search_clientes("100% ana_b")
+    clientes_service.search_clientes('silva, (jr) "x"*')
+    patterns = [args[1] for name, method, args in supa.calls if method == "ilike"]
+    assert patterns == ["*100\\% ana\\_b*", "*silva_ _jr_ _x__*"]
@@ -0,0 +1,34 @@
+from services import containers_service
+
+
+def test_open_container_resolved_in_one_rpc(fake_supabase, monkeypatch):
+    supa = fake_supabase(containers_service, get_or_create_open_container="5585-ABC123")
+    monkeypatch.setattr(containers_service, "_open_container_rpc", True)
+
+    assert containers_service.get_or_create_open_container("5585") == "5585-ABC123"
+    assert [c for c in supa.calls if c[1] == "execute"] == [("get_or_create_open_container", "execute", ())]
+
+
+def test_missing_rpc_falls_back_and_is_not_retried(fake_supabase, monkeypatch):
+    error = Exception("Could not find the function public.get_or_create_open_container")
+    supa = fake_supabase(containers_service, get_or_create_open_container=error, containers=[{"id": "5585-OLD"}])
+    monkeypatch.setattr(containers_service, "_open_container_rpc", True)
+
+    assert containers_service.get_or_create_open_container("5585") == "5585-OLD"
+    assert containers_service.get_or_create_open_container("5585") == "5585-OLD"
+    assert supa.executed("get_or_create_open_container") == 1
+
+
+def test_containers_page_fetches_one_extra_row_for_next_cursor(fake_supabase):
+    rows = [{"id": f"C{i}", "telefone_cliente": "5585", "status": "ABERTO",
+             "created_at": f"2024-01-0{i}", "updated_at": f"2024-02-0{i}"} for i in range(3, 0, -1)]
+    supa = fake_supabase(containers_service, containers=rows)
+
+    page = containers_service.list_containers_page("5585", "ABERTO", limit=2)
+    assert [r["id"] for r in page["rows"]] == ["C3", "C2"]
+    assert page["next"] == {"updated_at": "2024-02-02", "created_at": "2024-01-02", "id": "C2"}
+
+    containers_service.list_containers_page(after=page["next"], limit=2)
+    applied = [args[0] for name, method, args in supa.calls if method == "or_"]
+    assert applied and applied[0].startswith('updated_at.lt."2024-02-02"')
+
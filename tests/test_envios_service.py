@@ -0,0 +1,83 @@
+import pytest
+
+from services import envios_service
+
+
+def test_envios_list_projects_summary_and_loads_snapshot_on_demand(fake_supabase):
+    rows = [{"id": f"e{i}", "status_envio": "ENVIADO", "created_at": f"2024-01-0{i}"} for i in (3, 2, 1)]
+    supa = fake_supabase(envios_service, envios=rows)
+
+    page = envios_service.listar_envios("ENVIADO", limit=2)
+    assert ("envios", "select", (envios_service.ENVIO_SUMMARY_COLUMNS,)) in supa.calls
+    assert "itens_snapshot_json" not in envios_service.ENVIO_SUMMARY_COLUMNS
+    assert ("envios", "eq", ("status_envio", "ENVIADO")) in supa.calls
+    assert [r["id"] for r in page["rows"]] == ["e3", "e2"]
+    assert page["next"] == {"created_at": "2024-01-02", "id": "e2"}
+
+    supa.responses["envios"] = {"itens_snapshot_json": '[{"jogo": "Catan"}]'}
+    assert envios_service.get_envio_snapshot("e2") == [{"jogo": "Catan"}]
+
+
+ENVIO = {"id": "e1", "container_id": "C1", "status_envio": "PENDENTE"}
+MISSING = Exception("Could not find the function public.criar_pedido_envio")
+
+
+def _legacy_envios(query):
+    """Nenhum envio em aberto no select; o insert devolve o envio criado."""
+    return [] if "select" in query.methods else [ENVIO]
+
+
+def test_criar_pedido_envio_uses_rpc_row(fake_supabase):
+    supa = fake_supabase(envios_service, criar_pedido_envio=[ENVIO])
+
+    assert envios_service.criar_pedido_envio("C1", "5585", "Ana", [{"jogo": "Catan"}]) == ENVIO
+    params = supa.calls[0][2][0]
+    assert params["p_container_id"] == "C1" and params["p_new_container_id"].startswith("5585-")
+    assert not [c for c in supa.calls if c[0] != "criar_pedido_envio"]
+
+
+def test_criar_pedido_envio_falls_back_to_legacy_steps_without_rpc(fake_supabase):
+    supa = fake_supabase(envios_service, criar_pedido_envio=MISSING, envios=_legacy_envios,
+                         containers=None, container_itens=None)
+
+    assert envios_service.criar_pedido_envio("C1", "5585", "Ana", []) == ENVIO
+    novo = next(args[0] for name, method, args in supa.calls if (name, method) == ("containers", "insert"))
+    assert novo["id"].startswith("5585-") and novo["status"] == "ABERTO"
+    assert ("containers", "update", ({"status": "PENDENTE"},)) in supa.calls
+    assert ("container_itens", "update", ({"container_id": novo["id"]},)) in supa.calls
+    assert ("container_itens", "eq", ("status_item", "PRE-VENDA")) in supa.calls
+    assert supa.executed("containers") == 2 and supa.executed("container_itens") == 1
+
+
+def test_criar_pedido_envio_legacy_returns_open_envio_without_splitting(fake_supabase):
+    supa = fake_supabase(envios_service, criar_pedido_envio=MISSING, envios=[ENVIO])
+
+    assert envios_service.criar_pedido_envio("C1", "5585", "Ana", []) == ENVIO
+    assert supa.executed("envios") == 1 and supa.executed("containers") == 0
+
+
+def test_criar_pedido_envio_reraises_other_errors(fake_supabase):
+    supa = fake_supabase(envios_service, criar_pedido_envio=Exception("saldo de estoque"))
+
+    with pytest.raises(Exception, match="saldo de estoque"):
+        envios_service.criar_pedido_envio("C1", "5585", "Ana", [])
+    assert supa.executed("envios") == 0
+
+
+@pytest.mark.parametrize("data", [[], None, {}])
+def test_criar_pedido_envio_rejects_empty_rpc_result(fake_supabase, data):
+    fake_supabase(envios_service, criar_pedido_envio=data)
+
+    with pytest.raises(RuntimeError):
+        envios_service.criar_pedido_envio("C1", "5585", "Ana", [])
+
+
+@pytest.mark.asyncio
+async def test_criar_pedido_envio_async_matches_sync_paths(fake_supabase):
+    supa = fake_supabase(envios_service, is_async=True, criar_pedido_envio={**ENVIO})
+    assert await envios_service.criar_pedido_envio_async("C1", "5585", "Ana", []) == ENVIO
+
+    supa.responses.update(criar_pedido_envio=MISSING, envios=_legacy_envios,
+                          containers=Exception("timeout"), container_itens=None)
+    assert await envios_service.criar_pedido_envio_async("C1", "5585", "Ana", []) == ENVIO
+    assert supa.executed("containers") == 2 and supa.executed("container_itens") == 1
@@ -0,0 +1,17 @@
+from services import jogos_service
+
+
+def test_search_falls_back_to_bounded_ilike_query(fake_supabase, monkeypatch):
+    catan = [{"id": "j1", "nome": "Catan", "sku": "CAT-01"}]
+    supa = fake_supabase(jogos_service, jogos=catan,
+                         search_jogos=Exception("Could not find the function public.search_jogos"))
+    monkeypatch.setattr(jogos_service, "_search_rpc", True)
+
+    assert jogos_service.search_jogos(' ca"t ', limit=5) == catan
+    assert jogos_service.search_jogos("ca", limit=5)
+
+    assert [c for c in supa.calls if c[1] == "rpc"] == [
+        ("search_jogos", "rpc", ({"p_termo": 'ca"t', "p_limit": 5, "p_apenas_ativos": False},))
+    ]
+    assert ("jogos", "or_", ('nome.ilike."*ca\\"t*",sku.ilike."*ca\\"t*"',)) in supa.calls
+    assert ("jogos", "limit", (5,)) in supa.calls
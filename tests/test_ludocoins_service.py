@@ -0,0 +1,125 @@
+import pytest
+
+from services import ludocoins_service
+
+MISSING = Exception("Could not find the function public.convert_items_to_ludocoins")
+
+
+class PostgrestError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(message)
+        self.code = code
+
+
+def _convert_one(query):
+    """RPC item a item: it-2 já foi resgatado."""
+    if query.params["p_item_id"] == "it-2":
+        return Exception("item já resgatado")
+    return {"ok": True, "valor": 12.5}
+
+
+def _donos(*ids, outro=()):
+    """container_itens com o telefone do container: `outro` pertence a outro cliente."""
+    return [{"id": i, "containers": {"telefone_cliente": "5599" if i in outro else "5585"}} for i in ids]
+
+
+def test_convert_items_single_rpc(fake_supabase):
+    result = {"ok": True, "itens": [{"item_id": "it-1", "ok": True, "valor": 12.5}], "total": 12.5, "saldo": 40}
+    supa = fake_supabase(ludocoins_service, convert_items_to_ludocoins=[result])
+
+    assert ludocoins_service.convert_items(["it-1"], "atendente@ludolovers", "5585") == result
+    assert supa.calls[0][2][0] == {"p_item_ids": ["it-1"], "p_atendente": "atendente@ludolovers", "p_telefone": "5585"}
+    assert supa.executed("convert_item_to_ludocoins") == 0
+
+
+def test_convert_items_falls_back_item_by_item_without_rpc(fake_supabase):
+    supa = fake_supabase(ludocoins_service, convert_items_to_ludocoins=MISSING,
+                         convert_item_to_ludocoins=_convert_one, clientes={"ludocoins_saldo": "37.5"},
+                         container_itens=_donos("it-1", "it-2", "it-3"))
+
+    result = ludocoins_service.convert_items(["it-1", "it-2", "it-3"], "atendente@ludolovers", "5585")
+    assert result["total"] == 25.0 and result["saldo"] == 37.5
+    assert [i["ok"] for i in result["itens"]] == [True, False, True]
+    assert result["itens"][1]["erro"] == "item já resgatado"
+    assert supa.executed("convert_item_to_ludocoins") == 3
+    assert ("container_itens", "in_", ("id", ["it-1", "it-2", "it-3"])) in supa.calls
+
+
+def test_convert_items_fallback_skips_items_of_another_customer(fake_supabase):
+    supa = fake_supabase(ludocoins_service, convert_items_to_ludocoins=MISSING,
+                         convert_item_to_ludocoins=_convert_one, clientes={"ludocoins_saldo": 0},
+                         container_itens=_donos("it-1", "it-3", outro=("it-3",)))
+
+    result = ludocoins_service.convert_items(["it-1", "it-3", "it-9"], "whatsapp-bot", "5585")
+    assert result["itens"][1:] == [
+        {"item_id": "it-3", "ok": False, "erro": "Item não pertence ao cliente"},
+        {"item_id": "it-9", "ok": False, "erro": "Item não pertence ao cliente"},
+    ]
+    assert [args[0]["p_item_id"] for name, method, args in supa.calls
+            if name == "convert_item_to_ludocoins" and method == "rpc"] == ["it-1"]
+
+    # sem telefone (página de containers) não há restrição de dono
+    supa.calls.clear()
+    assert [i["ok"] for i in ludocoins_service.convert_items(["it-3"], "atendente")["itens"]] == [True]
+    assert supa.executed("container_itens") == 0
+
+
+def test_convert_items_reraises_other_rpc_errors(fake_supabase):
+    supa = fake_supabase(ludocoins_service, convert_items_to_ludocoins=Exception("permission denied"))
+
+    with pytest.raises(Exception, match="permission denied"):
+        ludocoins_service.convert_items(["it-1"], "atendente@ludolovers")
+    assert supa.executed("convert_item_to_ludocoins") == 0
+
+
+@pytest.mark.asyncio
+async def test_convert_items_async_falls_back_without_rpc(fake_supabase):
+    fake_supabase(ludocoins_service, is_async=True, convert_items_to_ludocoins=PostgrestError("PGRST202"),
+                  convert_item_to_ludocoins=_convert_one, clientes={"ludocoins_saldo": 10},
+                  container_itens=_donos("it-1", "it-2", "it-3", outro=("it-3",)))
+
+    result = await ludocoins_service.convert_items_async(["it-1", "it-2", "it-3"], "bot", "5585")
+    assert result["ok"] and result["total"] == 12.5 and result["saldo"] == 10.0
+    assert [i["ok"] for i in result["itens"]] == [True, False, False]
+    assert result["itens"][2]["erro"] == "Item não pertence ao cliente"
+
+
+def test_debit_sends_positive_amount_and_unwraps_rpc_row(fake_supabase):
+    supa = fake_supabase(ludocoins_service, debit_ludocoins=[{"ok": True, "saldo": 7.5, "transacao_id": "tx-1"}])
+
+    assert ludocoins_service.debit_ludocoins("5585", "12.5", "atendente@ludolovers", "") == {
+        "ok": True, "saldo": 7.5, "transacao_id": "tx-1",
+    }
+    assert supa.calls[0] == ("debit_ludocoins", "rpc", ({
+        "p_telefone": "5585", "p_valor": 12.5, "p_atendente": "atendente@ludolovers", "p_observacao": None,
+    },))
+
+
+@pytest.mark.parametrize("valor", [0, -5])
+def test_debit_rejects_non_positive_amount_before_rpc(fake_supabase, valor):
+    supa = fake_supabase(ludocoins_service, debit_ludocoins={"ok": True})
+
+    with pytest.raises(ValueError):
+        ludocoins_service.debit_ludocoins("5585", valor, "atendente@ludolovers")
+    assert supa.calls == []
+
+
+@pytest.mark.parametrize("error", [
+    Exception("Saldo insuficiente para débito."),
+    PostgrestError("PGRST202", "Could not find the function public.debit_ludocoins"),
+])
+def test_debit_surfaces_rpc_errors_without_legacy_fallback(fake_supabase, error):
+    # sem a RPC não há débito não atômico: o erro chega à página
+    supa = fake_supabase(ludocoins_service, debit_ludocoins=error)
+
+    with pytest.raises(Exception) as exc:
+        ludocoins_service.debit_ludocoins("5585", 50, "atendente@ludolovers")
+    assert exc.value is error
+    assert supa.executed("clientes") == 0 and supa.executed("ludocoin_transacoes") == 0
+
+
+@pytest.mark.asyncio
+async def test_debit_async_matches_sync(fake_supabase):
+    fake_supabase(ludocoins_service, is_async=True, debit_ludocoins=Exception("Saldo insuficiente para débito."))
+    with pytest.raises(Exception, match="Saldo insuficiente"):
+        await ludocoins_service.debit_ludocoins_async("5585", 50, "bot")
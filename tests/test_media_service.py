@@ -0,0 +1,78 @@
+import base64
+import json
+
+import httpx
+import pytest
+
+from services import whatsapp_service
+from services.media_service import MediaRef, SpooledBody, parse_json_body
+
+
+def spool(payload: dict, max_memory: int = 1024) -> SpooledBody:
+    body = SpooledBody(max_memory=max_memory)
+    body.write(json.dumps(payload).encode())
+    return body
+
+
+def test_large_string_stays_in_spool_file():
+    b64 = base64.b64encode(b"%PDF-1.4 " + b"x" * 300_000).decode()
+    body = spool({"event": "onmessage", "data": {"message": {"caption": "COMPROVANTE T1", "file": {"data": b64}}}})
+
+    payload = parse_json_body(body, inline_max=1024)
+
+    ref = payload["data"]["message"]["file"]["data"]
+    assert isinstance(ref, MediaRef)
+    assert body.on_disk
+    assert ref.head(7) == "JVBERi0"
+    assert b"".join(ref.iter_json_chunks(chunk_size=7000)).decode() == b64
+    assert payload["data"]["message"]["caption"] == "COMPROVANTE T1"
+
+
+def test_escapes_across_chunk_boundaries_are_preserved():
+    small = 'a\\"b/' * 10
+    big = "/9j/" + "\\/" * 50_000
+    body = SpooledBody(max_memory=64)
+    body.write(json.dumps({"text": small, "body": big}).replace("/", "\\/").encode())
+
+    payload = parse_json_body(body, inline_max=100)
+
+    assert payload["text"] == small
+    ref = payload["body"]
+    assert ref.head(4) == "/9j/"
+    assert json.loads(b'"' + b"".join(ref.iter_json_chunks()) + b'"') == big
+
+
+def test_client_text_cannot_forge_media_placeholder():
+    b64 = base64.b64encode(b"z" * 5_000).decode()
+    forjados = ["\x00MEDIA:0", "\x00MEDIA:99", "\x00MEDIA:abc"]
+    body = spool({"body": b64, "text": forjados})
+
+    payload = parse_json_body(body, inline_max=1024)
+
+    assert isinstance(payload["body"], MediaRef)
+    assert payload["text"] == forjados
+
+
+@pytest.mark.asyncio
+async def test_send_file_streams_body_and_retries_5xx(monkeypatch):
+    b64 = base64.b64encode(b"\x89PNG" + b"y" * 200_000).decode()
+    ref = parse_json_body(spool({"body": b64}), inline_max=1024)["body"]
+    calls = []
+
+    def handler(request: httpx.Request):
+        raw = request.read()
+        calls.append(raw)
+        assert int(request.headers["Content-Length"]) == len(raw)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    monkeypatch.setattr(whatsapp_service, "WA_FILE_BACKOFF", 0)
+    monkeypatch.setattr(whatsapp_service, "_http", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    assert await whatsapp_service.send_file_async("5585", ref, "comprovante", "legenda") == {"ok": True}
+
+    assert len(calls) == 2
+    out = json.loads(calls[1])
+    assert out["base64"] == "data:image/png;base64," + b64
+    assert out["phone"] == "5585" and out["caption"] == "legenda"
@@ -0,0 +1,35 @@
+from services import movimentos_service
+
+JOGO_ID = "6f1c2a4e-8b7d-4c3e-9a1f-0d2b3c4d5e6f"
+
+
+def _insert_bulk(query):
+    rows = query.params["p_rows"]
+    return {"inseridos": len(rows), "itens": [{"linha": r["linha"]} for r in rows], "erros": []}
+
+
+def test_bulk_import_batches_rows_and_reports_errors(fake_supabase, monkeypatch):
+    resolved = []
+    supa = fake_supabase(movimentos_service, jogos=[{"id": JOGO_ID, "sku": "CATAN"}],
+                         add_movimentos_bulk=_insert_bulk)
+    monkeypatch.setattr(movimentos_service, "get_or_create_open_container",
+                        lambda tel: resolved.append(tel) or f"{tel}-OPEN")
+
+    rows = [
+        {"tipo": "listinha", "telefone": "(85) 9999-0000", "jogo": "CATAN", "preco": "120,50"},
+        {"tipo": "COMPRA", "telefone": "8599990000", "jogo": JOGO_ID, "preco": "80", "status_item": "PRE-VENDA"},
+        {"tipo": "TROCA", "telefone": "8599990000", "jogo": "CATAN", "preco": "10"},
+        {"tipo": "COMPRA", "telefone": "8511112222", "jogo": "NAO-EXISTE", "preco": "10"},
+    ]
+    lotes = list(movimentos_service.add_items_bulk(rows, batch_size=3))
+
+    assert [lote["linhas"] for lote in lotes] == [3, 1]
+    assert sum(lote["inseridos"] for lote in lotes) == 2
+    erros = [e for lote in lotes for e in lote["erros"]]
+    assert [e["linha"] for e in erros] == [3, 4]
+    rpcs = [args[0] for name, method, args in supa.calls if method == "rpc"]
+    assert len(rpcs) == 1
+    sent = rpcs[0]["p_rows"]
+    assert sent[0]["jogo_id"] == JOGO_ID and sent[0]["preco"] == 120.5
+    assert sent[0]["container_id"] == "8599990000-OPEN"
+    assert resolved == ["8599990000"]
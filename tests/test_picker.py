@@ -0,0 +1,47 @@
+from streamlit.testing.v1 import AppTest
+
+
+def _app():
+    import streamlit as st
+    from services.picker import Picker
+
+    calls = st.session_state.setdefault("calls", [])
+
+    def busca(termo):
+        calls.append(termo)
+        return [{"telefone": f"5585{i:04d}", "nome": f"Cliente {i}"} for i in range(2000)]
+
+    picker = Picker("cli", lambda c: c["telefone"], lambda c: f"{c['nome']} — {c['telefone']}", search=busca)
+    picker.search_input("Buscar")
+    sel = picker.selectbox("Cliente")
+    st.write(sel["nome"] if sel else "nenhum")
+
+
+def test_picker_reuses_search_across_reruns_and_resolves_selection():
+    at = AppTest.from_function(_app).run()
+    assert at.markdown[0].value == "nenhum"
+
+    at.selectbox(key="cli").set_value("55851999").run()
+    assert at.markdown[0].value == "Cliente 1999"
+    assert at.session_state["calls"] == [""]
+
+    at.text_input(key="cli_busca").set_value("maria").run()
+    assert at.session_state["calls"] == ["", "maria"]
+
+
+def _app_placeholder():
+    import streamlit as st
+    from services.picker import Picker
+
+    picker = Picker("jogo", lambda j: j["id"], lambda j: j["nome"])
+    sel = picker.selectbox("Jogo", rows=[{"id": "j1", "nome": "Catan"}], placeholder="(todos)")
+    st.write(sel["nome"] if sel else "nenhum")
+
+
+def test_picker_uses_custom_placeholder():
+    at = AppTest.from_function(_app_placeholder).run()
+    assert at.selectbox(key="jogo").options == ["(todos)", "Catan"]
+    assert at.markdown[0].value == "nenhum"
+
+    at.selectbox(key="jogo").set_value("j1").run()
+    assert at.markdown[0].value == "Catan"
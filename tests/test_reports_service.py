@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+from services import reports_service
+
+ITENS = [
+    {"status_item": "DISPONIVEL", "preco_aplicado_brl": 120.5},
+    {"status_item": "DISPONIVEL", "preco_aplicado_brl": 80.0},
+    {"status_item": "PRE-VENDA", "preco_aplicado_brl": 45.0},
+]
+CONTAINERS = [
+    {"status": "ABERTO", "created_at": "2024-01-01T10:00:00+00:00"},
+    {"status": "ABERTO", "created_at": "2024-01-02T10:00:00+00:00"},
+    {"status": "ENVIADO", "created_at": "2024-01-03T10:00:00+00:00"},
+]
+SEM_VIEW = Exception('relation "public.v_inventario_por_status" does not exist')
+
+
+def test_inventario_view_matches_legacy_aggregation(fake_supabase):
+    # o que a view devolve para ITENS (bigint/numeric chegam como número ou texto)
+    supa = fake_supabase(reports_service, container_itens=ITENS, v_inventario_por_status=[
+        {"status_item": "DISPONIVEL", "quantidade": 2, "valor_total": "200.50"},
+        {"status_item": "PRE-VENDA", "quantidade": "1", "valor_total": 45},
+    ])
+    via_view = reports_service.inventario_por_status()
+    assert supa.executed("container_itens") == 0
+
+    supa.responses["v_inventario_por_status"] = SEM_VIEW
+    legacy = reports_service.inventario_por_status()
+    assert supa.executed("container_itens") == 1
+
+    pd.testing.assert_frame_equal(via_view, legacy)
+
+
+def test_containers_view_matches_legacy_aggregation(fake_supabase):
+    supa = fake_supabase(reports_service, containers=CONTAINERS, v_containers_por_status=[
+        {"status": "ABERTO", "quantidade": 2}, {"status": "ENVIADO", "quantidade": 1},
+    ])
+    via_view = reports_service.containers_por_status()
+
+    supa.responses["v_containers_por_status"] = SEM_VIEW
+    legacy = reports_service.containers_por_status()
+
+    pd.testing.assert_frame_equal(via_view, legacy)
+
+
+def test_empty_view_keeps_report_columns(fake_supabase):
+    fake_supabase(reports_service, v_inventario_por_status=[], v_containers_por_status=[])
+
+    assert list(reports_service.inventario_por_status().columns) == ["status_item", "quantidade", "valor_total"]
+    assert list(reports_service.containers_por_status().columns) == ["status", "quantidade"]
+
+
+def _counted(query):
+    """select(count="exact"): total da tabela, ou só os filtrados quando há .eq()."""
+    total, filtrados = {"jogos": (99, 7), "clientes": (12, 12), "containers": (8, 3)}[query.name]
+    return SimpleNamespace(data=[], count=filtrados if "eq" in query.methods else total)
+
+
+def test_dashboard_metrics_rpc_matches_count_fallback(fake_supabase):
+    supa = fake_supabase(reports_service, jogos=_counted, clientes=_counted, containers=_counted,
+                         v_passivo_ludocoins=[{"total_ludocoins": "250.75"}],
+                         dashboard_metrics=[{"jogos_ativos": 7, "clientes": "12",
+                                             "containers_abertos": 3, "passivo_ludocoins": "250.75"}])
+    via_rpc = reports_service.dashboard_metrics()
+    assert supa.executed("jogos") == 0
+
+    supa.responses["dashboard_metrics"] = Exception("Could not find the function public.dashboard_metrics")
+    fallback = reports_service.dashboard_metrics()
+
+    assert via_rpc == fallback == {"jogos_ativos": 7, "clientes": 12, "containers_abertos": 3,
+                                   "passivo_ludocoins": 250.75}
+    assert ("jogos", "eq", ("ativo", True)) in supa.calls
+    assert ("containers", "eq", ("status", "ABERTO")) in supa.calls
+    assert ("clientes", "select", ("*",)) in supa.calls
+    assert [c for c in supa.calls if c[1] == "limit"] == [(t, "limit", (1,)) for t in ("jogos", "clientes", "containers")]
+
+
+def test_dashboard_metrics_empty_rpc_result_uses_counts(fake_supabase):
+    fake_supabase(reports_service, dashboard_metrics=[], v_passivo_ludocoins=[],
+                  jogos=SimpleNamespace(data=[], count=None), clientes=SimpleNamespace(data=[], count=4),
+                  containers=SimpleNamespace(data=[], count=0))
+
+    assert reports_service.dashboard_metrics() == {"jogos_ativos": 0, "clientes": 4, "containers_abertos": 0,
+                                                   "passivo_ludocoins": 0.0}
+
+
+def _rollup_and_raw(dias):
+    """Mesmo movimento visto pelo rollup metrics_daily e pelas tabelas brutas (dia do meio sem nada)."""
+    d0, d2 = dias[0].strftime("%Y-%m-%d"), dias[2].strftime("%Y-%m-%d")
+    rollup = [
+        {"dia": d0, "mov_compra": 2, "mov_listinha": 0, "containers_abertos": 1,
+         "lc_creditos": "30.00", "lc_debitos": 0, "lc_ajustes": 0},
+        {"dia": d2, "mov_compra": 0, "mov_listinha": 1, "containers_abertos": 0,
+         "lc_creditos": 0, "lc_debitos": "12.50", "lc_ajustes": "-5.00"},
+    ]
+    raw = {
+        "movimentos": [{"tipo": "COMPRA", "created_at": f"{d0}T09:00:00+00:00"},
+                       {"tipo": "COMPRA", "created_at": f"{d0}T23:59:00+00:00"},
+                       {"tipo": "LISTINHA", "created_at": f"{d2}T00:01:00+00:00"}],
+        "containers": [{"created_at": f"{d0}T12:00:00+00:00"}],
+        "ludocoin_transacoes": [{"tipo": "CREDITO_CONVERSAO", "valor": "30.00", "created_at": f"{d0}T10:00:00+00:00"},
+                                {"tipo": "DEBITO_UTILIZACAO", "valor": 12.5, "created_at": f"{d2}T10:00:00+00:00"},
+                                {"tipo": "AJUSTE", "valor": "-5", "created_at": f"{d2}T11:00:00+00:00"}],
+    }
+    return rollup, raw
+
+
+def test_metrics_daily_fills_missing_days_with_zero_and_matches_legacy(fake_supabase):
+    dias = reports_service._dias(3)
+    rollup, raw = _rollup_and_raw(dias)
+    supa = fake_supabase(reports_service, metrics_daily=rollup, **raw)
+
+    df = reports_service.metrics_daily(3)
+    assert list(df.index) == list(dias)
+    assert (df.loc[dias[1]] == 0).all()
+    assert df.loc[dias[0], "mov_compra"] == 2 and df.loc[dias[2], "lc_ajustes"] == -5.0
+    assert ("metrics_daily", "gte", ("dia", dias[0].strftime("%Y-%m-%d"))) in supa.calls
+    assert supa.executed("movimentos") == 0
+
+    supa.responses["metrics_daily"] = Exception('relation "public.metrics_daily" does not exist')
+    legacy = reports_service.metrics_daily(3)
+    pd.testing.assert_frame_equal(df, legacy, check_dtype=False, check_names=False)
+
+
+def test_metrics_daily_without_activity_is_all_zero(fake_supabase):
+    fake_supabase(reports_service, metrics_daily=[])
+
+    df = reports_service.metrics_daily(7)
+    assert df.shape == (7, len(reports_service.METRICS_DAILY_COLS))
+    assert (df == 0).all().all()
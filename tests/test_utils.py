@@ -0,0 +1,22 @@
+import pandas as pd
+
+from services import schemas
+from services.utils import column_config, load_frame
+
+
+def test_load_frame_types_columns_and_keeps_timestamps():
+    rows = [
+        {"telefone": "5585", "nome": "Ana", "ludocoins_saldo": "12.50", "opt_in_whatsapp": True,
+         "created_at": "2024-05-01T12:00:00.123456+00:00"},
+        {"telefone": "5586", "nome": None, "ludocoins_saldo": 3, "opt_in_whatsapp": False,
+         "created_at": "2024-05-02T12:00:00+00:00"},
+    ]
+    df = load_frame(rows, schemas.CLIENTES)
+
+    assert list(df.columns) == ["telefone", "nome", "ludocoins_saldo", "opt_in_whatsapp", "created_at"]
+    assert df["telefone"].dtype == pd.StringDtype("pyarrow")
+    assert df["ludocoins_saldo"].tolist() == [12.5, 3.0]
+    assert str(df["created_at"].dt.tz) == "America/Fortaleza"
+    assert df["created_at"].iloc[0].hour == 9
+    assert list(column_config(df)) == ["created_at"]
+    assert load_frame([], schemas.CLIENTES).empty
@@ -1,4 +1,5 @@
 import server
+from conftest import returning
 
 PHONE = "5511999999999"
 
@@ -8,7 +9,7 @@ def make_payload(text: str, phone: str = PHONE):
 
 
 def test_onboarding_first_contact(client, message_spy, state_store, monkeypatch):
-    monkeypatch.setattr(server, "supa_select_one", lambda *args, **kwargs: None)
+    monkeypatch.setattr(server, "supa_select_one", returning(None))
 
     response = client.post("/webhook", json=make_payload("Oi"))
     assert response.status_code == 200
@@ -18,8 +19,8 @@ def test_onboarding_first_contact(client, message_spy, state_store, monkeypatch)
 
 def test_onboarding_name_success(client, message_spy, state_store, monkeypatch):
     state_store[PHONE] = {"state": server.StateNames.ONBOARD_ASK_NAME, "data": {}}
-    monkeypatch.setattr(server, "supa_select_one", lambda *args, **kwargs: None)
-    monkeypatch.setattr(server, "safe_get_client", lambda: None)
+    monkeypatch.setattr(server, "supa_select_one", returning(None))
+    monkeypatch.setattr(server, "safe_get_async_client", lambda: None)
 
     response = client.post("/webhook", json=make_payload("João da Silva"))
     assert response.status_code == 200
@@ -34,14 +35,14 @@ def test_menu_shortcut(client, message_spy, state_store, existing_client):
 
 
 def test_container_flow_success(client, message_spy, state_store, existing_client, monkeypatch):
-    monkeypatch.setattr(server, "get_or_create_open_container", lambda phone: "cont-1")
+    monkeypatch.setattr(server, "get_or_create_open_container_async", returning("cont-1"))
     monkeypatch.setattr(
         server,
-        "list_container_items",
-        lambda container_id: [
+        "list_container_items_async",
+        returning([
             {"origem": "RIFA", "status_item": "DISPONIVEL", "jogos": {"nome": "Azul"}},
             {"origem": "COMPRA", "status_item": "PRE-VENDA", "jogos": {"nome": "Vermelho"}},
-        ],
+        ]),
     )
 
     response = client.post("/webhook", json=make_payload("1"))
@@ -50,7 +51,7 @@ def test_container_flow_success(client, message_spy, state_store, existing_clien
 
 
 def test_container_flow_without_container(client, message_spy, state_store, existing_client, monkeypatch):
-    monkeypatch.setattr(server, "get_or_create_open_container", lambda phone: None)
+    monkeypatch.setattr(server, "get_or_create_open_container_async", returning(None))
 
     response = client.post("/webhook", json=make_payload("CONTAINER"))
     assert response.status_code == 200
@@ -58,14 +59,14 @@ def test_container_flow_without_container(client, message_spy, state_store, exis
 
 
 def test_ludocoins_flow(client, message_spy, state_store, existing_client, monkeypatch):
-    monkeypatch.setattr(server, "get_saldo", lambda phone: 123.45)
+    monkeypatch.setattr(server, "get_saldo_async", returning(123.45))
     monkeypatch.setattr(
         server,
-        "list_ultimas_transacoes",
-        lambda phone, limit=5: [
+        "list_ultimas_transacoes_async",
+        returning([
             {"tipo": "CRÉDITO", "valor": 50, "created_at": "2024-06-01"},
             {"tipo": "DÉBITO", "valor": -10, "created_at": "2024-06-02"},
-        ],
+        ]),
     )
 
     response = client.post("/webhook", json=make_payload("2"))
@@ -76,11 +77,11 @@ def test_ludocoins_flow(client, message_spy, state_store, existing_client, monke
 
 
 def test_troca_listagem(client, message_spy, state_store, existing_client, monkeypatch):
-    monkeypatch.setattr(server, "get_or_create_open_container", lambda phone: "cont-1")
+    monkeypatch.setattr(server, "get_or_create_open_container_async", returning("cont-1"))
     monkeypatch.setattr(
         server,
-        "list_container_items",
-        lambda container_id: [
+        "list_container_items_async",
+        returning([
             {
                 "id": "item-1",
                 "origem": "RIFA",
@@ -88,7 +89,7 @@ def test_troca_listagem(client, message_spy, state_store, existing_client, monke
                 "preco_aplicado_brl": 100,
                 "jogos": {"nome": "Jogo 1"},
             }
-        ],
+        ]),
     )
 
     response = client.post("/webhook", json=make_payload("3"))
@@ -100,8 +101,9 @@ def test_troca_listagem(client, message_spy, state_store, existing_client, monke
 def test_troca_confirmacao_sim(client, message_spy, state_store, existing_client, monkeypatch):
     chosen = {"id": "item-1", "nome": "Jogo 1", "credito": 42.5}
     state_store[PHONE] = {"state": server.StateNames.TROCA_CONFIRM, "data": {"escolhidos": [chosen]}}
-    monkeypatch.setattr(server, "convert_item", lambda item_id, atendente_email: {"ok": True})
-    monkeypatch.setattr(server, "get_saldo", lambda phone: 142.5)
+    monkeypatch.setattr(server, "convert_items_async", returning({
+        "ok": True, "itens": [{"item_id": "item-1", "ok": True, "valor": 42.5}], "total": 42.5, "saldo": 142.5,
+    }))
 
     response = client.post("/webhook", json=make_payload("S"))
     assert response.status_code == 200
@@ -121,13 +123,13 @@ def test_troca_cancelamento(client, message_spy, state_store, existing_client):
 
 
 def test_enviar_pedido_inicial(client, message_spy, state_store, existing_client, monkeypatch):
-    monkeypatch.setattr(server, "get_or_create_open_container", lambda phone: "cont-9")
+    monkeypatch.setattr(server, "get_or_create_open_container_async", returning("cont-9"))
     monkeypatch.setattr(
         server,
-        "list_container_items",
-        lambda container_id: [
+        "list_container_items_async",
+        returning([
             {"origem": "RIFA", "status_item": "DISPONIVEL", "jogos": {"nome": "Jogo 2"}}
-        ],
+        ]),
     )
 
     response = client.post("/webhook", json=make_payload("4"))
@@ -138,13 +140,13 @@ def test_enviar_pedido_inicial(client, message_spy, state_store, existing_client
 
 def test_enviar_confirmacao_sucesso(client, message_spy, state_store, existing_client, monkeypatch):
     state_store[PHONE] = {"state": server.StateNames.ENVIAR_CONFIRM, "data": {}}
-    monkeypatch.setattr(server, "safe_get_client", lambda: None)
-    monkeypatch.setattr(server, "get_or_create_open_container", lambda phone: "cont-9")
-    monkeypatch.setattr(server, "list_container_items", lambda container_id: [])
+    monkeypatch.setattr(server, "safe_get_async_client", lambda: None)
+    monkeypatch.setattr(server, "get_or_create_open_container_async", returning("cont-9"))
+    monkeypatch.setattr(server, "list_container_items_async", returning([]))
     monkeypatch.setattr(
         server,
-        "criar_pedido_envio",
-        lambda container_id, telefone, nome, snapshot: {"id": "env-1", "status_envio": "PENDENTE"},
+        "criar_pedido_envio_async",
+        returning({"id": "env-1", "status_envio": "PENDENTE"}),
     )
 
     response = client.post("/webhook", json=make_payload("Sim"))
@@ -157,3 +159,95 @@ def test_fallback_message(client, message_spy, state_store, existing_client):
     response = client.post("/webhook", json=make_payload("qualquer coisa"))
     assert response.status_code == 200
     assert "Não entendi" in message_spy[-1]["text"]
+
+
+def test_chat_state_read_once_and_written_once(client, message_spy, existing_client, monkeypatch):
+    calls = {"get": 0, "set": []}
+    state = {"state": server.StateNames.TROCA_LISTANDO, "data": {"elegiveis": [{"id": "item-1", "nome": "Jogo 1", "credito": 10.0}]}}
+
+    async def fake_get_state(phone):
+        calls["get"] += 1
+        return state
+
+    async def fake_set_state(phone, name, data=None):
+        calls["set"].append(name)
+
+    monkeypatch.setattr(server, "get_state_async", fake_get_state)
+    monkeypatch.setattr(server, "set_state_async", fake_set_state)
+
+    response = client.post("/webhook", json=make_payload("1"))
+    assert response.status_code == 200
+    assert calls["get"] == 1
+    assert calls["set"] == [server.StateNames.TROCA_CONFIRM]
+    assert "Confirma a conversão?" in message_spy[-1]["text"]
+
+
+
+def test_chat_state_persisted_before_reply_is_sent(client, state_store, existing_client, monkeypatch):
+    state_store[PHONE] = {"state": server.StateNames.TROCA_LISTANDO,
+                          "data": {"elegiveis": [{"id": "item-1", "nome": "Jogo 1", "credito": 10.0}]}}
+    seen_at_send = []
+
+    async def fake_send_message(to, text):
+        seen_at_send.append(state_store[PHONE]["state"])
+        return {"ok": True}
+
+    monkeypatch.setattr(server, "send_message", fake_send_message)
+
+    client.post("/webhook", json=make_payload("1"))
+    assert seen_at_send == [server.StateNames.TROCA_CONFIRM]
+
+
+def test_chat_state_not_flushed_when_handler_fails(client, state_store, existing_client, monkeypatch):
+    async def failing_handler(ctx):
+        ctx.state.set(server.StateNames.ENVIAR_CONFIRM, {})
+        raise RuntimeError("falha depois de mudar o estado")
+
+    monkeypatch.setattr(server.router, "resolve", lambda state, intent: failing_handler)
+
+    try:
+        client.post("/webhook", json=make_payload("4"))
+    except RuntimeError:
+        pass
+    assert PHONE not in state_store
+
+def test_redelivered_message_is_ignored(client, message_spy, state_store, existing_client, monkeypatch):
+    monkeypatch.setattr(server, "deduplicator", server.build_deduplicator("memory", 600, 100))
+    calls = []
+
+    async def fake_select_one(*args, **kwargs):
+        calls.append(args)
+        return {"id": "cli-1"}
+
+    monkeypatch.setattr(server, "supa_select_one", fake_select_one)
+    payload = {**make_payload("qualquer coisa"), "id": "false_5511999999999@c.us_3EB0ABC"}
+
+    first = client.post("/webhook", json=payload)
+    second = client.post("/webhook", json=payload)
+    assert first.json() == {"ok": True}
+    assert second.json() == {"ok": True, "duplicate": True}
+    assert len(calls) == 1
+    assert len(message_spy) == 1
+    assert server.deduplicator.stats()["hits"] == 1
+
+
+def test_failed_message_is_processed_on_redelivery(client, message_spy, monkeypatch):
+    monkeypatch.setattr(server, "deduplicator", server.build_deduplicator("memory", 600, 100))
+    processed = []
+
+    async def flaky_process(payload):
+        processed.append(payload["id"])
+        if len(processed) == 1:
+            raise RuntimeError("supabase fora do ar")
+        return {"ok": True}
+
+    monkeypatch.setattr(server, "process_payload", flaky_process)
+    payload = {**make_payload("menu"), "id": "false_5511999999999@c.us_3EB0DEF"}
+
+    try:
+        client.post("/webhook", json=payload)
+    except RuntimeError:
+        pass
+    assert client.post("/webhook", json=payload).json() == {"ok": True}
+    assert client.post("/webhook", json=payload).json() == {"ok": True, "duplicate": True}
+    assert len(processed) == 2
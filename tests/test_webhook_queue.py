@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from conftest import returning
+from services.webhook_queue import WebhookQueue
+
+PHONE = "5511999999999"
+
+
+def make_payload(text: str, phone: str = PHONE):
+    return {"from": phone, "text": text, "event": "onMessage"}
+
+
+def test_queue_mode_acks_and_processes_in_order(message_spy, state_store, existing_client, monkeypatch):
+    monkeypatch.setattr(server, "WEBHOOK_MODE", "queue")
+    monkeypatch.setattr(server, "get_saldo_async", returning(10.0))
+    monkeypatch.setattr(server, "list_ultimas_transacoes_async", returning([]))
+
+    with TestClient(server.app) as client:
+        r1 = client.post("/webhook", json=make_payload("menu"))
+        r2 = client.post("/webhook", json=make_payload("2"))
+        assert r1.json() == {"ok": True, "queued": True}
+        assert r2.json() == {"ok": True, "queued": True}
+        stats = client.get("/webhook/stats").json()
+        assert stats["mode"] == "queue"
+        assert stats["queue"]["enqueued"] == 2
+
+    # o shutdown do lifespan drena a fila antes de encerrar os workers
+    texts = [m["text"] for m in message_spy]
+    assert texts[0] == server.render_menu()
+    assert "Saldo: 10.00 L$" in texts[1]
+
+
+def test_queue_mode_ignores_non_actionable_events(message_spy, monkeypatch):
+    monkeypatch.setattr(server, "WEBHOOK_MODE", "queue")
+
+    with TestClient(server.app) as client:
+        response = client.post("/webhook", json={"from": PHONE, "text": "oi", "fromMe": True})
+        assert response.json() == {"ok": True}
+        assert client.get("/webhook/stats").json()["queue"]["enqueued"] == 0
+    assert message_spy == []
+
+
+@pytest.mark.asyncio
+async def test_same_phone_is_processed_sequentially():
+    seen = []
+
+    async def handler(payload):
+        await asyncio.sleep(0.01 if payload["n"] == 0 else 0)
+        seen.append((payload["tel"], payload["n"]))
+
+    q = WebhookQueue(handler, workers=4, max_size=100)
+    q.start()
+    for n in range(5):
+        assert q.submit("5585", {"tel": "5585", "n": n})
+        assert q.submit("5511", {"tel": "5511", "n": n})
+    await q.stop()
+
+    assert [n for tel, n in seen if tel == "5585"] == list(range(5))
+    assert [n for tel, n in seen if tel == "5511"] == list(range(5))
+    assert q.stats()["processed"] == 10
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_without_blocking():
+    release = asyncio.Event()
+
+    async def handler(payload):
+        await release.wait()
+
+    q = WebhookQueue(handler, workers=1, max_size=1)
+    q.start()
+    assert q.submit("5585", {})
+    await asyncio.sleep(0)  # worker retira o primeiro item da fila
+    assert q.submit("5585", {})
+    assert not q.submit("5585", {})
+    assert q.stats()["rejected"] == 1
+    release.set()
+    await q.stop()
+
+
+def test_full_queue_answers_503_and_forgets_message_id(monkeypatch):
+    closed = []
+
+    async def slow_process(payload):
+        await asyncio.sleep(0.3)
+
+    monkeypatch.setattr(server, "WEBHOOK_MODE", "queue")
+    monkeypatch.setattr(server, "WEBHOOK_WORKERS", 1)
+    monkeypatch.setattr(server, "WEBHOOK_QUEUE_MAX", 1)
+    monkeypatch.setattr(server, "process_payload", slow_process)
+    monkeypatch.setattr(server.SpooledBody, "close", lambda self: closed.append(self))
+
+    with TestClient(server.app) as client:
+        for n in range(3):
+            response = client.post("/webhook", json={**make_payload("menu"), "id": f"msg-{n}"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert not server.deduplicator.memory.contains("msg-2")
+        # recusada: corpo fechado no próprio request; as enfileiradas, pelo worker
+        assert len(closed) >= 1
+    assert len(closed) == 3
+
+
+def test_queued_message_failing_in_worker_is_forgotten(monkeypatch):
+    processed = []
+
+    async def flaky_process(payload):
+        processed.append(payload["id"])
+        if len(processed) == 1:
+            raise RuntimeError("supabase fora do ar")
+
+    monkeypatch.setattr(server, "WEBHOOK_MODE", "queue")
+    monkeypatch.setattr(server, "deduplicator", server.build_deduplicator("memory", 600, 100))
+    monkeypatch.setattr(server, "process_payload", flaky_process)
+
+    payload = {**make_payload("menu"), "id": "msg-falha"}
+    # cada TestClient drena a fila no shutdown do lifespan
+    with TestClient(server.app) as client:
+        assert client.post("/webhook", json=payload).json() == {"ok": True, "queued": True}
+    assert not server.deduplicator.memory.contains("msg-falha")
+
+    with TestClient(server.app) as client:
+        assert client.post("/webhook", json=payload).json() == {"ok": True, "queued": True}
+    assert processed == ["msg-falha", "msg-falha"]
+    assert server.deduplicator.memory.contains("msg-falha")